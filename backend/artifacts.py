@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Animation record kept next to its files in a shared store
+MANIFEST = "animation.json"
+MANIFEST_FIELDS = ("scene_name", "scene_key", "prompt", "level", "style", "fallback")
+
+
+class ArtifactStore:
+    """Where nodes put scene code and videos for other nodes to use.
+
+    The base class is the single node setup: every file stays in the
+    local videos directory and there is nothing to share.
+    """
+
+    name = "local"
+
+    def publish(self, animation_id: str, files: list[Path], record: Optional[dict] = None):
+        """Share an animation's files, and its record once its scene is written."""
+
+    def locate(self, animation_id: str, filename: str) -> Optional[Path]:
+        """Path of a shared file this node can read, or None."""
+        return None
+
+    def fetch_scene(self, animation_id: str, target_dir: Path) -> Optional[dict]:
+        """Copy a shared animation's scene code into target_dir and return its record, or None."""
+        return None
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class DirectoryArtifactStore(ArtifactStore):
+    """Artifacts in a directory every node mounts, e.g. over NFS.
+
+    Laid out like the videos directory, one subdirectory per animation.
+    Files are copied under a temporary name and renamed into place, so a
+    reader never sees half a video. Nothing is evicted from here; the
+    directory is meant to be cleaned up by whatever manages the volume.
+    """
+
+    name = "directory"
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.published = 0
+        self.fetched = 0
+
+    def publish(self, animation_id: str, files: list[Path], record: Optional[dict] = None):
+        target_dir = self.root / animation_id
+        target_dir.mkdir(exist_ok=True)
+        for path in files:
+            self._copy(path, target_dir / path.name)
+            self.published += 1
+        if record is not None:
+            manifest = {key: record.get(key) for key in MANIFEST_FIELDS}
+            self._write(target_dir / MANIFEST, json.dumps(manifest).encode("utf-8"))
+
+    def locate(self, animation_id: str, filename: str) -> Optional[Path]:
+        path = self.root / animation_id / filename
+        # Only files inside an animation directory, and never the manifest
+        if filename == MANIFEST or path.resolve().parent.parent != self.root.resolve() or not path.is_file():
+            return None
+        return path
+
+    def fetch_scene(self, animation_id: str, target_dir: Path) -> Optional[dict]:
+        source_dir = self.root / animation_id
+        try:
+            with open(source_dir / MANIFEST, encoding="utf-8") as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        scene_file = source_dir / f"{record['scene_name']}.py"
+        if not scene_file.is_file():
+            return None
+        target_dir.mkdir(parents=True, exist_ok=True)
+        self._copy(scene_file, target_dir / scene_file.name)
+        self.fetched += 1
+        logger.info(f"Fetched the scene of animation {animation_id} from the artifact store")
+        return record
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "root": str(self.root), "published": self.published, "fetched": self.fetched}
+
+    def _copy(self, source: Path, target: Path):
+        temp = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        try:
+            shutil.copyfile(source, temp)
+            os.replace(temp, target)
+        finally:
+            temp.unlink(missing_ok=True)
+
+    def _write(self, target: Path, data: bytes):
+        temp = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        try:
+            temp.write_bytes(data)
+            os.replace(temp, target)
+        finally:
+            temp.unlink(missing_ok=True)
+
+
+def make_artifact_store(name: str, path: Optional[Path] = None) -> ArtifactStore:
+    if name == "local":
+        return ArtifactStore()
+    if name == "directory":
+        if path is None:
+            raise ValueError("The directory artifact store needs a path")
+        return DirectoryArtifactStore(path)
+    raise ValueError(f"Unknown artifact store: {name}")
@@ -0,0 +1,395 @@
+"""Benchmark the generate-and-render pipeline.
+
+Replays the scenes stored in ``videos/*/Scene_*.py`` and a seeded
+synthetic corpus through the render path at each quality and worker
+count, with the LLM stubbed out, and writes the results as JSON:
+
+    python benchmark.py --workers 1 2 4 --synthetic 20 --output bench.json
+
+Every run gets fresh glyph and segment caches in a scratch directory, so
+results don't depend on what earlier runs or the service left behind.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from glyph_cache import GlyphCache
+from llm import LLMClient, StubBackend
+from render import render_scene
+from render_server import RenderServer
+from scene_analysis import load_manim_names, normalize_body, validate_scene, wrap_scene
+from segment_cache import SegmentCache
+
+logger = logging.getLogger("benchmark")
+
+BASE_DIR = Path(__file__).resolve().parent
+VIDEOS_DIR = BASE_DIR / "videos"
+
+# Building blocks of synthetic scenes; {i} keeps variable names unique
+SYNTHETIC_STEPS = [
+    "c{i} = Circle(radius={size}, color=BLUE)\nself.play(Create(c{i}))\nself.play(FadeOut(c{i}))",
+    "s{i} = Square(side_length={size})\nself.play(Create(s{i}))\n"
+    "self.play(s{i}.animate.rotate({angle}))\nself.play(FadeOut(s{i}))",
+    "t{i} = Text(\"Step {i}\", font_size={font_size})\nself.play(Write(t{i}))\nself.wait({wait})\nself.play(FadeOut(t{i}))",
+    "ax{i} = Axes(x_range=[-3, 3], y_range=[-2, 2])\ngraph{i} = ax{i}.plot(lambda x: {size} * x ** 2 / 4, color=YELLOW)\n"
+    "self.play(Create(ax{i}), Create(graph{i}))\nself.play(FadeOut(ax{i}), FadeOut(graph{i}))",
+]
+TEX_STEP = "m{i} = MathTex(r\"\\frac{{d}}{{dx}} x^{{{power}}} = {power} x^{{{lower}}}\")\nself.play(Write(m{i}))\nself.play(FadeOut(m{i}))"
+
+
+@dataclass
+class CorpusItem:
+    scene_name: str
+    # Stored scenes come with their source; synthetic ones are written by the stub LLM
+    source: Optional[str] = None
+    prompt: Optional[str] = None
+
+
+class CorpusBackend(StubBackend):
+    """Stub LLM that answers each synthetic prompt with that scene's body."""
+
+    name = "corpus"
+
+    def __init__(self, bodies: dict[str, str], delay: float = 0.0):
+        super().__init__(delay=delay)
+        self.bodies = bodies
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.bodies[prompt]
+
+
+def stored_corpus(limit: Optional[int] = None) -> list[CorpusItem]:
+    items = [
+        CorpusItem(scene_name=path.stem, source=path.read_text(encoding="utf-8"))
+        for path in sorted(VIDEOS_DIR.glob("*/Scene_*.py"))
+    ]
+    return items[:limit] if limit is not None else items
+
+
+def synthetic_corpus(count: int, seed: int, tex: bool = False) -> tuple[list[CorpusItem], dict[str, str]]:
+    """count scenes of 2 to 6 steps each, the same for the same seed.
+
+    Returns the items and the body the stub LLM gives for each prompt.
+    """
+    rng = random.Random(seed)
+    steps = SYNTHETIC_STEPS + ([TEX_STEP] if tex else [])
+    items, bodies = [], {}
+    for n in range(count):
+        body = "\n".join(
+            rng.choice(steps).format(
+                i=i,
+                size=rng.choice([0.5, 1, 1.5, 2]),
+                angle=rng.choice([0.5, 1, 3.14]),
+                font_size=rng.choice([24, 36, 48]),
+                wait=rng.choice([0.5, 1]),
+                power=(power := rng.randint(2, 5)),
+                lower=power - 1
+            )
+            for i in range(rng.randint(2, 6))
+        )
+        prompt = f"synthetic scene {seed}-{n}"
+        bodies[prompt] = body
+        items.append(CorpusItem(scene_name=f"Scene_bench{n:04d}", prompt=prompt))
+    return items, bodies
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "mean": sum(values) / len(values) if values else None,
+        "max": max(values, default=None)
+    }
+
+
+def bytes_written(job_dir: Path) -> int:
+    """Bytes of the files a job created.
+
+    Files linked in from the shared caches have more than one link until
+    the job's own files are collected, so only single-link files count.
+    """
+    total = 0
+    for dirpath, _, filenames in os.walk(job_dir):
+        for filename in filenames:
+            stat_result = os.stat(os.path.join(dirpath, filename))
+            if stat_result.st_nlink == 1:
+                total += stat_result.st_size
+    return total
+
+
+def _tree_rss(root_pid: int) -> Optional[int]:
+    """Resident memory of root_pid's descendants, from /proc; None where /proc is unavailable."""
+    children = defaultdict(list)
+    rss = {}
+    try:
+        entries = os.scandir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name can contain spaces, so split after it
+        fields = stat[stat.rindex(")") + 2:].split()
+        children[int(fields[1])].append(int(entry.name))
+        rss[int(entry.name)] = int(fields[21])
+    total = 0
+    stack = list(children[root_pid])
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children[pid])
+    return total * os.sysconf("SC_PAGE_SIZE")
+
+
+class RSSSampler:
+    """Tracks the peak memory of this process's render workers and Manim processes.
+
+    Samples /proc every interval seconds. Without /proc it falls back to
+    the largest child that has exited, which can't tell runs apart.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = _tree_rss(os.getpid())
+            if rss is None:
+                import resource
+                rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+
+async def run_job(item: CorpusItem, quality: str, render, llm: LLMClient, known_names, root: Path,
+                  glyph_cache: GlyphCache, segment_cache: SegmentCache, slots: asyncio.Semaphore) -> dict:
+    """Generate (for synthetic items) and render one scene, the way the service does."""
+    async with slots:
+        started = time.perf_counter()
+        timings = {}
+        job_dir = root / uuid.uuid4().hex
+        work_dir = job_dir / "work"
+        try:
+            source = item.source
+            if source is None:
+                body = normalize_body(await llm.generate(item.prompt))
+                source = wrap_scene(item.scene_name, body)
+                problems = validate_scene(source, known_names)
+                if problems:
+                    raise ValueError(f"Synthetic scene failed validation: {'; '.join(problems)}")
+                timings["generate"] = time.perf_counter() - started
+            job_dir.mkdir(parents=True)
+            scene_file = job_dir / f"{item.scene_name}.py"
+            scene_file.write_text(source, encoding="utf-8")
+
+            glyph_dir = work_dir / "glyphs"
+            lookups = {**glyph_cache.prepare(glyph_dir), **segment_cache.prepare(work_dir)}
+            config = {**glyph_cache.job_config(glyph_dir), **segment_cache.job_config(work_dir)}
+            report = {}
+            await asyncio.to_thread(
+                render, scene_file, item.scene_name, quality, work_dir, job_dir / f"{item.scene_name}.mp4",
+                BASE_DIR, None, config, report, None, lookups
+            )
+            latency = time.perf_counter() - started
+            written = await asyncio.to_thread(bytes_written, job_dir)
+            segments = report.get("segments", {})
+            await asyncio.to_thread(glyph_cache.collect, glyph_dir, report.get("glyphs", {}).get("used", ()))
+            await asyncio.to_thread(segment_cache.collect, work_dir, segments.get("used", ()))
+            return {
+                "ok": True,
+                "latency": latency,
+                "bytes_written": written,
+                "timings": {**timings, **report.get("timings", {})}
+            }
+        except Exception as e:
+            logger.error(f"{item.scene_name} at {quality} failed: {str(e)}")
+            return {"ok": False, "scene": item.scene_name, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+
+async def run_benchmark(corpus: list[CorpusItem], bodies: dict[str, str], quality: str, workers: int,
+                        backend: str, llm_delay: float, known_names, scratch_dir: Path) -> dict:
+    """Render the whole corpus at one quality with workers renders at a time."""
+    root = scratch_dir / f"{backend}_{quality}_{workers}"
+    glyph_cache = GlyphCache(root / "media", max_bytes=1024 ** 3)
+    segment_cache = SegmentCache(root / "media", max_bytes=4 * 1024 ** 3)
+    llm = LLMClient(CorpusBackend(bodies, delay=llm_delay), max_concurrency=workers, retries=0)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    asyncio.get_running_loop().set_default_executor(executor)
+    server = None
+    render = render_scene
+    if backend == "warm":
+        server = RenderServer(size=workers)
+        # Start-up is paid once per service, not per render, so keep it off the clock
+        await asyncio.to_thread(server.start)
+        render = server.render
+    slots = asyncio.Semaphore(workers)
+
+    try:
+        with RSSSampler() as sampler:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(
+                run_job(item, quality, render, llm, known_names, root / "jobs",
+                        glyph_cache, segment_cache, slots)
+                for item in corpus
+            ))
+            wall = time.perf_counter() - started
+    finally:
+        if server is not None:
+            await asyncio.to_thread(server.stop)
+        executor.shutdown(wait=False)
+        shutil.rmtree(root, ignore_errors=True)
+
+    done = [r for r in results if r["ok"]]
+    stages = defaultdict(list)
+    for result in done:
+        for name, seconds in result["timings"].items():
+            stages[name].append(seconds)
+    return {
+        "backend": backend,
+        "quality": quality,
+        "workers": workers,
+        "jobs": len(results),
+        "failed": len(results) - len(done),
+        "errors": [r["error"] for r in results if not r["ok"]][:5],
+        "wall_seconds": wall,
+        "renders_per_minute": len(done) / wall * 60 if wall else None,
+        "latency_seconds": summarize([r["latency"] for r in done]),
+        "stage_seconds": {name: summarize(values) for name, values in stages.items()},
+        "peak_rss_bytes": sampler.peak,
+        "bytes_written_per_job": summarize([r["bytes_written"] for r in done])
+    }
+
+
+def environment() -> dict:
+    """What the numbers depend on besides the code."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=BASE_DIR, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        from importlib.metadata import version
+        manim_version = version("manim")
+    except Exception:
+        manim_version = None
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "manim": manim_version
+    }
+
+
+async def run_all(args) -> dict:
+    stored = [] if args.no_stored else stored_corpus(args.stored_limit)
+    synthetic, bodies = synthetic_corpus(args.synthetic, args.seed, tex=args.tex)
+    corpus = stored + synthetic
+    known_names = await asyncio.to_thread(load_manim_names)
+    report = {
+        "environment": environment(),
+        "settings": {
+            "backend": args.backend,
+            "qualities": args.qualities,
+            "workers": args.workers,
+            "seed": args.seed,
+            "llm_delay": args.llm_delay,
+            "tex": args.tex
+        },
+        "corpus": {"stored": len(stored), "synthetic": len(synthetic)},
+        "runs": []
+    }
+    with tempfile.TemporaryDirectory(prefix="animator_bench_") as scratch_dir:
+        for workers in args.workers:
+            for quality in args.qualities:
+                logger.info(f"Rendering {len(corpus)} scenes at {quality} quality with {workers} workers")
+                run = await run_benchmark(
+                    corpus, bodies, quality, workers, args.backend, args.llm_delay, known_names, Path(scratch_dir)
+                )
+                logger.info(f"{run['renders_per_minute'] or 0:.1f} renders/min, "
+                            f"p50 {run['latency_seconds']['p50']}s, {run['failed']} failed")
+                report["runs"].append(run)
+    return report
+
+
+def parse_args(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--qualities", nargs="+", default=["low", "medium", "high"],
+                        choices=["low", "medium", "high"])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4],
+                        help="Concurrent renders to measure throughput at")
+    parser.add_argument("--backend", choices=["warm", "subprocess"], default="warm")
+    parser.add_argument("--synthetic", type=int, default=10, help="Number of synthetic scenes")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus")
+    parser.add_argument("--tex", action="store_true", help="Include MathTex steps in synthetic scenes")
+    parser.add_argument("--stored-limit", type=int, default=None, help="Replay at most this many stored scenes")
+    parser.add_argument("--no-stored", action="store_true", help="Skip the stored scenes")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="Seconds the stub LLM takes per call")
+    parser.add_argument("--output", type=Path, default=None, help="Write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None):
+    # Progress only; per-render logs would drown it
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    logger.setLevel(logging.INFO)
+    args = parse_args(argv)
+    report = asyncio.run(run_all(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+        logger.info(f"Wrote {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
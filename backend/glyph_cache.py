@@ -0,0 +1,151 @@
+import json
+import logging
+import shutil
+import subprocess
+import uuid
+from pathlib import Path
+
+from shared_store import SharedStore, fetch
+
+logger = logging.getLogger(__name__)
+
+# Manim's config keys and the matching subdirectories of a glyph directory
+GLYPH_DIRS = {"tex_dir": "Tex", "text_dir": "texts"}
+
+# Formulas most scenes for a topic typeset, compiled ahead of the first request
+PREWARM_FORMULAS = {
+    "calculus": [r"\frac{d}{dx}", r"f'(x)", r"\int_a^b f(x)\,dx", r"\lim_{x \to 0}", r"\frac{dy}{dx}", r"f(x) = x^2"],
+    "algebra": [r"ax^2 + bx + c = 0", r"x = \frac{-b \pm \sqrt{b^2 - 4ac}}{2a}", r"x", r"y", r"="],
+    "geometry": [r"a^2 + b^2 = c^2", r"c^2 = a^2 + b^2", r"A = \pi r^2", r"a", r"b", r"c", r"\pi"],
+    "linear algebra": [r"A\vec{v} = \lambda\vec{v}", r"\det(A)", r"\vec{v}", r"\lambda", r"A"],
+    "statistics": [r"\mu", r"\sigma", r"P(A)", r"\bar{x} = \frac{1}{n}\sum_{i=1}^{n} x_i"],
+    "trigonometry": [r"\sin\theta", r"\cos\theta", r"\tan\theta", r"\sin^2\theta + \cos^2\theta = 1", r"\theta"]
+}
+
+PREWARM_SCRIPT = """
+import json
+import sys
+from pathlib import Path
+from manim import config, MathTex
+from glyph_cache import install_glyph_hooks
+from shared_store import set_lookups
+install_glyph_hooks()
+set_lookups(json.loads(sys.argv[1]))
+config.tex_dir = Path(sys.argv[2])
+for formula in sys.argv[3:]:
+    MathTex(formula)
+"""
+
+
+class GlyphCache(SharedStore):
+    """Shared, size-bounded store of compiled LaTeX and Text SVGs.
+
+    Each job compiles glyphs in its own directory, see
+    SharedStore, so concurrent jobs never clean up each other's LaTeX
+    scratch files.
+    """
+
+    dirs = GLYPH_DIRS
+    suffixes = (".svg",)
+
+    def __init__(self, root: Path, max_bytes: int = 256 * 1024 ** 2):
+        super().__init__(root, max_bytes)
+        self.prewarmed: set[str] = set()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "prewarmed_topics": sorted(self.prewarmed)}
+
+    def prewarm(self, topic: str, scratch_dir: Path, cwd: Path):
+        """Compile a topic's common formulas into the store. Blocks for the LaTeX runs."""
+        formulas = PREWARM_FORMULAS.get(topic)
+        if not formulas or topic in self.prewarmed:
+            return
+        glyph_dir = scratch_dir / f"prewarm_{uuid.uuid4().hex[:8]}"
+        try:
+            lookups = self.prepare(glyph_dir)
+            subprocess.run(
+                ["python", "-c", PREWARM_SCRIPT, json.dumps(lookups), str(glyph_dir / GLYPH_DIRS["tex_dir"]),
+                 *formulas],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=str(cwd),
+                timeout=300
+            )
+            added = self.collect(glyph_dir)
+            self.prewarmed.add(topic)
+            logger.info(f"Pre-warmed {added} glyphs for {topic}")
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.error(f"Glyph pre-warm for {topic} failed: {str(e)}")
+        finally:
+            shutil.rmtree(glyph_dir, ignore_errors=True)
+
+
+# In-process lookup counting for warm render workers, see install_glyph_hooks
+_glyph_stats = {"hits": 0, "misses": 0, "used": set()}
+
+
+def install_glyph_hooks():
+    """Link stored glyphs into a render as Manim looks them up, and count hits and misses.
+
+    A Tex lookup is a miss when it has to run LaTeX; a Text lookup is a
+    miss when neither the job nor the store has its SVG yet.
+    """
+    from manim.mobject.text import tex_mobject, text_mobject
+    from manim.utils import tex_file_writing
+    from manim import config
+
+    compile_tex = tex_file_writing.compile_tex
+    compiled = [0]
+
+    def counting_compile_tex(*args, **kwargs):
+        compiled[0] += 1
+        return compile_tex(*args, **kwargs)
+
+    tex_file_writing.compile_tex = counting_compile_tex
+
+    generate_tex_file = tex_file_writing.generate_tex_file
+
+    def fetching_generate_tex_file(*args, **kwargs):
+        # tex_to_svg_file looks for the SVG next to the .tex file right after this
+        tex_file = generate_tex_file(*args, **kwargs)
+        fetch(tex_file.with_suffix(".svg"))
+        return tex_file
+
+    tex_file_writing.generate_tex_file = fetching_generate_tex_file
+
+    tex_to_svg_file = tex_mobject.tex_to_svg_file
+
+    def counting_tex_to_svg_file(*args, **kwargs):
+        before = compiled[0]
+        svg_file = tex_to_svg_file(*args, **kwargs)
+        _glyph_stats["misses" if compiled[0] > before else "hits"] += 1
+        _glyph_stats["used"].add(Path(svg_file).name)
+        return svg_file
+
+    tex_mobject.tex_to_svg_file = counting_tex_to_svg_file
+
+    for cls in (text_mobject.Text, text_mobject.MarkupText):
+        _count_text_lookups(cls, config)
+
+
+def _count_text_lookups(cls, config):
+    text2hash = cls._text2hash
+
+    def fetching_text2hash(self, *args, **kwargs):
+        # _text2svg looks for the SVG named after this hash right after it
+        hash_name = text2hash(self, *args, **kwargs)
+        svg_file = Path(config.get_dir("text_dir")) / f"{hash_name}.svg"
+        fetch(svg_file)
+        _glyph_stats["hits" if svg_file.exists() else "misses"] += 1
+        _glyph_stats["used"].add(svg_file.name)
+        return hash_name
+
+    cls._text2hash = fetching_text2hash
+
+
+def take_glyph_stats() -> dict:
+    """Return and reset the lookups counted since the last call."""
+    stats = {"hits": _glyph_stats["hits"], "misses": _glyph_stats["misses"], "used": sorted(_glyph_stats["used"])}
+    _glyph_stats.update(hits=0, misses=0, used=set())
+    return stats
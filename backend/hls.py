@@ -0,0 +1,158 @@
+import logging
+import mimetypes
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST = "index.m3u8"
+PLAYLIST_TYPE = "application/vnd.apple.mpegurl"
+# Segments are served like videos, which pick the type by extension
+mimetypes.add_type("video/mp2t", ".ts")
+
+# Seconds; one segment is one play() or wait(), which rarely runs longer
+TARGET_DURATION = 10
+
+# Input duration ffmpeg prints before remuxing
+DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+class HlsStream:
+    """A growing HLS playlist of a render's partial movie files.
+
+    Manim writes one partial movie file per ``self.play``/``self.wait``
+    and only joins them into the video once the scene is done. Each
+    partial file is remuxed, without re-encoding, into an MPEG-TS segment
+    whose timestamps follow on from the previous one, and the playlist is
+    rewritten after every segment, so players can start on the first
+    animations while the rest render. Remuxing runs in order on a thread
+    of its own, so the render never waits for it.
+
+    Players read the target duration once, so it is fixed for the life of
+    the stream, and an animation longer than it is re-encoded with a
+    keyframe every target_duration seconds and cut into several segments.
+
+    A segment that can't be remuxed ends the stream early rather than
+    leaving a gap; the finished video is unaffected. When a failed render
+    is retried, animations already in the stream are skipped.
+    """
+
+    def __init__(self, directory: Path, ffmpeg: str = "ffmpeg", on_start: Optional[Callable[[], None]] = None,
+                 target_duration: int = TARGET_DURATION):
+        self.directory = directory
+        self.ffmpeg = ffmpeg
+        self.target_duration = target_duration
+        # Called from the remux thread once the playlist has its first segment
+        self.on_start = on_start
+        self.segments: list[tuple[str, float]] = []
+        self.duration = 0.0
+        self.broken = False
+        self.finished = False
+        # Animations queued so far
+        self.queued = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hls")
+
+    @property
+    def playlist(self) -> Path:
+        return self.directory / PLAYLIST
+
+    def add(self, partial_file: Path, animation: int):
+        """Queue the partial movie file of the animation-th animation, counting from 1."""
+        if animation <= self.queued:
+            return
+        self.queued = animation
+        self._executor.submit(self._add, partial_file)
+
+    def finish(self):
+        """Wait for queued segments, then mark the playlist complete. Blocks."""
+        self._executor.shutdown(wait=True)
+        self.finished = True
+        if self.segments:
+            self._write_playlist()
+
+    def _add(self, partial_file: Path):
+        if self.broken:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            segments = self._remux(partial_file)
+        except (subprocess.SubprocessError, OSError, ValueError) as e:
+            logger.error(f"Could not add {partial_file.name} to the stream in {self.directory}, ending it: {str(e)}")
+            for temp in self.directory.glob(".*.tmp"):
+                temp.unlink(missing_ok=True)
+            self.broken = True
+            return
+        for name, duration in segments:
+            self.segments.append((name, duration))
+            self.duration += duration
+        self._write_playlist()
+        if len(self.segments) == len(segments) and self.on_start:
+            self.on_start()
+
+    def _remux(self, partial_file: Path) -> list[tuple[str, float]]:
+        """Turn partial_file into the next segments, returning their names and durations."""
+        name = f"{len(self.segments):05d}.ts"
+        temp = self.directory / f".{name}.tmp"
+        result = self._ffmpeg(partial_file, ["-c", "copy", "-f", "mpegts", str(temp)])
+        found = DURATION.search(result.stderr)
+        if not found:
+            raise ValueError(f"no duration for {partial_file.name}")
+        hours, minutes, seconds = found.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        if round(duration) <= self.target_duration:
+            os.replace(temp, self.directory / name)
+            return [(name, duration)]
+        temp.unlink()
+        return self._split(partial_file)
+
+    def _split(self, partial_file: Path) -> list[tuple[str, float]]:
+        """Re-encode partial_file into segments no longer than the target duration."""
+        listing = self.directory / ".split.csv.tmp"
+        self._ffmpeg(partial_file, [
+            "-c:v", "libx264", "-preset", "veryfast", "-c:a", "copy",
+            "-force_key_frames", f"expr:gte(t,n_forced*{self.target_duration})",
+            "-f", "segment", "-segment_time", str(self.target_duration), "-segment_format", "mpegts",
+            "-segment_list", str(listing), "-segment_list_type", "csv",
+            str(self.directory / ".split%03d.ts.tmp")
+        ])
+        segments = []
+        for line in listing.read_text(encoding="utf-8").splitlines():
+            filename, start, end = line.rsplit(",", 2)
+            name = f"{len(self.segments) + len(segments):05d}.ts"
+            os.replace(self.directory / Path(filename).name, self.directory / name)
+            segments.append((name, float(end) - float(start)))
+        listing.unlink()
+        if not segments:
+            raise ValueError(f"no segments for {partial_file.name}")
+        return segments
+
+    def _ffmpeg(self, partial_file: Path, output: list[str]) -> subprocess.CompletedProcess:
+        # Timestamps follow on from the previous segment
+        return subprocess.run(
+            [self.ffmpeg, "-hide_banner", "-nostdin", "-y", "-i", str(partial_file), "-map", "0",
+             "-output_ts_offset", f"{self.duration:.6f}", *output],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=60
+        )
+
+    def _write_playlist(self):
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0"
+        ]
+        for name, duration in self.segments:
+            lines += [f"#EXTINF:{duration:.3f},", name]
+        if self.finished or self.broken:
+            lines.append("#EXT-X-ENDLIST")
+        temp = self.playlist.with_name(f".{PLAYLIST}.tmp")
+        temp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(temp, self.playlist)
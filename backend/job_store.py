@@ -0,0 +1,432 @@
+import asyncio
+import dataclasses
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from jobs import Batch, Job, QUEUED, RUNNING, COMPLETED, FAILED
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """Where JobManager keeps jobs and batches, and how its workers find work.
+
+    ``claim`` hands a queued job to one worker, lowest priority value
+    first, and marks it running under a lease held by ``node``. A store
+    that is ``shared`` between nodes hands each job to exactly one node;
+    the worker renews its lease while the job runs, and a job whose lease
+    runs out, because its node died, is handed out again.
+    """
+
+    name = "store"
+    # Whether other nodes see the same jobs; readers then poll for changes
+    shared = False
+    poll_interval: Optional[float] = None
+
+    def add(self, job: Job):
+        raise NotImplementedError
+
+    def save(self, job: Job, node: Optional[str] = None) -> bool:
+        """Persist a job's status, result and events after they changed.
+
+        With node, only while node holds the job's lease; False once it is lost.
+        """
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    async def claim(self, node: str, lease: float) -> Job:
+        """Wait for a queued job and mark it running on node."""
+        raise NotImplementedError
+
+    def renew(self, job_id: str, node: str, lease: float) -> bool:
+        """Extend node's lease on a running job; False once the lease is lost."""
+        return True
+
+    def release(self, job: Job, node: str) -> bool:
+        """Put node's running job back in the queue for another worker; False if its lease is lost."""
+        raise NotImplementedError
+
+    def unfinished(self) -> list[Job]:
+        raise NotImplementedError
+
+    def counts(self) -> dict:
+        """Number of jobs in each state."""
+        raise NotImplementedError
+
+    def add_batch(self, batch: Batch):
+        raise NotImplementedError
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        raise NotImplementedError
+
+    def join_upgrade(self, cache_key: str, draft_id: str) -> Optional[str]:
+        """Add a draft to those waiting on the unfinished upgrade for cache_key and return its job id.
+
+        None when no upgrade for cache_key is queued or running.
+        """
+        raise NotImplementedError
+
+    def add_upgrade(self, cache_key: str, job_id: str):
+        """Record job_id as the upgrade that drafts of cache_key wait on."""
+        raise NotImplementedError
+
+    def pop_upgrade(self, cache_key: str, job_id: str) -> list[str]:
+        """Forget the finished upgrade job_id and return the ids of the drafts that joined it."""
+        raise NotImplementedError
+
+    def prune(self, max_history: int):
+        """Forget the oldest finished jobs and batches beyond max_history."""
+
+    def close(self):
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """Jobs in this process only, served from an in-memory priority queue."""
+
+    name = "memory"
+
+    def __init__(self):
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.batches: "OrderedDict[str, Batch]" = OrderedDict()
+        # Upgrade cache key -> (upgrade job id, ids of the other drafts waiting on it)
+        self.upgrades: dict[str, tuple[str, list[str]]] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._order = itertools.count()
+
+    @property
+    def queue(self) -> asyncio.PriorityQueue:
+        if self._queue is None:
+            # Created lazily so it binds to the running event loop
+            self._queue = asyncio.PriorityQueue()
+        return self._queue
+
+    def add(self, job: Job):
+        self.jobs[job.id] = job
+        if job.status == QUEUED:
+            self.queue.put_nowait((job.priority, next(self._order), job))
+
+    def save(self, job: Job, node: Optional[str] = None) -> bool:
+        # Callers hold the stored object itself
+        return True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def claim(self, node: str, lease: float) -> Job:
+        _, _, job = await self.queue.get()
+        self.queue.task_done()
+        job.status = RUNNING
+        job.started_at = time.time()
+        return job
+
+    def release(self, job: Job, node: str) -> bool:
+        job.status = QUEUED
+        job.started_at = None
+        self.queue.put_nowait((job.priority, next(self._order), job))
+        return True
+
+    def unfinished(self) -> list[Job]:
+        return [job for job in self.jobs.values() if not job.done]
+
+    def counts(self) -> dict:
+        counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def add_batch(self, batch: Batch):
+        self.batches[batch.id] = batch
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        return self.batches.get(batch_id)
+
+    def join_upgrade(self, cache_key: str, draft_id: str) -> Optional[str]:
+        for key, (job_id, _) in list(self.upgrades.items()):
+            job = self.jobs.get(job_id)
+            if job is None or job.done:
+                del self.upgrades[key]
+        if cache_key not in self.upgrades:
+            return None
+        job_id, drafts = self.upgrades[cache_key]
+        drafts.append(draft_id)
+        return job_id
+
+    def add_upgrade(self, cache_key: str, job_id: str):
+        _, drafts = self.upgrades.get(cache_key, (None, []))
+        self.upgrades[cache_key] = (job_id, drafts)
+
+    def pop_upgrade(self, cache_key: str, job_id: str) -> list[str]:
+        if self.upgrades.get(cache_key, (None,))[0] != job_id:
+            return []
+        return self.upgrades.pop(cache_key)[1]
+
+    def prune(self, max_history: int):
+        if len(self.jobs) >= max_history:
+            for job_id in [j.id for j in self.jobs.values() if j.done][: len(self.jobs) - max_history + 1]:
+                del self.jobs[job_id]
+        while len(self.batches) >= max_history:
+            self.batches.popitem(last=False)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, seq);
+CREATE TABLE IF NOT EXISTS batches (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS upgrades (
+    cache_key TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    drafts TEXT NOT NULL DEFAULT '[]'
+);
+"""
+
+
+class SQLiteJobStore(JobStore):
+    """Jobs in a SQLite database that every node opens, e.g. on a shared file system.
+
+    Each statement is its own transaction, and claims take the database
+    write lock, so two nodes never claim the same job. The database uses a
+    rollback journal rather than WAL: WAL keeps its index in shared memory,
+    which processes on different hosts don't share, so nodes mounting the
+    database over the network would see inconsistent claims. The file
+    system must support POSIX locks, as NFS with lockd does. Workers poll every
+    poll_interval seconds for jobs queued by other nodes. A job is handed
+    out at most max_attempts times before it fails for good, so a scene
+    that takes its render node down can't take down the whole cluster.
+
+    Claims and lease renewals take the write lock, so they run in a thread
+    and are retried when the database stays locked. Every other call is a
+    single short statement run on the caller's thread, the event loop, so
+    the busy timeout is kept to busy_timeout seconds: a database locked for
+    longer, e.g. by a stalled network file system, fails those calls with
+    sqlite3.OperationalError instead of stalling the whole API.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: Path, poll_interval: float = 1.0, max_attempts: int = 2, busy_timeout: float = 2.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.executescript(SQLITE_SCHEMA)
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, params)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def add(self, job: Job):
+        self._execute(
+            "INSERT INTO jobs (id, status, priority, data) VALUES (?, ?, ?, ?)",
+            (job.id, job.status, job.priority, _dump(job))
+        )
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def save(self, job: Job, node: Optional[str] = None) -> bool:
+        if node is None:
+            self._execute("UPDATE jobs SET status = ?, data = ? WHERE id = ?", (job.status, _dump(job), job.id))
+            return True
+        cursor = self._execute("UPDATE jobs SET status = ?, data = ? WHERE id = ? AND lease_owner = ?",
+                               (job.status, _dump(job), job.id, node))
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(**json.loads(row[0])) if row else None
+
+    async def claim(self, node: str, lease: float) -> Job:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            attempt = asyncio.ensure_future(asyncio.to_thread(self._try_claim, node, lease))
+            try:
+                job = await asyncio.shield(attempt)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not claim a job, trying again: {str(e)}")
+                job = None
+            except asyncio.CancelledError:
+                # Don't strand a job claimed just as the worker stopped
+                try:
+                    claimed = await attempt
+                except sqlite3.OperationalError:
+                    claimed = None
+                if claimed is not None:
+                    self.release(claimed, node)
+                raise
+            if job is not None:
+                return job
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _try_claim(self, node: str, lease: float) -> Optional[Job]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    now = time.time()
+                    row = self._db.execute(
+                        "SELECT seq, data, status, attempts FROM jobs "
+                        "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY priority, seq LIMIT 1",
+                        (QUEUED, RUNNING, now)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    seq, data, status, attempts = row
+                    job = Job(**json.loads(data))
+                    if status == RUNNING:
+                        logger.warning(f"Lease on job {job.id} expired, handing it out again")
+                    if attempts >= self.max_attempts:
+                        job.status = FAILED
+                        job.error = f"Job was abandoned by its render node {attempts} times"
+                        job.finished_at = now
+                        job.events.append({"stage": "failed", "time": now, "error": job.error})
+                        self._db.execute("UPDATE jobs SET status = ?, data = ?, lease_owner = NULL WHERE seq = ?",
+                                         (job.status, _dump(job), seq))
+                        continue
+                    job.status = RUNNING
+                    job.started_at = now
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, data = ?, lease_owner = ?, lease_expires = ?, attempts = ? "
+                        "WHERE seq = ?",
+                        (job.status, _dump(job), node, now + lease, attempts + 1, seq)
+                    )
+                    return job
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            finally:
+                if self._db.in_transaction:
+                    self._db.execute("COMMIT")
+
+    def renew(self, job_id: str, node: str, lease: float) -> bool:
+        try:
+            cursor = self._execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+                (time.time() + lease, job_id, node, RUNNING)
+            )
+        except sqlite3.OperationalError as e:
+            # The lease outlasts two more heartbeats
+            logger.warning(f"Could not renew the lease on job {job_id}, trying again: {str(e)}")
+            return True
+        return cursor.rowcount == 1
+
+    def release(self, job: Job, node: str) -> bool:
+        job.status = QUEUED
+        job.started_at = None
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, data = ?, lease_owner = NULL, lease_expires = NULL, "
+            "attempts = MAX(attempts - 1, 0) WHERE id = ? AND lease_owner = ? AND status = ?",
+            (job.status, _dump(job), job.id, node, RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def unfinished(self) -> list[Job]:
+        rows = self._execute("SELECT data FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+        return [Job(**json.loads(row[0])) for row in rows]
+
+    def counts(self) -> dict:
+        counts = {QUEUED: 0, RUNNING: 0, COMPLETED: 0, FAILED: 0}
+        for status, count in self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall():
+            counts[status] = count
+        return counts
+
+    def add_batch(self, batch: Batch):
+        self._execute("INSERT INTO batches (id, data) VALUES (?, ?)", (batch.id, _dump(batch)))
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        row = self._execute("SELECT data FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        return Batch(**json.loads(row[0])) if row else None
+
+    def join_upgrade(self, cache_key: str, draft_id: str) -> Optional[str]:
+        with self._transaction() as db:
+            db.execute("DELETE FROM upgrades WHERE job_id NOT IN (SELECT id FROM jobs WHERE status IN (?, ?))",
+                       (QUEUED, RUNNING))
+            row = db.execute("SELECT job_id, drafts FROM upgrades WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE upgrades SET drafts = ? WHERE cache_key = ?",
+                       (json.dumps(json.loads(row[1]) + [draft_id]), cache_key))
+            return row[0]
+
+    def add_upgrade(self, cache_key: str, job_id: str):
+        # Drafts that joined an upgrade queued at the same time by another node wait on this one instead
+        self._execute("INSERT INTO upgrades (cache_key, job_id) VALUES (?, ?) "
+                      "ON CONFLICT (cache_key) DO UPDATE SET job_id = excluded.job_id", (cache_key, job_id))
+
+    def pop_upgrade(self, cache_key: str, job_id: str) -> list[str]:
+        with self._transaction() as db:
+            row = db.execute("SELECT drafts FROM upgrades WHERE cache_key = ? AND job_id = ?",
+                             (cache_key, job_id)).fetchone()
+            if row is None:
+                return []
+            db.execute("DELETE FROM upgrades WHERE cache_key = ?", (cache_key,))
+            return json.loads(row[0])
+
+    def prune(self, max_history: int):
+        self._execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND seq <= (SELECT MAX(seq) FROM jobs) - ?",
+            (COMPLETED, FAILED, max_history)
+        )
+        self._execute("DELETE FROM batches WHERE seq <= (SELECT MAX(seq) FROM batches) - ?", (max_history,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _dump(record) -> str:
+    return json.dumps(dataclasses.asdict(record))
+
+
+def make_job_store(name: str, path: Optional[Path] = None, poll_interval: float = 1.0,
+                   max_attempts: int = 2, busy_timeout: float = 2.0) -> JobStore:
+    if name == "memory":
+        return MemoryJobStore()
+    if name == "sqlite":
+        if path is None:
+            raise ValueError("The sqlite job store needs a database path")
+        return SQLiteJobStore(path, poll_interval=poll_interval, max_attempts=max_attempts,
+                              busy_timeout=busy_timeout)
+    raise ValueError(f"Unknown job store: {name}")
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Optional
+
+if TYPE_CHECKING:
+    from job_store import JobStore
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Progress stages that end a job's event stream
+FINAL_STAGES = ("done", "failed")
+
+
+@dataclass
+class Job:
+    """A single animation request moving through the render queue."""
+    animation_id: str
+    params: dict
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    events: list[dict] = field(default_factory=list)
+    # Lower runs first; jobs of equal priority run in submission order
+    priority: int = 0
+    # Who asked for the job, for per-client fairness and admission limits
+    client: str = ""
+    # Seconds spent in each stage of the job
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    def to_dict(self) -> dict:
+        data = {
+            "job_id": self.id,
+            "id": self.animation_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.events:
+            data["progress"] = self.events[-1]
+        if self.timings:
+            data["timings"] = self.timings
+        if self.result:
+            data.update(self.result)
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+@dataclass
+class Batch:
+    """Animation requests submitted together. Identical items share one job."""
+    # Job of each item, in request order
+    job_ids: list[str]
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    client: str = ""
+    created_at: float = field(default_factory=time.time)
+
+
+class QueueFullError(Exception):
+    """Raised by JobManager.submit when a job would exceed the pending job limits."""
+
+
+def default_worker_count() -> int:
+    """Number of render workers: RENDER_WORKERS_PER_CORE times the CPU count."""
+    per_core = float(os.getenv("RENDER_WORKERS_PER_CORE", "1"))
+    return max(1, int((os.cpu_count() or 1) * per_core))
+
+
+class JobManager:
+    """Jobs served by a bounded pool of workers, kept in a JobStore.
+
+    Each worker claims the queued job with the lowest priority, one at a
+    time, and awaits ``handler(job)``, which returns the job result.
+    Blocking work (the LLM call, the Manim process) must be pushed off the
+    event loop by the handler. With a shared store, workers on every node
+    claim from the same queue, renew their lease on a running job every
+    lease/3 seconds, and give their jobs back when the node shuts down.
+    """
+
+    def __init__(self, handler: Callable[[Job], Awaitable[dict]], store: "JobStore", workers: int,
+                 max_history: int = 1000, max_pending: int = 0, max_pending_per_client: int = 0,
+                 node: str = "local", lease: float = 30):
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.max_history = max_history
+        # Admission limits on unfinished jobs, 0 for none
+        self.max_pending = max_pending
+        self.max_pending_per_client = max_pending_per_client
+        self.node = node
+        self.lease = lease
+        self.rejected = 0
+        # Jobs run to the end by this node's workers, by final status
+        self.finished = {COMPLETED: 0, FAILED: 0}
+        self._tasks: list[asyncio.Task] = []
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        # Handler tasks of the jobs this node's workers are running, and those whose lease was lost
+        self._running: dict[str, asyncio.Task] = {}
+        self._lost: set[str] = set()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} render workers on node {self.node} with the {self.store.name} job store")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job: Job, admit: bool = True) -> Job:
+        """Queue a job, or raise QueueFullError when admit is set and the queue is full.
+
+        Follow-up work of a job that was already admitted passes admit=False.
+        """
+        if admit:
+            self._admit(job.client)
+        self.store.prune(self.max_history)
+        job.events.append({"stage": "queued", "time": time.time()})
+        self.store.add(job)
+        return job
+
+    def submit_many(self, jobs: list[Job], max_per_client: Optional[int] = None) -> list[Job]:
+        """Queue all of jobs, or none of them when they don't all fit.
+
+        max_per_client replaces max_pending_per_client for these jobs.
+        """
+        if jobs:
+            self._admit(jobs[0].client, len(jobs), max_per_client)
+        return [self.submit(job, admit=False) for job in jobs]
+
+    def add_batch(self, batch: Batch) -> Batch:
+        self.store.add_batch(batch)
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        return self.store.get_batch(batch_id)
+
+    def record(self, job: Job) -> Job:
+        """Track a job that finished without going through the queue."""
+        self.store.prune(self.max_history)
+        job.events.append({"stage": "done", "time": time.time(), **(job.result or {})})
+        self.store.add(job)
+        return job
+
+    def publish(self, job: Job, stage: str, **data):
+        """Record a progress event and pass it to everyone following the job.
+
+        Events of a job this node runs are only recorded while it holds the
+        lease, so a node that lost it can't overwrite the new owner's.
+        """
+        event = {"stage": stage, "time": time.time(), **data}
+        job.events.append(event)
+        node = self.node if job.id in self._running else None
+        if not self.store.save(job, node):
+            self._lose_lease(job)
+            return
+        self._notify(job, event)
+
+    def _notify(self, job: Job, event: dict):
+        for subscriber in self._subscribers.get(job.id, ()):
+            subscriber.put_nowait(event)
+
+    def progress_callback(self, job: Job) -> Callable[..., None]:
+        """Return a ``progress(stage, **data)`` callback safe to call from worker threads."""
+        loop = asyncio.get_running_loop()
+
+        def progress(stage: str, **data):
+            loop.call_soon_threadsafe(lambda: self.publish(job, stage, **data))
+
+        return progress
+
+    async def subscribe(self, job: Job, keepalive: float = 15) -> AsyncIterator[Optional[dict]]:
+        """Yield the job's events so far, then new ones until it finishes.
+
+        Yields None after keepalive seconds without an event so that callers
+        can keep idle connections open. With a shared store the job may run
+        on another node, so its events are read back from the store.
+        """
+        subscriber: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job.id, set()).add(subscriber)
+        wait = min(keepalive, self.store.poll_interval or keepalive)
+        seen = 0
+        idle = 0.0
+        try:
+            while True:
+                if self.store.shared:
+                    job = self.store.get(job.id) or job
+                for event in job.events[seen:]:
+                    seen += 1
+                    idle = 0.0
+                    yield event
+                    if event["stage"] in FINAL_STAGES:
+                        return
+                try:
+                    await asyncio.wait_for(subscriber.get(), wait)
+                except asyncio.TimeoutError:
+                    idle += wait
+                    if idle >= keepalive:
+                        idle = 0.0
+                        yield None
+        finally:
+            self._subscribers[job.id].discard(subscriber)
+            if not self._subscribers[job.id]:
+                del self._subscribers[job.id]
+
+    async def follow(self, jobs: list[Job], keepalive: float = 15) -> AsyncIterator[Optional[tuple[Job, dict]]]:
+        """Yield each job with its final event as it finishes, until all have.
+
+        Yields None after keepalive seconds without a job finishing.
+        """
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def follow_one(job: Job):
+            async for event in self.subscribe(job):
+                if event is not None and event["stage"] in FINAL_STAGES:
+                    finished.put_nowait((self.get(job.id) or job, event))
+                    return
+
+        tasks = [asyncio.create_task(follow_one(job)) for job in jobs]
+        try:
+            for _ in jobs:
+                while True:
+                    try:
+                        yield await asyncio.wait_for(finished.get(), keepalive)
+                        break
+                    except asyncio.TimeoutError:
+                        yield None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def unfinished(self) -> list[Job]:
+        return self.store.unfinished()
+
+    def stats(self) -> dict:
+        counts = self.store.counts()
+        return {
+            "node": self.node,
+            "store": self.store.name,
+            "workers": self.workers,
+            "queue_size": counts[QUEUED],
+            "rejected": self.rejected,
+            "finished": dict(self.finished),
+            **counts
+        }
+
+    def _admit(self, client: str, count: int = 1, max_per_client: Optional[int] = None):
+        # Running jobs count too: most of them are waiting for a render slot
+        pending = self.store.unfinished()
+        if self.max_pending and len(pending) + count > self.max_pending:
+            self.rejected += 1
+            raise QueueFullError(f"{len(pending)} jobs are already pending")
+        max_per_client = max_per_client or self.max_pending_per_client
+        if max_per_client and sum(j.client == client for j in pending) + count > max_per_client:
+            self.rejected += 1
+            raise QueueFullError(f"Client {client} would have more than {max_per_client} jobs pending")
+
+    def _lose_lease(self, job: Job):
+        """Stop a job another node has taken over, without touching it again."""
+        if job.id in self._lost:
+            return
+        logger.error(f"Lost the lease on job {job.id}; another node has taken it over")
+        self._lost.add(job.id)
+        task = self._running.get(job.id)
+        if task is not None:
+            task.cancel()
+
+    async def _heartbeat(self, job: Job):
+        """Renew the lease on a running job until it is lost."""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not await asyncio.to_thread(self.store.renew, job.id, self.node, self.lease):
+                self._lose_lease(job)
+                return
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.store.claim(self.node, self.lease)
+            task = asyncio.create_task(self.handler(job))
+            self._running[job.id] = task
+            self.publish(job, "started", node=self.node)
+            heartbeat = asyncio.create_task(self._heartbeat(job)) if self.store.shared else None
+            try:
+                job.result = await task
+                job.status = COMPLETED
+                job.finished_at = time.time()
+                self.finished[COMPLETED] += 1
+                self.publish(job, "done", **job.result)
+            except asyncio.CancelledError:
+                if job.id in self._lost:
+                    # The job is someone else's now
+                    continue
+                if self.store.shared:
+                    # Let another node finish it; the event is written with the release, as the job
+                    # may be claimed again right after
+                    event = {"stage": "queued", "time": time.time(), "requeued": True}
+                    job.events.append(event)
+                    if self.store.release(job, self.node):
+                        self._notify(job, event)
+                    raise
+                job.status = FAILED
+                job.error = "Server shutting down"
+                job.finished_at = time.time()
+                self.publish(job, "failed", error=job.error)
+                raise
+            except Exception as e:
+                logger.error(f"Job {job.id} failed on worker {index}: {str(e)}")
+                job.status = FAILED
+                job.error = str(e)
+                job.finished_at = time.time()
+                self.finished[FAILED] += 1
+                self.publish(job, "failed", error=job.error)
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
+                self._running.pop(job.id, None)
+                self._lost.discard(job.id)
@@ -0,0 +1,19 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(path: Path, default: Any) -> Any:
+    """Read a JSON file, falling back to default if missing or unreadable."""
+    if not path.exists():
+        return default
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring unreadable file {path}: {str(e)}")
+        return default
+
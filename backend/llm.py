@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import random
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Scene body returned by StubBackend: three animations, no LaTeX
+STUB_SCENE = """circle = Circle()
+self.play(Create(circle))
+label = Text("Stub scene", font_size=24).next_to(circle, UP)
+self.play(Write(label))
+self.wait(1)"""
+
+
+class LLMError(Exception):
+    """Raised when the LLM gives no usable answer after all retries."""
+
+
+class LLMBackend:
+    """Something that turns a prompt into text.
+
+    Backends make one attempt per call; timeouts, retries, concurrency and
+    coalescing are handled by LLMClient.
+    """
+
+    name = "backend"
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether a failed call is worth repeating with the same prompt."""
+        return True
+
+    async def close(self):
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini over the async gRPC transport.
+
+    The model object, and with it the client channel, is created once and
+    shared by every call, so connections are reused between requests.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str], model_name: str = "gemini-1.5-flash-latest", timeout: float = 60):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.timeout = timeout
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt, request_options={"timeout": self.timeout})
+        # Raises ValueError when the answer was blocked or empty
+        return response.text
+
+    def is_retryable(self, error: Exception) -> bool:
+        try:
+            from google.api_core import exceptions
+        except ImportError:
+            return not isinstance(error, ValueError)
+        if isinstance(error, (exceptions.InvalidArgument, exceptions.PermissionDenied, exceptions.Unauthenticated)):
+            return False
+        # A blocked or empty answer will be blocked again
+        return not isinstance(error, ValueError)
+
+
+class StubBackend(LLMBackend):
+    """Local backend that answers every prompt with a fixed scene after a delay.
+
+    Lets the service, its tests and benchmarks run without network access
+    or an API key.
+    """
+
+    name = "stub"
+
+    def __init__(self, delay: float = 0.0, response: str = STUB_SCENE):
+        self.delay = delay
+        self.response = response
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.response
+
+
+def make_backend(name: str, api_key: Optional[str] = None, timeout: float = 60, stub_delay: float = 0.0) -> LLMBackend:
+    if name == "stub":
+        return StubBackend(delay=stub_delay)
+    if name == "gemini":
+        return GeminiBackend(api_key, timeout=timeout)
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+class LLMClient:
+    """Bounded, retrying and coalescing front end for an LLMBackend.
+
+    At most max_concurrency calls reach the backend at once. Each attempt
+    is cut off after timeout seconds and failed attempts are retried up to
+    retries times, waiting backoff * 2**attempt seconds (with jitter) in
+    between. Callers asking for a prompt that is already in flight wait
+    for that call instead of starting their own.
+    """
+
+    def __init__(self, backend: LLMBackend, max_concurrency: int = 4, timeout: float = 60,
+                 retries: int = 2, backoff: float = 1.0):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.calls = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failures = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def generate(self, prompt: str) -> str:
+        in_flight = self._in_flight.get(prompt)
+        if in_flight is not None:
+            self.coalesced += 1
+            # Shield so one waiter giving up doesn't cancel the shared call
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.ensure_future(self._generate(prompt))
+        self._in_flight[prompt] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(prompt, None))
+        return await asyncio.shield(future)
+
+    async def _generate(self, prompt: str) -> str:
+        if self._semaphore is None:
+            # Created lazily so it binds to the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        for attempt in range(self.retries + 1):
+            self.calls += 1
+            try:
+                async with self._semaphore:
+                    return await asyncio.wait_for(self.backend.generate(prompt), self.timeout)
+            except Exception as e:
+                if attempt == self.retries or not self.backend.is_retryable(e):
+                    self.failures += 1
+                    raise LLMError(f"{self.backend.name} call failed: {type(e).__name__}: {e}") from e
+                # Back off without holding a slot other prompts could use
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                self.retried += 1
+                logger.warning(f"LLM call attempt {attempt + 1} failed ({type(e).__name__}: {e}), "
+                               f"retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failures": self.failures
+        }
@@ -1,24 +1,59 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import os
+import json
 import uuid
-import subprocess
+import time
+import asyncio
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 import sys
 import logging
 import shutil
-import google.generativeai as genai
+import socket
+import textwrap
+import threading
 from dotenv import load_dotenv
 
+from artifacts import make_artifact_store
+from glyph_cache import GlyphCache, PREWARM_FORMULAS
+from hls import HlsStream, PLAYLIST, PLAYLIST_TYPE
+from metrics import FALLBACK_SCENES, SCENE_REPAIRS, TEMPLATE_SCENES, record_stage, registry, stage
+from segment_cache import SegmentCache
+from llm import LLMClient, LLMError, make_backend
+from jobs import Batch, Job, JobManager, QueueFullError, QUEUED, RUNNING, COMPLETED, FAILED, default_worker_count
+from job_store import make_job_store
+from render import render_scene, RenderError
+from render_cache import RenderCache, make_cache_key, make_scene_key, normalize_prompt
+from scene_store import SceneStore
+from scene_templates import TEMPLATES, TemplateLibrary, TemplateMatch
+from storage import Storage
+from scheduler import RenderScheduler
+from render_server import RenderServer
+from scene_analysis import count_animations, estimate_cost, load_manim_names, normalize_body, validate_scene, wrap_scene
+from toolchain import probe_toolchain, recheck_periodically
+from topics import TopicMatch, topic_matcher
+from video_response import video_response
+
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-1.5-flash-latest')
+# Configure the LLM: Gemini, or a local stub for tests and benchmarks
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+llm_client = LLMClient(
+    make_backend(
+        os.getenv("LLM_BACKEND", "gemini"),
+        api_key=os.getenv("GEMINI_API_KEY"),
+        timeout=LLM_TIMEOUT,
+        stub_delay=float(os.getenv("LLM_STUB_DELAY", "0"))
+    ),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+    timeout=LLM_TIMEOUT,
+    retries=int(os.getenv("LLM_RETRIES", "2")),
+    backoff=float(os.getenv("LLM_BACKOFF", "1"))
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -55,43 +90,34 @@ class AnimationRequest(BaseModel):
     quality: Optional[str] = "medium"  # low, medium, high
     level: Optional[str] = "intermediate"  # basic, intermediate, advanced
     style: Optional[str] = "educational"   # fun, serious, engaging
+    preview: Optional[bool] = True  # return a low quality draft first
+    stream: Optional[bool] = False  # serve each render as a growing HLS playlist while it runs
+
+class BatchRequest(BaseModel):
+    items: list[AnimationRequest]
+
+class RenderRequest(BaseModel):
+    quality: Optional[str] = "medium"  # low, medium, high
+    stream: Optional[bool] = False
 
 def detect_topic(prompt: str) -> str:
     """Detect the mathematical topic from the prompt."""
-    topics = {
-        "calculus": ["derivative", "integral", "limit", "differentiation", "integration"],
-        "algebra": ["equation", "factor", "solve", "polynomial", "quadratic"],
-        "geometry": ["circle", "triangle", "area", "pythagorean", "perimeter", "volume"],
-        "linear algebra": ["matrix", "vector", "eigenvalue", "determinant", "transformation"],
-        "statistics": ["probability", "distribution", "mean", "median", "standard deviation"],
-        "trigonometry": ["sine", "cosine", "tangent", "angle", "trigonometric"]
-    }
-    
-    for topic, keywords in topics.items():
-        for word in keywords:
-            if word in prompt.lower():
-                return topic
-    return "general"
-
-def enrich_prompt(prompt: str) -> str:
-    """Enrich the prompt with additional context based on keywords."""
-    keyword_map = {
-        "pythagorean": "The Pythagorean theorem states that in a right-angled triangle, the square of the hypotenuse is equal to the sum of the squares of the other two sides.",
-        "derivative": "The derivative of a function represents the rate at which the function value changes as its input changes. Visualize it as the slope of a tangent line.",
-        "matrix multiplication": "Matrix multiplication involves taking the dot product of rows and columns. Animate using two matrices and their product step-by-step.",
-        "integration": "Integration is the process of finding the area under a curve. Show the Riemann sum approximation and its convergence to the actual area.",
-        "eigenvalue": "Eigenvalues represent the scaling factor of eigenvectors in a linear transformation. Visualize how vectors are scaled but maintain their direction.",
-        "probability": "Probability measures the likelihood of an event occurring. Show the sample space and how probabilities are calculated."
-    }
+    return topic_matcher.match(prompt).topic
 
-    for key, expansion in keyword_map.items():
-        if key in prompt.lower():
-            return f"{prompt}. Context: {expansion}"
+def enrich_prompt(prompt: str, match: Optional[TopicMatch] = None) -> str:
+    """Enrich the prompt with additional context for every keyword it mentions."""
+    enrichments = (match or topic_matcher.match(prompt)).enrichments
+    if enrichments:
+        return f"{prompt}. Context: {' '.join(enrichments)}"
     return prompt
 
 def build_contextual_prompt(prompt: str, level: str = "intermediate", style: str = "educational") -> str:
     """Build a detailed prompt for Gemini with context and guidelines."""
-    topic = detect_topic(prompt)
+    # One pass finds both the topic and the enrichments; classifying the
+    # enriched text instead would count the keywords of the added context
+    match = topic_matcher.match(prompt)
+    topic = match.topic
+    prompt = enrich_prompt(prompt, match)
     
     style_guidance = {
         "fun": "Use playful colors and smooth transitions. Include some element of surprise or discovery.",
@@ -131,53 +157,71 @@ Write the Python code for the `construct(self)` method of a Manim Scene that tea
 Return only the body of the `construct(self)` method as valid Python code.
 """
 
-def generate_manim_scene(prompt: str, level: str = "intermediate", style: str = "educational") -> tuple[str, str]:
-    """Generate a Manim scene based on the prompt using Gemini API, with fallback and proper indentation."""
+async def generate_manim_scene(prompt: str, level: str = "intermediate", style: str = "educational",
+                               timings: Optional[dict] = None) -> tuple[str, str, bool]:
+    """Generate a Manim scene based on the prompt using Gemini API, with fallback and proper indentation.
+
+    The code is checked statically before it is returned. A scene that
+    fails the check gets SCENE_REPAIR_ROUNDS chances to be fixed by Gemini,
+    after which the fallback scene is used, so broken code never costs a render.
+    Time spent in each stage is added to timings when given.
+
+    Returns the scene code, the scene class name and whether the fallback scene was used.
+    """
     scene_name = f"Scene_{uuid.uuid4().hex[:8]}"
     try:
         # Enrich and build the prompt
-        enriched_prompt = enrich_prompt(prompt)
-        gemini_prompt = build_contextual_prompt(enriched_prompt, level, style)
-        
-        # Get response from Gemini
-        response = model.generate_content(gemini_prompt)
-        scene_code = response.text
-
-        # Clean and indent each line by 8 spaces for correct placement inside construct()
-        indented_code_lines = []
-        for line in scene_code.splitlines():
-            cleaned_line = line.strip()
-            # Skip empty lines, markdown fences, and potential import statements
-            if not cleaned_line or cleaned_line in ['```python', '```'] or cleaned_line.startswith('from manim import'):
-                continue
-            # Add 8 spaces indentation to the original line (preserving internal spacing if any)
-            indented_code_lines.append("        " + line.lstrip())
-
-        indented_code = "\n".join(indented_code_lines)
-        
-        # Wrap the generated code in a proper Manim scene class
-        wrapped_code = f"""
-from manim import *
+        with stage("prompt_build", timings):
+            gemini_prompt = build_contextual_prompt(prompt, level, style)
 
-class {scene_name}(Scene):
-    def construct(self):
-{indented_code}
-"""
-        
-        return wrapped_code, scene_name
-        
-    except Exception as e:
+        # Get response from Gemini without blocking the event loop, and
+        # indent it for correct placement inside construct()
+        with stage("llm", timings):
+            answer = await llm_client.generate(gemini_prompt)
+        with stage("validate", timings):
+            body = normalize_body(answer)
+            problems = validate_scene(wrap_scene(scene_name, body), app.state.manim_names)
+        for _ in range(SCENE_REPAIR_ROUNDS):
+            if not problems:
+                break
+            logger.warning(f"Generated scene failed validation, asking for a repair: {'; '.join(problems)}")
+            with stage("llm", timings):
+                answer = await llm_client.generate(build_repair_prompt(body, problems))
+            with stage("validate", timings):
+                body = normalize_body(answer)
+                problems = validate_scene(wrap_scene(scene_name, body), app.state.manim_names)
+            SCENE_REPAIRS.inc(result="failed" if problems else "fixed")
+
+        if not problems:
+            return wrap_scene(scene_name, body), scene_name, False
+        logger.error(f"Generated scene is still invalid: {'; '.join(problems)}")
+    except LLMError as e:
         logger.error(f"Error generating scene with Gemini: {str(e)}")
-        # Fallback to a simple animation if Gemini fails
-        fallback_code = generate_fallback_scene(prompt)
-        wrapped_code = f"""
-from manim import *
-
-class {scene_name}(Scene):
-    def construct(self):
-{fallback_code}
+
+    # Fallback to a simple animation if Gemini fails
+    FALLBACK_SCENES.inc()
+    return wrap_scene(scene_name, generate_fallback_scene(prompt)), scene_name, True
+
+def build_repair_prompt(body: str, problems: list[str]) -> str:
+    """Ask Gemini to fix only the listed problems in a construct() body."""
+    problem_list = "\n".join(f"- {problem}" for problem in problems)
+    return f"""
+The following body of a Manim Scene's `construct(self)` method was rejected before rendering:
+
+{textwrap.dedent(body)}
+
+### Problems:
+{problem_list}
+
+### Task:
+Fix these problems and change nothing else.
+- Use only names that `from manim import *` provides or that the code defines itself.
+- DO NOT include `import` statements, markdown fences, file or OS access.
+- Keep consistent 4-space indentation.
+
+### Output:
+Return only the corrected body of the `construct(self)` method as valid Python code.
 """
-        return wrapped_code, scene_name
 
 def generate_fallback_scene(prompt: str) -> str:
     """Generate a fallback scene if Gemini API fails."""
@@ -197,145 +241,797 @@ def generate_fallback_scene(prompt: str) -> str:
         self.wait(2)
     """
 
-def check_manim_installation():
-    """Check if Manim is properly installed and accessible."""
-    try:
-        result = subprocess.run(
-            ["python", "-m", "manim", "--version"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        logger.info(f"Manim version: {result.stdout.strip()}")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Manim version check failed: {e.stderr}")
-        return False
-    except FileNotFoundError:
-        logger.error("Manim command not found. Please ensure Manim is installed and in PATH")
-        return False
-
-@app.post("/generate")
-async def generate_animation(request: AnimationRequest):
-    try:
-        # Check Manim installation first
-        if not check_manim_installation():
-            raise HTTPException(
-                status_code=500,
-                detail="Manim is not properly installed or accessible"
+async def run_animation_job(job: Job) -> dict:
+    """Produce scene code and render it. Runs on a render worker.
+
+    Scene code is reused from the scene store when this is a re-render of
+    an existing animation or when the same prompt, level and style have
+    been generated before. New requests a scene template answers
+    confidently are filled in from it; only the rest go to Gemini.
+    """
+    params = job.params
+    record_stage("queue", job.started_at - job.created_at, job.timings)
+    output_dir = VIDEOS_DIR / job.animation_id
+    output_dir.mkdir(exist_ok=True)
+    output_name = None
+    # Private scratch space: Manim output, glyphs and config for this job only
+    work_dir = TEMP_DIR / job.id
+
+    record = scene_store.get_animation(job.animation_id)
+    if record is None and ("prompt" not in params or params.get("upgrade_of")):
+        # Re-render or upgrade of an animation written on another node
+        record = await asyncio.to_thread(fetch_animation, job.animation_id)
+    if record is None and "prompt" not in params:
+        raise RuntimeError(f"The scene of animation {job.animation_id} no longer exists; generate it again")
+    if record:
+        # Re-render of an existing animation at another quality
+        scene_name = record["scene_name"]
+        used_fallback = record["fallback"]
+        scene_file = scene_store.scene_file(job.animation_id)
+        scene_code = scene_store.load_code(job.animation_id)
+        output_name = f"{scene_name}_{params['quality']}.mp4"
+    else:
+        source_id = scene_store.find(params["scene_key"])
+        template = None if source_id else match_template(params["prompt"])
+        if source_id:
+            logger.info(f"Reusing scene code from animation {source_id}")
+            scene_code = scene_store.load_code(source_id)
+            scene_name = scene_store.get_animation(source_id)["scene_name"]
+            used_fallback = False
+        elif template:
+            # A vetted scene for a common request: no LLM call, and it always renders
+            job_manager.publish(job, "template", template=template.template.name)
+            scene_name = f"Scene_{uuid.uuid4().hex[:8]}"
+            with stage("template", job.timings):
+                scene_code = template.render(scene_name, params["level"], params["style"],
+                                             app.state.toolchain["latex"]["available"])
+            TEMPLATE_SCENES.inc(template=template.template.name)
+            used_fallback = False
+        else:
+            # Generate Manim scene code using Gemini with level and style
+            job_manager.publish(job, "llm")
+            scene_code, scene_name, used_fallback = await generate_manim_scene(
+                params["prompt"],
+                level=params["level"],
+                style=params["style"],
+                timings=job.timings
             )
 
-        # Generate unique ID for this animation
-        animation_id = str(uuid.uuid4())
-        output_dir = VIDEOS_DIR / animation_id
-        output_dir.mkdir(exist_ok=True)
-        
-        # Generate Manim scene code using Gemini with level and style
-        scene_code, scene_name = generate_manim_scene(
-            request.prompt,
-            level=request.level,
-            style=request.style
-        )
-        
-        # Write scene to temporary file with explicit UTF-8 encoding
+        # Write scene to file with explicit UTF-8 encoding
         scene_file = output_dir / f"{scene_name}.py"
         with open(scene_file, "w", encoding="utf-8") as f:
             f.write(scene_code)
-        
-        # Set quality flags based on request
-        quality_flags = {
-            "low": "-ql",
-            "medium": "-qm",
-            "high": "-qh"
-        }
-        quality_flag = quality_flags.get(request.quality, "-qm")
-        
-        # Set environment variables for Manim
-        env = os.environ.copy()
-        env["MANIM_MEDIA_DIR"] = str(MEDIA_DIR.absolute())
-        
-        # Run Manim with the correct command
-        cmd = [
-            "python", "-m", "manim",
-            quality_flag,
-            str(scene_file),
-            scene_name
-        ]
-        
-        logger.info(f"Running Manim command: {' '.join(cmd)}")
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env,
-            cwd=str(BASE_DIR)  # Set working directory to backend folder
-        )
-        
-        logger.info(f"Manim output: {result.stdout}")
-        
-        # Look for the generated video in all possible quality directories
-        possible_paths = [
-            MEDIA_DIR / "videos" / scene_name / "480p15" / f"{scene_name}.mp4",
-            MEDIA_DIR / "videos" / scene_name / "720p30" / f"{scene_name}.mp4",
-            MEDIA_DIR / "videos" / scene_name / "1080p60" / f"{scene_name}.mp4",
-            output_dir / f"{scene_name}.mp4"  # Check if it was created directly in output_dir
-        ]
-        
-        # Log all possible paths for debugging
-        logger.info("Checking for video in paths:")
-        for path in possible_paths:
-            logger.info(f"Checking path: {path} (exists: {path.exists()})")
-        
-        output_file = None
-        for path in possible_paths:
-            if path.exists():
-                output_file = path
-                logger.info(f"Found video at: {path}")
-                break
-        
-        if output_file:
-            # If the file is in media directory, move it to output directory
-            if MEDIA_DIR in output_file.parents:
-                final_path = output_dir / f"{scene_name}.mp4"
-                logger.info(f"Moving video from {output_file} to {final_path}")
-                shutil.move(str(output_file), str(final_path))
-                # Clean up media directory
-                shutil.rmtree(MEDIA_DIR / "videos" / scene_name, ignore_errors=True)
-                output_file = final_path
-            
-            logger.info(f"Returning video URL for file: {output_file}")
-            return {
-                "id": animation_id,
-                "video_url": f"/videos/{animation_id}/{scene_name}.mp4"
-            }
-        else:
-            logger.error("No video file found in any of the expected locations")
-            raise HTTPException(
-                status_code=500,
-                detail="Animation file was not created"
-            )
-        
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Manim execution failed: {e.stderr}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Animation generation failed: {e.stderr}"
+        scene_store.add(job.animation_id, scene_name, params["scene_key"], params, used_fallback)
+
+    # Warm workers skip interpreter start and the manim import for every job
+    render = render_server.render if render_server.running else render_scene
+    progress = job_manager.progress_callback(job)
+    total = count_animations(scene_code)
+
+    # Play the partial movie files while the rest of the scene renders
+    stream = None
+    if params.get("stream") and app.state.toolchain["ffmpeg"]["available"]:
+        stream = HlsStream(
+            output_dir / stream_dir_name(job),
+            ffmpeg=app.state.toolchain["ffmpeg"]["path"],
+            on_start=lambda: progress("streaming", stream_url=stream_url(job))
         )
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+
+    def render_progress(stage: str, segment: Optional[str] = None, **data):
+        if stream is not None and segment:
+            stream.add(Path(segment), data["animation"])
+        progress(stage, total=total, **data)
+
+    # Compile LaTeX and Text glyphs and render segments in private directories
+    # that the shared caches are linked into on lookup; only segments Manim
+    # hasn't seen are rendered
+    glyph_dir = work_dir / "glyphs"
+    final_path = output_dir / (output_name or f"{scene_name}.mp4")
+    lookups = {**glyph_cache.prepare(glyph_dir), **segment_cache.prepare(work_dir)}
+    config = {**glyph_cache.job_config(glyph_dir), **segment_cache.job_config(work_dir)}
+    report = {}
+    # Cheap renders, and clients with fewer renders running, get free slots first
+    cost = estimate_cost(scene_code, params["quality"])
+    job_manager.publish(job, "waiting", cost=cost)
+    waiting_since = time.perf_counter()
+    cancelled = False
+    try:
+        async with render_scheduler.slot(job.client, cost, job.priority):
+            record_stage("wait", time.perf_counter() - waiting_since, job.timings)
+            job_manager.publish(job, "rendering", animation=0, total=total)
+            # Retry transient Manim failures with the same code rather than new code
+            for attempt in range(RENDER_RETRIES + 1):
+                try:
+                    with stage("manim", job.timings, quality=params["quality"], attempt=attempt):
+                        output_file = await run_render(
+                            render, scene_file, scene_name, params["quality"], work_dir, final_path, BASE_DIR,
+                            render_progress, config, report, RENDER_LIMITS, lookups
+                        )
+                    break
+                except RenderError as e:
+                    if attempt == RENDER_RETRIES:
+                        raise RuntimeError(str(e))
+                    logger.warning(f"Render attempt {attempt + 1} for job {job.id} failed, retrying")
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        if stream is not None:
+            # Before the segment cache takes the partial movie files
+            await asyncio.to_thread(stream.finish)
+        # Where the render's time went: process startup, frames, encoding, moving the file
+        for name, seconds in report.get("timings", {}).items():
+            record_stage(name, seconds, job.timings)
+        # A killed render may have left its last files half written
+        if not cancelled:
+            glyphs = report.get("glyphs", {})
+            added = await asyncio.to_thread(glyph_cache.collect, glyph_dir, glyphs.get("used", ()))
+            # Only warm workers can count hits; otherwise every new glyph is a miss
+            glyph_cache.record(glyphs.get("hits", 0), glyphs.get("misses", added))
+            segments = report.get("segments", {})
+            added = await asyncio.to_thread(segment_cache.collect, work_dir, segments.get("used", ()))
+            segment_cache.record(segments.get("hits", 0), segments.get("misses", added))
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Don't let a fallback scene stand in for the real answer on later requests
+    if used_fallback:
+        storage.add_video(job.animation_id, output_file, params["quality"])
+    else:
+        render_cache.put(params["cache_key"], job.animation_id, output_file, params["quality"])
+    # Let every node serve the video and re-render the scene
+    await asyncio.to_thread(
+        artifact_store.publish, job.animation_id, [scene_file, output_file], storage.get_animation(job.animation_id)
+    )
+    await asyncio.to_thread(storage.enforce, active_ids())
+    logger.info(f"Returning video URL for file: {output_file}")
+    record_stage("total", time.time() - job.created_at, job.timings)
+    video_url = f"/videos/{job.animation_id}/{output_file.name}"
+    if params.get("upgrade"):
+        return {"video_url": video_url, **submit_upgrade(job, params["upgrade"])}
+    if params.get("upgrade_of"):
+        finish_upgrade(job, video_url)
+    return {"video_url": video_url}
+
+async def run_render(render: Callable[..., Path], *args) -> Path:
+    """Run a blocking render in a thread, and stop it when the calling task is cancelled.
+
+    Cancelling the await alone would leave Manim running after the job
+    gave up its render slot and removed its scratch directory, so the
+    render is told to stop and waited for before the cancellation goes on.
+    """
+    cancel = threading.Event()
+    render_thread = asyncio.ensure_future(asyncio.to_thread(render, *args, cancel=cancel))
+    try:
+        return await asyncio.shield(render_thread)
+    except asyncio.CancelledError:
+        cancel.set()
+        while not render_thread.done():
+            try:
+                await asyncio.wait({render_thread})
+            except asyncio.CancelledError:
+                pass
+        if not render_thread.cancelled():
+            # Normally RenderCancelled; nothing is waiting for it any more
+            render_thread.exception()
+        raise
+
+def stream_dir_name(job: Job) -> str:
+    return f"{job.id}.hls"
+
+def stream_url(job: Job) -> str:
+    return f"/videos/{job.animation_id}/{stream_dir_name(job)}/{PLAYLIST}"
+
+def match_template(prompt: str) -> Optional[TemplateMatch]:
+    """The scene template that answers prompt, if templates are on and one matches confidently."""
+    if not SCENE_TEMPLATES:
+        return None
+    return template_library.match(prompt, topic_matcher.match(prompt))
+
+def fetch_animation(animation_id: str) -> Optional[dict]:
+    """Copy the scene of an animation written on another node from the artifact store and index it."""
+    record = artifact_store.fetch_scene(animation_id, VIDEOS_DIR / animation_id)
+    if record is None:
+        return None
+    scene_store.add(animation_id, record["scene_name"], record["scene_key"], record, record["fallback"])
+    return scene_store.get_animation(animation_id)
+
+def submit_upgrade(draft: Job, upgrade: dict, admit: bool = False) -> dict:
+    """Queue the render at the requested quality behind a finished draft.
+
+    Drafts of the same request share the upgrade already queued or
+    running for it, on any node sharing the job store. A new upgrade for
+    a draft that was never queued itself, i.e. one served from the cache,
+    is admitted like any request, see JobManager.submit. Returns the
+    fields to add to the draft's result.
+    """
+    job_id = job_store.join_upgrade(upgrade["cache_key"], draft.id)
+    if job_id is None:
+        job_id = job_manager.submit(Job(
+            animation_id=draft.animation_id,
+            params={**upgrade, "upgrade_of": draft.id},
+            priority=UPGRADE_PRIORITY,
+            client=draft.client
+        ), admit=admit).id
+        job_store.add_upgrade(upgrade["cache_key"], job_id)
+    return {"draft": True, "upgrade_job_id": job_id, "upgrade_status_url": f"/jobs/{job_id}"}
+
+def finish_upgrade(job: Job, video_url: str):
+    """Point every draft waiting on a finished upgrade at its video."""
+    replace_draft(job.params["upgrade_of"], video_url)
+    for draft_job_id in job_store.pop_upgrade(job.params["cache_key"], job.id):
+        replace_draft(draft_job_id, video_url)
+
+def replace_draft(draft_job_id: str, video_url: str):
+    """Point a draft's job at the upgraded video and tell anyone still polling it."""
+    draft = job_manager.get(draft_job_id)
+    if draft is None or draft.result is None:
+        return
+    draft.result.update(video_url=video_url, draft=False)
+    job_manager.publish(draft, "upgraded", video_url=video_url)
+
+RENDER_RETRIES = int(os.getenv("RENDER_RETRIES", "1"))
+# Drafts render at this quality; upgrades queue behind every draft
+PREVIEW_FIRST = os.getenv("PREVIEW_FIRST", "1") == "1"
+DRAFT_QUALITY = "low"
+UPGRADE_PRIORITY = 1
+SCENE_REPAIR_ROUNDS = int(os.getenv("SCENE_REPAIR_ROUNDS", "1"))
+SCENE_TEMPLATES = os.getenv("SCENE_TEMPLATES", "1") == "1"
+template_library = TemplateLibrary(TEMPLATES, max_words=int(os.getenv("TEMPLATE_MAX_WORDS", "16")))
+# Template pre-renders queue behind every request's render
+TEMPLATE_PREWARM_PRIORITY = UPGRADE_PRIORITY + 1
+glyph_cache = GlyphCache(MEDIA_DIR, max_bytes=int(os.getenv("GLYPH_CACHE_MAX_BYTES", str(256 * 1024 ** 2))))
+segment_cache = SegmentCache(MEDIA_DIR, max_bytes=int(os.getenv("SEGMENT_CACHE_MAX_BYTES", str(1024 ** 3))))
+storage = Storage(
+    VIDEOS_DIR,
+    max_bytes=int(os.getenv("STORAGE_MAX_BYTES", str(5 * 1024 ** 3))),
+    ttl=float(os.getenv("STORAGE_TTL_DAYS", "0")) * 86400,
+    grace=float(os.getenv("STORAGE_ORPHAN_GRACE", "3600"))
+)
+STORAGE_SWEEP_INTERVAL = float(os.getenv("STORAGE_SWEEP_INTERVAL", "600"))
+scene_store = SceneStore(storage)
+render_cache = RenderCache(storage)
+# Manim renders are limited to RENDER_SLOTS at a time by the scheduler; the
+# extra job workers write scenes with the LLM meanwhile, so the scheduler
+# has a choice of renders whenever a slot frees up
+RENDER_SLOTS = default_worker_count()
+render_scheduler = RenderScheduler(RENDER_SLOTS, aging=float(os.getenv("RENDER_SCHEDULER_AGING", "1")))
+# Nodes sharing a job store take work from one queue; nodes sharing an
+# artifact store serve each other's videos
+NODE_ID = os.getenv("NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+job_store = make_job_store(
+    os.getenv("JOB_STORE", "memory"),  # memory, sqlite
+    Path(os.getenv("JOB_STORE_PATH", str(BASE_DIR / "jobs.sqlite3"))),
+    poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "1")),
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "2")),
+    busy_timeout=float(os.getenv("JOB_STORE_BUSY_TIMEOUT", "2"))
+)
+artifact_store = make_artifact_store(
+    os.getenv("ARTIFACT_STORE", "local"),  # local, directory
+    Path(os.getenv("ARTIFACT_STORE_PATH", str(BASE_DIR / "artifacts")))
+)
+job_manager = JobManager(
+    run_animation_job,
+    job_store,
+    workers=RENDER_SLOTS + llm_client.max_concurrency,
+    max_pending=int(os.getenv("MAX_PENDING_JOBS", "100")),
+    max_pending_per_client=int(os.getenv("MAX_PENDING_JOBS_PER_CLIENT", "10")),
+    node=NODE_ID,
+    lease=float(os.getenv("JOB_LEASE_SECONDS", "30"))
+)
+QUEUE_FULL_RETRY_AFTER = os.getenv("QUEUE_FULL_RETRY_AFTER", "10")
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "50"))
+RENDER_LIMITS = {
+    "cpu_seconds": int(os.getenv("RENDER_CPU_SECONDS", "900")),
+    "memory_mb": int(os.getenv("RENDER_MEMORY_MB", "4096"))
+}
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "warm")  # warm, subprocess
+render_server = RenderServer(
+    size=RENDER_SLOTS,
+    max_jobs=int(os.getenv("RENDER_WORKER_MAX_JOBS", "50")),
+    max_rss_mb=int(os.getenv("RENDER_WORKER_MAX_RSS_MB", "1024")),
+    timeout=float(os.getenv("RENDER_TIMEOUT", "600"))
+)
+
+TOOLCHAIN_CHECK_INTERVAL = float(os.getenv("TOOLCHAIN_CHECK_INTERVAL", "300"))
+
+def set_toolchain_report(report: dict):
+    app.state.toolchain = report
+
+@app.on_event("startup")
+async def start_workers():
+    # Probe Manim, FFmpeg and LaTeX once here instead of on every request
+    set_toolchain_report(await asyncio.to_thread(probe_toolchain))
+    app.state.toolchain_task = asyncio.create_task(
+        recheck_periodically(TOOLCHAIN_CHECK_INTERVAL, set_toolchain_report)
+    )
+    # Names generated scenes may use; None skips the undefined name check
+    app.state.manim_names = await asyncio.to_thread(load_manim_names) if app.state.toolchain["ready"] else None
+    template_library.check(app.state.manim_names)
+    if RENDER_BACKEND == "warm" and app.state.toolchain["ready"]:
+        render_server.start()
+    await job_manager.start()
+    app.state.storage_task = asyncio.create_task(maintain_storage())
+    app.state.prewarm_task = None
+    if os.getenv("GLYPH_PREWARM", "1") == "1" and app.state.toolchain["latex"]["available"]:
+        app.state.prewarm_task = asyncio.create_task(prewarm_glyphs())
+    app.state.template_task = None
+    if SCENE_TEMPLATES and os.getenv("TEMPLATE_PREWARM", "1") == "1" and app.state.toolchain["ready"]:
+        app.state.template_task = asyncio.create_task(prewarm_templates())
+
+async def prewarm_glyphs():
+    """Compile the common formulas of every topic detect_topic knows into the glyph cache."""
+    for topic in PREWARM_FORMULAS:
+        prewarm = asyncio.ensure_future(asyncio.to_thread(glyph_cache.prewarm, topic, TEMP_DIR, BASE_DIR))
+        try:
+            await asyncio.shield(prewarm)
+        except asyncio.CancelledError:
+            # Let the LaTeX run in flight finish and clean up before shutdown goes on
+            await asyncio.wait({prewarm})
+            raise
+
+async def prewarm_templates():
+    """Render every scene template once so the segments it shares with real requests are cached.
+
+    Segments are named after what is on screen, so a request answered by
+    a template reuses those of the pre-render that don't depend on the
+    prompt's numbers, such as the title and the axes, at the qualities
+    in TEMPLATE_PREWARM_QUALITIES.
+    """
+    qualities = os.getenv("TEMPLATE_PREWARM_QUALITIES", DRAFT_QUALITY).split(",")
+    latex = app.state.toolchain["latex"]["available"]
+    for quality in qualities:
+        for template in template_library.defaults():
+            scene_name = f"Template_{template.template.name}"
+            scene_code = template.render(scene_name, latex=latex)
+            try:
+                async with render_scheduler.slot("prewarm", estimate_cost(scene_code, quality), TEMPLATE_PREWARM_PRIORITY):
+                    await run_render(prewarm_template, scene_name, scene_code, quality.strip())
+            except (RenderError, OSError) as e:
+                logger.error(f"Pre-render of template {template.template.name} failed: {str(e)}")
+    logger.info(f"Pre-rendered {len(template_library.templates)} scene templates")
+
+def prewarm_template(scene_name: str, scene_code: str, quality: str, cancel: Optional[threading.Event] = None):
+    """Render a template scene through the shared caches and throw the video away. Blocks for the render."""
+    work_dir = TEMP_DIR / f"prewarm_{uuid.uuid4().hex[:8]}"
+    glyph_dir = work_dir / "glyphs"
+    try:
+        work_dir.mkdir(parents=True)
+        scene_file = work_dir / f"{scene_name}.py"
+        scene_file.write_text(scene_code, encoding="utf-8")
+        lookups = {**glyph_cache.prepare(glyph_dir), **segment_cache.prepare(work_dir)}
+        config = {**glyph_cache.job_config(glyph_dir), **segment_cache.job_config(work_dir)}
+        report = {}
+        render = render_server.render if render_server.running else render_scene
+        render(scene_file, scene_name, quality, work_dir, work_dir / f"{scene_name}.mp4", BASE_DIR,
+               None, config, report, RENDER_LIMITS, lookups, cancel)
+        glyph_cache.collect(glyph_dir, report.get("glyphs", {}).get("used", ()))
+        segment_cache.collect(work_dir, report.get("segments", {}).get("used", ()))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def active_ids() -> set[str]:
+    """Animation and job ids of unfinished jobs, whose files storage upkeep must leave alone."""
+    active = set()
+    for job in job_manager.unfinished():
+        active.update((job.id, job.animation_id))
+    return active
+
+async def maintain_storage():
+    """Remove what crashed jobs left behind and apply the TTL and quota, every STORAGE_SWEEP_INTERVAL seconds."""
+    while True:
+        try:
+            active = active_ids()
+            removed = await asyncio.to_thread(storage.sweep, TEMP_DIR, active)
+            freed = await asyncio.to_thread(storage.enforce, active)
+            if removed or freed:
+                logger.info(f"Storage upkeep removed {removed} orphans and freed {freed} bytes")
+        except Exception as e:
+            logger.error(f"Storage upkeep failed: {str(e)}")
+        await asyncio.sleep(STORAGE_SWEEP_INTERVAL)
+
+@app.on_event("shutdown")
+async def stop_workers():
+    app.state.toolchain_task.cancel()
+    app.state.storage_task.cancel()
+    # Pre-warms stop their render or LaTeX run before the render server and scratch space go
+    prewarms = [task for task in (app.state.prewarm_task, app.state.template_task) if task]
+    for task in prewarms:
+        task.cancel()
+    await asyncio.gather(*prewarms, return_exceptions=True)
+    await job_manager.stop()
+    job_store.close()
+    await asyncio.to_thread(render_server.stop)
+    await llm_client.close()
+
+def cached_job(cache_key: str, upgrade: Optional[dict] = None, client: str = "") -> Optional[Job]:
+    """Return a completed job for a cached render, or None on a cache miss.
+
+    A cached draft still gets its upgrade queued, and raises
+    QueueFullError when there is no room for it.
+    """
+    cached = render_cache.get(cache_key)
+    if not cached:
+        return None
+    logger.info(f"Render cache hit for animation {cached['animation_id']}")
+    job = Job(
+        animation_id=cached["animation_id"],
+        params={"cache_key": cache_key},
+        status=COMPLETED,
+        result={"video_url": f"/videos/{cached['animation_id']}/{cached['filename']}", "cached": True},
+        finished_at=time.time(),
+        client=client
+    )
+    if upgrade and app.state.toolchain["ready"]:
+        job.result.update(submit_upgrade(job, upgrade, admit=True))
+    return job_manager.record(job)
+
+def job_response(job: Job) -> dict:
+    response = {"status_url": f"/jobs/{job.id}", **job.to_dict()}
+    # Only once the playlist exists: without ffmpeg, or before the first segment, there is nothing to play
+    if any(event["stage"] == "streaming" for event in job.events):
+        response["stream_url"] = stream_url(job)
+    return response
+
+def client_id(request: Request) -> str:
+    """Who is asking, for fairness and queue limits: X-Client-Id, else the remote address."""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+def find_cached(params: dict, client: str) -> Optional[Job]:
+    """A completed job for a request already in the render cache, else None."""
+    upgrade = params.get("upgrade")
+    # No draft is needed when the requested quality is already cached
+    if upgrade:
+        job = cached_job(upgrade["cache_key"], client=client)
+        if job is not None:
+            return job
+    return cached_job(params["cache_key"], upgrade, client)
+
+def require_toolchain():
+    # Anything past the cache needs a working Manim
+    if not app.state.toolchain["ready"]:
         raise HTTPException(
             status_code=500,
-            detail=f"Unexpected error: {str(e)}"
+            detail="Manim is not properly installed or accessible"
         )
 
-@app.get("/videos/{animation_id}/{filename}")
-async def get_video(animation_id: str, filename: str):
+def queue_full(error: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Too many animations queued: {str(error)}",
+        headers={"Retry-After": QUEUE_FULL_RETRY_AFTER}
+    )
+
+async def queue_render(animation_id: str, params: dict, client: str) -> dict:
+    """Serve a request from the render cache, or queue a render job for it.
+
+    Raises a 429 when the queue, or the client's share of it, is full.
+    """
+    try:
+        job = find_cached(params, client)
+        if job is None:
+            require_toolchain()
+            job = job_manager.submit(Job(animation_id=animation_id, params=params, client=client))
+    except QueueFullError as e:
+        raise queue_full(e)
+    return job_response(job)
+
+def animation_params(request: AnimationRequest) -> dict:
+    """Job parameters for a generate request.
+
+    With a preview these are the draft's, carrying the requested quality
+    as the upgrade to queue once the draft is done.
+    """
+    # Identical requests are served from the render cache without an LLM call or render
+    scene_key = make_scene_key(
+        build_contextual_prompt(normalize_prompt(request.prompt), request.level, request.style)
+    )
+
+    params = {
+        "prompt": request.prompt,
+        "quality": request.quality,
+        "level": request.level,
+        "style": request.style,
+        "scene_key": scene_key,
+        "cache_key": make_cache_key(scene_key, request.quality),
+        "stream": request.stream
+    }
+
+    # Render a cheap draft first and the requested quality in the background
+    if PREVIEW_FIRST and request.preview and request.quality != DRAFT_QUALITY:
+        params = {
+            **params,
+            "quality": DRAFT_QUALITY,
+            "cache_key": make_cache_key(scene_key, DRAFT_QUALITY),
+            # With the prompt, an upgrade can write the scene again if the draft's is gone
+            "upgrade": {"quality": request.quality, "scene_key": scene_key, "cache_key": params["cache_key"],
+                        "prompt": request.prompt, "level": request.level, "style": request.style,
+                        "stream": request.stream}
+        }
+    return params
+
+@app.post("/generate", status_code=202)
+async def generate_animation(request: AnimationRequest, http_request: Request):
+    # Generate unique ID for this animation and queue it for rendering
+    return await queue_render(str(uuid.uuid4()), animation_params(request), client_id(http_request))
+
+@app.post("/generate/batch", status_code=202)
+async def generate_batch(request: BatchRequest, http_request: Request):
+    """Queue many animations at once and return one batch id to follow them by.
+
+    Identical items share one job and cached items complete immediately.
+    The rest are admitted together or not at all, and run concurrently:
+    scenes are written while other items render, and items with the same
+    prompt share one LLM call.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="A batch needs at least one item")
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch can have at most {MAX_BATCH_ITEMS} items")
+
+    client = client_id(http_request)
+    jobs_by_request: dict[tuple, Job] = {}
+    new_jobs = []
+    job_ids = []
+    for item in request.items:
+        params = animation_params(item)
+        key = (params["cache_key"], params.get("upgrade", {}).get("cache_key"))
+        job = jobs_by_request.get(key)
+        if job is None:
+            try:
+                job = find_cached(params, client)
+            except QueueFullError as e:
+                raise queue_full(e)
+            if job is None:
+                job = Job(animation_id=str(uuid.uuid4()), params=params, client=client)
+                new_jobs.append(job)
+            jobs_by_request[key] = job
+        job_ids.append(job.id)
+
+    if new_jobs:
+        require_toolchain()
+        try:
+            # A batch may go past the per-client limit, by up to its own size
+            limit = job_manager.max_pending_per_client
+            job_manager.submit_many(new_jobs, limit and limit + len(new_jobs))
+        except QueueFullError as e:
+            raise queue_full(e)
+    logger.info(f"Batch of {len(job_ids)} items queued {len(new_jobs)} jobs")
+    return batch_response(job_manager.add_batch(Batch(job_ids=job_ids, client=client)))
+
+def batch_items(batch: Batch) -> list[dict]:
+    """Each item's job, or an expired status once the job has left the history."""
+    items = []
+    for index, job_id in enumerate(batch.job_ids):
+        job = job_manager.get(job_id)
+        items.append({"index": index, **(job.to_dict() if job else {"job_id": job_id, "status": "expired"})})
+    return items
+
+def batch_response(batch: Batch) -> dict:
+    items = batch_items(batch)
+    counts = {status: sum(item["status"] == status for item in items) for status in (COMPLETED, FAILED)}
+    return {
+        "batch_id": batch.id,
+        "status_url": f"/batches/{batch.id}",
+        "events_url": f"/batches/{batch.id}/events",
+        "status": RUNNING if any(item["status"] in (QUEUED, RUNNING) for item in items) else COMPLETED,
+        "total": len(items),
+        **counts,
+        "items": items
+    }
+
+def animation_response(animation: dict) -> dict:
+    videos = animation.get("videos") or storage.animation_videos(animation["id"])
+    return {
+        **animation,
+        "videos": [{**video, "video_url": f"/videos/{video['animation_id']}/{video['filename']}"} for video in videos]
+    }
+
+@app.get("/animations")
+async def list_animations(limit: int = 50, offset: int = 0):
+    """Stored animations with their videos, most recently used first."""
+    limit = max(1, min(limit, 500))
+    animations = storage.list_animations(limit, max(0, offset))
+    return {"animations": [animation_response(animation) for animation in animations], "limit": limit, "offset": offset}
+
+@app.get("/animations/{animation_id}")
+async def get_animation(animation_id: str):
+    animation = storage.get_animation(animation_id)
+    if animation is None:
+        raise HTTPException(status_code=404, detail="Animation not found")
+    return animation_response(animation)
+
+@app.post("/animations/{animation_id}/render", status_code=202)
+async def rerender_animation(animation_id: str, request: RenderRequest, http_request: Request):
+    """Render an existing animation's scene code again at another quality."""
+    record = scene_store.get_animation(animation_id) or await asyncio.to_thread(fetch_animation, animation_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Animation not found")
+    return await queue_render(animation_id, {
+        "quality": request.quality,
+        "scene_key": record["scene_key"],
+        "cache_key": make_cache_key(record["scene_key"], request.quality),
+        "stream": request.stream
+    }, client_id(http_request))
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return get_job_or_404(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = get_job_or_404(job_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != COMPLETED:
+        return JSONResponse(status_code=202, content=job.to_dict())
+    return {"id": job.animation_id, **job.result}
+
+def get_batch_or_404(batch_id: str) -> Batch:
+    batch = job_manager.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+@app.get("/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    return batch_response(get_batch_or_404(batch_id))
+
+@app.get("/batches/{batch_id}/events")
+async def get_batch_events(batch_id: str):
+    """Stream each batch item's result as Server-Sent Events as soon as it is done or failed."""
+    batch = get_batch_or_404(batch_id)
+    jobs = {job_id: job_manager.get(job_id) for job_id in batch.job_ids}
+    indexes: dict[str, list[int]] = {}
+    for index, job_id in enumerate(batch.job_ids):
+        indexes.setdefault(job_id, []).append(index)
+
+    async def event_stream():
+        async for finished in job_manager.follow([job for job in jobs.values() if job is not None]):
+            if finished is None:
+                yield ": keepalive\n\n"
+            else:
+                job, event = finished
+                data = {"indexes": indexes[job.id], **job.to_dict()}
+                yield f"event: {event['stage']}\ndata: {json.dumps(data)}\n\n"
+        yield f"event: batch_done\ndata: {json.dumps(batch_response(batch))}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    """Stream a job's progress as Server-Sent Events until it is done or failed."""
+    job = get_job_or_404(job_id)
+
+    async def event_stream():
+        async for event in job_manager.subscribe(job):
+            if event is None:
+                # Comment line so proxies don't close an idle stream
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/health")
+async def get_health():
+    """Liveness check with the last toolchain capability report."""
+    return {
+        "status": "ok",
+        "toolchain": app.state.toolchain,
+        "jobs": job_manager.stats(),
+        "scheduler": render_scheduler.stats(),
+        "llm": llm_client.stats(),
+        "render_server": render_server.stats() if render_server.running else None,
+        "cluster": {"node": NODE_ID, "job_store": job_store.name, "artifact_store": artifact_store.stats()}
+    }
+
+@app.get("/ready")
+async def get_ready():
+    """Readiness check: 503 until the toolchain can render."""
+    report = app.state.toolchain
+    if not report["ready"]:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "toolchain": report})
+    return {"status": "ready", "toolchain": report}
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        "renders": render_cache.stats(),
+        "storage": storage.stats(),
+        "glyphs": await asyncio.to_thread(glyph_cache.stats),
+        "segments": await asyncio.to_thread(segment_cache.stats)
+    }
+
+def collect_service_metrics() -> list[tuple[str, str, str, dict, float]]:
+    """Counters the caches, queues and LLM client keep, as metric samples."""
+    samples = []
+    for cache_name, cache in (("renders", render_cache), ("glyphs", glyph_cache), ("segments", segment_cache)):
+        labels = {"cache": cache_name}
+        samples += [
+            ("cache_hits_total", "counter", "Cache lookups that found an entry", labels, cache.hits),
+            ("cache_misses_total", "counter", "Cache lookups that found nothing", labels, cache.misses),
+            ("cache_evictions_total", "counter", "Entries evicted to stay within the size limit", labels, cache.evictions)
+        ]
+    jobs = job_manager.stats()
+    for status in (COMPLETED, FAILED):
+        samples.append(("jobs_finished_total", "counter", "Jobs run to the end, by outcome",
+                        {"status": status}, jobs["finished"][status]))
+    samples += [
+        ("jobs_rejected_total", "counter", "Requests turned away because the queue was full", {}, jobs["rejected"]),
+        ("jobs_queued", "gauge", "Jobs waiting for a job worker", {}, jobs["queued"]),
+        ("jobs_running", "gauge", "Jobs being worked on, including those waiting for a render slot", {}, jobs["running"])
+    ]
+    scheduler = render_scheduler.stats()
+    samples += [
+        ("render_slots", "gauge", "Renders that may run at once", {}, scheduler["slots"]),
+        ("renders_running", "gauge", "Renders holding a slot", {}, scheduler["running"]),
+        ("renders_waiting", "gauge", "Renders waiting for a slot", {}, scheduler["waiting"])
+    ]
+    samples += [
+        ("storage_bytes", "gauge", "Bytes of scene code and videos under the videos directory", {}, storage.total_bytes()),
+        ("storage_evictions_total", "counter", "Files removed to stay within the storage TTL and quota",
+         {"kind": "video"}, storage.evicted_videos),
+        ("storage_evictions_total", "counter", "Files removed to stay within the storage TTL and quota",
+         {"kind": "animation"}, storage.evicted_animations),
+        ("storage_orphans_removed_total", "counter", "Files and index entries left behind by crashed jobs", {},
+         storage.orphans_removed)
+    ]
+    llm = llm_client.stats()
+    samples += [
+        ("llm_calls_total", "counter", "LLM backend calls, including retries", {}, llm["calls"]),
+        ("llm_coalesced_total", "counter", "LLM requests answered by a call already in flight", {}, llm["coalesced"]),
+        ("llm_retries_total", "counter", "LLM calls retried after a failure", {}, llm["retried"]),
+        ("llm_failures_total", "counter", "LLM requests that failed after all retries", {}, llm["failures"])
+    ]
+    return samples
+
+registry.add_collector(collect_service_metrics)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Stage timings, cache hit rates and queue lengths in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+VIDEOS_SENDFILE = os.getenv("VIDEOS_SENDFILE", "0") == "1"
+
+@app.api_route("/videos/{animation_id}/{filename}", methods=["GET", "HEAD"])
+async def get_video(animation_id: str, filename: str, request: Request):
     video_path = VIDEOS_DIR / animation_id / filename
-    if not video_path.exists():
-        raise HTTPException(status_code=404, detail="Video not found")
-    return FileResponse(video_path)
+    # Only serve files inside an animation directory
+    if video_path.resolve().parent.parent == VIDEOS_DIR.resolve() and video_path.is_file():
+        storage.touch(animation_id, filename)
+    else:
+        # Rendered on another node, or evicted here since
+        video_path = artifact_store.locate(animation_id, filename)
+        if video_path is None:
+            raise HTTPException(status_code=404, detail="Video not found")
+    return video_response(request, video_path, zero_copy=VIDEOS_SENDFILE)
+
+@app.api_route("/videos/{animation_id}/{stream}/{filename}", methods=["GET", "HEAD"])
+async def get_stream(animation_id: str, stream: str, filename: str, request: Request):
+    """The HLS playlist and segments of a render in progress, or of one that finished recently."""
+    path = VIDEOS_DIR / animation_id / stream / filename
+    # Only serve files inside a stream directory of an animation
+    if not stream.endswith(".hls") or path.resolve().parent.parent.parent != VIDEOS_DIR.resolve() or not path.is_file():
+        raise HTTPException(status_code=404, detail="Stream not found")
+    if filename == PLAYLIST:
+        # The playlist grows until the render ends, so it must not be cached
+        return Response(path.read_bytes(), media_type=PLAYLIST_TYPE, headers={"Cache-Control": "no-cache"})
+    return video_response(request, path, zero_copy=VIDEOS_SENDFILE)
 
 if __name__ == "__main__":
     import uvicorn
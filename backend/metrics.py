@@ -0,0 +1,181 @@
+import bisect
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "animator_"
+
+# Stage durations range from a prompt build (microseconds) to a high quality render (minutes)
+STAGE_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Counter:
+    """Monotonic count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self.values.items():
+            yield f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = STAGE_BUCKETS):
+        self.name = PREFIX + name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (count per bucket, sum, count)
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        self.values[key] = [counts, total + value, count + 1]
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total, count) in self.values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+
+class Registry:
+    """Metrics exported on /metrics in the Prometheus text format.
+
+    Besides the metrics registered here, collectors are called at scrape
+    time to turn counters other components already keep (cache hits,
+    queue lengths) into samples, so nothing is counted twice.
+    """
+
+    def __init__(self):
+        self.metrics: list = []
+        self.collectors: list[Callable[[], list[tuple[str, str, str, dict, float]]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], list[tuple[str, str, str, dict, float]]]):
+        """collector returns (name, kind, help, labels, value) tuples."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        # The text format wants all samples of a metric together
+        families: dict[str, list[str]] = {}
+        for collector in self.collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                name = PREFIX + name
+                if name not in families:
+                    families[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                families[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "stage_seconds",
+    "Time spent in each stage of an animation request",
+    ("stage",)
+))
+FALLBACK_SCENES = registry.register(Counter("fallback_scenes_total", "Requests answered with the fallback scene"))
+TEMPLATE_SCENES = registry.register(Counter(
+    "template_scenes_total",
+    "Requests answered with a scene template instead of the LLM, by template",
+    ("template",)
+))
+SCENE_REPAIRS = registry.register(Counter(
+    "scene_repairs_total",
+    "LLM repair rounds for scenes that failed validation, by outcome",
+    ("result",)
+))
+
+
+def _load_tracer():
+    """An OpenTelemetry tracer when OTEL_TRACING=1 and the SDK is installed, else None."""
+    if os.getenv("OTEL_TRACING", "0") != "1":
+        return None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning("OTEL_TRACING is set but opentelemetry is not installed; spans are disabled")
+        return None
+    return trace.get_tracer("animator")
+
+
+tracer = _load_tracer()
+
+
+def record_stage(stage: str, seconds: float, timings: Optional[dict] = None):
+    """Count time spent in a stage, adding it to a request's timings if given."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds, 6)
+
+
+@contextmanager
+def stage(name: str, timings: Optional[dict] = None, **attributes) -> Iterator[None]:
+    """Time the body as one stage, and trace it as a span when tracing is on."""
+    started = time.perf_counter()
+    if tracer is None:
+        try:
+            yield
+        finally:
+            record_stage(name, time.perf_counter() - started, timings)
+        return
+    with tracer.start_as_current_span(name, attributes=attributes):
+        try:
+            yield
+        finally:
+            record_stage(name, time.perf_counter() - started, timings)
@@ -0,0 +1,268 @@
+import json
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Manim CLI quality flags for each request quality
+QUALITY_FLAGS = {
+    "low": "-ql",
+    "medium": "-qm",
+    "high": "-qh"
+}
+
+# Manim log lines that mark render progress
+ANIMATION_DONE = re.compile(
+    r"Animation (\d+) : (?:Partial movie file written in '([^']+)'|Using cached data \(hash : (\w+)\))"
+)
+ENCODING_STARTED = re.compile(r"Combining to Movie file")
+SEGMENT_CACHED = re.compile(r"Using cached data \(hash : (\w+)\)")
+SEGMENT_WRITTEN = re.compile(r"Partial movie file written")
+
+# Manim's command line under the render's limits, with stored glyphs and
+# segments linked in as Manim looks them up
+MANIM_LAUNCHER = """
+import json
+import os
+import sys
+sys.path.insert(0, sys.argv.pop(1))
+from render import apply_limits
+apply_limits(json.loads(os.environ.get("RENDER_LIMITS", "{}")))
+from glyph_cache import install_glyph_hooks
+from segment_cache import install_segment_hooks
+from shared_store import set_lookups
+for install_hooks in (install_glyph_hooks, install_segment_hooks):
+    try:
+        install_hooks()
+    except (ImportError, AttributeError) as e:
+        print(f"Shared cache lookups unavailable: {e}", flush=True)
+set_lookups(json.loads(os.environ.get("SHARED_STORE_LOOKUPS", "{}")))
+from manim.__main__ import main
+sys.argv[0] = "manim"
+main()
+"""
+
+# Progress callback: progress(stage, **data)
+ProgressCallback = Callable[..., None]
+
+
+class RenderError(Exception):
+    """Raised when Manim fails or does not produce a video file."""
+
+    def __init__(self, message: str, stderr: str = ""):
+        super().__init__(message)
+        self.stderr = stderr
+
+
+class RenderCancelled(Exception):
+    """Raised when a render was stopped because its job was cancelled."""
+
+
+def report_progress(line: str, progress: ProgressCallback, segment_dir: Optional[Path] = None):
+    """Turn one line of Manim output into a progress event.
+
+    Rendering events carry the animation's partial movie file as
+    ``segment``; a cached one is looked up in segment_dir.
+    """
+    match = ANIMATION_DONE.search(line)
+    if match:
+        written, cached = match.group(2), match.group(3)
+        if written:
+            segment = written
+        elif segment_dir is not None:
+            segment = str(segment_dir / f"{cached}.mp4")
+        else:
+            segment = None
+        progress("rendering", animation=int(match.group(1)) + 1, segment=segment)
+    elif ENCODING_STARTED.search(line):
+        progress("encoding")
+
+
+def apply_limits(limits: dict):
+    """Cap the CPU time and memory of the calling process for one render.
+
+    limits holds ``cpu_seconds`` and ``memory_mb``, either 0 for no cap.
+    CPU time adds up over a process's life, so the cap is set that many
+    seconds past what the process has used so far; a process that goes
+    over is killed with SIGXCPU. Memory is capped as address space.
+    """
+    import resource
+
+    cpu_seconds = limits.get("cpu_seconds")
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    memory_mb = limits.get("memory_mb")
+    if memory_mb:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        soft = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+
+def phase_timings(started: float, scene_started: Optional[float], encoding_started: Optional[float],
+                  finished: float) -> dict:
+    """Split a render's wall time into startup, render and encode seconds.
+
+    Startup is interpreter start, the manim import and scene set-up; a
+    phase that was never reached takes no time.
+    """
+    scene_started = scene_started or finished
+    encoding_started = encoding_started or finished
+    return {
+        "startup": scene_started - started,
+        "render": encoding_started - scene_started,
+        "encode": finished - encoding_started
+    }
+
+
+def write_config_file(path: Path, config: dict):
+    """Write Manim config overrides as a .cfg file for ``--config_file``."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[CLI]\n")
+        for key, value in config.items():
+            f.write(f"{key} = {value}\n")
+
+
+def scratch_config(work_dir: Path, output_stem: str) -> dict:
+    """Manim config that keeps every file of a render inside work_dir.
+
+    The video lands at exactly ``scratch_video(work_dir, output_stem)``,
+    so nothing has to search Manim's quality-named folders for it.
+    """
+    return {
+        "media_dir": str(work_dir / "media"),
+        "video_dir": str(work_dir / "out"),
+        "images_dir": str(work_dir / "out"),
+        "output_file": output_stem
+    }
+
+
+def scratch_video(work_dir: Path, output_stem: str) -> Path:
+    return work_dir / "out" / f"{output_stem}.mp4"
+
+
+def render_scene(scene_file: Path, scene_name: str, quality: str, work_dir: Path, final_path: Path, cwd: Path,
+                 progress: Optional[ProgressCallback] = None, config: Optional[dict] = None,
+                 report: Optional[dict] = None, limits: Optional[dict] = None,
+                 lookups: Optional[dict] = None, cancel: Optional[threading.Event] = None) -> Path:
+    """Render a scene file with Manim in work_dir and move the video to final_path.
+
+    work_dir is this render's private scratch directory, so concurrent
+    renders never share Manim output folders. Manim's output is read as it
+    is printed and reported through progress. config holds extra Manim
+    config for this render only, and lookups the shared store directories
+    its files are linked from, see SharedStore.prepare. report is filled
+    with what the renderer measured; a subprocess can't count glyph
+    lookups, so it stays empty here. Setting cancel kills Manim and raises
+    RenderCancelled.
+
+    This blocks until the Manim process exits, so callers on the event loop
+    must run it in a worker thread.
+    """
+    quality_flag = QUALITY_FLAGS.get(quality, "-qm")
+
+    env = os.environ.copy()
+    # Keep Rich from wrapping log lines so they can be matched
+    env["COLUMNS"] = "1000"
+    env["SHARED_STORE_LOOKUPS"] = json.dumps(lookups or {})
+    # Applied by the launcher itself: preexec_fn isn't safe from the worker threads this runs in
+    env["RENDER_LIMITS"] = json.dumps(limits or {})
+
+    work_dir.mkdir(parents=True, exist_ok=True)
+    config_file = work_dir / "manim.cfg"
+    config = {**scratch_config(work_dir, final_path.stem), **(config or {})}
+    write_config_file(config_file, config)
+    # Manim's own default when no partial movie directory is configured
+    segment_dir = Path(config.get("partial_movie_dir") or work_dir / "out" / "partial_movie_files" / scene_name)
+
+    cmd = [
+        "python", "-c", MANIM_LAUNCHER, str(Path(__file__).parent),
+        "--config_file", str(config_file),
+        quality_flag,
+        str(scene_file),
+        scene_name
+    ]
+
+    # Logged as the manim command line the launcher stands in for
+    logger.info(f"Running Manim command: manim {' '.join(cmd[4:])}")
+
+    output_lines = []
+    segments = {"hits": 0, "misses": 0, "used": []}
+    # Manim prints its version banner once imported, before the scene starts
+    started = time.perf_counter()
+    scene_started = None
+    encoding_started = None
+    with subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        env=env,
+        cwd=str(cwd)
+    ) as process:
+        if cancel is not None:
+            threading.Thread(target=_kill_on_cancel, args=(process, cancel), daemon=True).start()
+        # Universal newlines also split the progress bar's carriage returns
+        for line in process.stdout:
+            output_lines.append(line)
+            scene_started = scene_started or time.perf_counter()
+            if encoding_started is None and ENCODING_STARTED.search(line):
+                encoding_started = time.perf_counter()
+            if progress:
+                report_progress(line, progress, segment_dir)
+            cached = SEGMENT_CACHED.search(line)
+            if cached:
+                segments["hits"] += 1
+                segments["used"].append(f"{cached.group(1)}.mp4")
+            elif SEGMENT_WRITTEN.search(line):
+                segments["misses"] += 1
+    output = "".join(output_lines)
+    timings = phase_timings(started, scene_started, encoding_started, time.perf_counter())
+    if report is not None:
+        report["segments"] = segments
+        report["timings"] = timings
+
+    if cancel is not None and cancel.is_set():
+        raise RenderCancelled("Render was cancelled")
+    if process.returncode == -signal.SIGXCPU:
+        raise RenderError(f"Animation generation exceeded its CPU time limit of {limits['cpu_seconds']}s", stderr=output)
+    if process.returncode != 0:
+        logger.error(f"Manim execution failed: {output}")
+        raise RenderError(f"Animation generation failed: {output}", stderr=output)
+
+    logger.debug(f"Manim output: {output}")
+    moving = time.perf_counter()
+    promote_video(scratch_video(work_dir, final_path.stem), final_path)
+    timings["move"] = time.perf_counter() - moving
+    return final_path
+
+
+def _kill_on_cancel(process: subprocess.Popen, cancel: threading.Event):
+    """Kill process once cancel is set; returns when either it exits or is killed."""
+    while process.poll() is None:
+        if cancel.wait(0.5):
+            process.kill()
+            return
+
+
+def promote_video(video_file: Path, final_path: Path) -> Path:
+    """Atomically move a finished video from a scratch directory to final_path.
+
+    The scratch directory lives on the same filesystem as the videos
+    directory, so readers see either no file or the whole file.
+    """
+    if not video_file.exists():
+        logger.error(f"Manim finished without writing {video_file}")
+        raise RenderError("Animation file was not created")
+    logger.info(f"Moving video from {video_file} to {final_path}")
+    os.replace(video_file, final_path)
+    return final_path
@@ -0,0 +1,63 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+def make_scene_key(contextual_prompt: str) -> str:
+    """Content address of a scene: the full LLM prompt built from prompt, level and style."""
+    return hashlib.sha256(contextual_prompt.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(scene_key: str, quality: str) -> str:
+    """Content address of a render: the scene key plus the render quality."""
+    return hashlib.sha256(f"{scene_key}:{quality}".encode("utf-8")).hexdigest()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse case and whitespace so trivially different prompts share a key."""
+    return " ".join(prompt.lower().split())
+
+
+class RenderCache:
+    """Map from a request key to a finished video, kept in the storage index.
+
+    Videos are evicted by the storage lifecycle, least recently used first,
+    once the videos directory is over its quota. The scene code is left in
+    place until its animation has no videos left.
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self.storage.find_video(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.storage.touch(entry["animation_id"], entry["filename"])
+        return entry
+
+    def put(self, key: str, animation_id: str, video_file: Path, quality: str):
+        self.storage.add_video(animation_id, video_file, quality, cache_key=key)
+
+    @property
+    def evictions(self) -> int:
+        return self.storage.evicted_videos
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.storage.stats()["cached_videos"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
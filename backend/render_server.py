@@ -0,0 +1,304 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from glyph_cache import install_glyph_hooks, take_glyph_stats
+from render import (ProgressCallback, RenderCancelled, RenderError, apply_limits, phase_timings, promote_video,
+                    scratch_config)
+from segment_cache import install_segment_hooks, take_segment_stats
+from shared_store import set_lookups
+
+logger = logging.getLogger(__name__)
+
+# Manim quality presets for each request quality
+QUALITY_NAMES = {
+    "low": "low_quality",
+    "medium": "medium_quality",
+    "high": "high_quality"
+}
+
+
+def _rss_bytes() -> int:
+    """Resident set size of the current process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # ru_maxrss is the peak, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+# perf_counter times of the current job's scene set-up and encoding start
+_marks: dict[str, float] = {}
+
+
+def _render_in_process(job: dict) -> str:
+    """Render one scene file inside this worker and return the video path.
+
+    Every job runs under its own tempconfig, so its scratch directories,
+    quality and output file never leak from one job into the next.
+    """
+    from manim import tempconfig
+    from manim.constants import QUALITIES
+
+    scene_file = Path(job["scene_file"])
+    with open(scene_file, encoding="utf-8") as f:
+        source = f.read()
+
+    quality = QUALITIES[QUALITY_NAMES.get(job["quality"], "medium_quality")]
+    overrides = {
+        "input_file": str(scene_file),
+        "pixel_width": quality["pixel_width"],
+        "pixel_height": quality["pixel_height"],
+        "frame_rate": quality["frame_rate"],
+        "write_to_movie": True,
+        "progress_bar": "none",
+        **job["config"]
+    }
+    os.chdir(job["cwd"])
+    namespace = {"__name__": scene_file.stem, "__file__": str(scene_file)}
+    with tempconfig(overrides):
+        exec(compile(source, str(scene_file), "exec"), namespace)
+        scene = namespace[job["scene_name"]]()
+        _marks["scene"] = time.perf_counter()
+        scene.render()
+        return str(scene.renderer.file_writer.movie_file_path)
+
+
+def _install_progress_hooks(conn):
+    """Send a progress message over conn after each animation and before encoding."""
+    from manim import Scene
+
+    play = Scene.play
+
+    def play_with_progress(self, *args, **kwargs):
+        play(self, *args, **kwargs)
+        # The partial movie file this animation was written to, or found in
+        partial_movie_files = getattr(self.renderer.file_writer, "partial_movie_files", None) or [None]
+        conn.send({"progress": "rendering", "animation": self.renderer.num_plays, "segment": partial_movie_files[-1]})
+
+    Scene.play = play_with_progress
+
+    try:
+        from manim.scene.scene_file_writer import SceneFileWriter
+    except ImportError:
+        return
+    combine_to_movie = SceneFileWriter.combine_to_movie
+
+    def combine_with_progress(self, *args, **kwargs):
+        _marks["encoding"] = time.perf_counter()
+        conn.send({"progress": "encoding"})
+        return combine_to_movie(self, *args, **kwargs)
+
+    SceneFileWriter.combine_to_movie = combine_with_progress
+
+
+def _worker_main(conn, max_rss: int):
+    """Entry point of a render worker process."""
+    # Pay for importing manim (numpy, cairo, pango) once, not once per job
+    import manim  # noqa: F401
+
+    _install_progress_hooks(conn)
+    try:
+        install_glyph_hooks()
+    except (ImportError, AttributeError) as e:
+        logger.warning(f"Glyph cache lookups unavailable: {str(e)}")
+    try:
+        install_segment_hooks()
+    except (ImportError, AttributeError) as e:
+        logger.warning(f"Segment cache lookups unavailable: {str(e)}")
+    conn.send({"ready": os.getpid()})
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        take_glyph_stats()
+        take_segment_stats()
+        set_lookups(job["lookups"])
+        _marks.clear()
+        started = time.perf_counter()
+        out_of_memory = False
+        try:
+            apply_limits(job["limits"])
+            reply = {"ok": True, "video": _render_in_process(job)}
+        except Exception as e:
+            out_of_memory = isinstance(e, MemoryError)
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+        reply["glyphs"] = take_glyph_stats()
+        reply["segments"] = take_segment_stats()
+        reply["timings"] = phase_timings(started, _marks.get("scene"), _marks.get("encoding"), time.perf_counter())
+        # Ask to be replaced once memory has grown past the limit or ran out
+        reply["recycle"] = out_of_memory or (bool(max_rss) and _rss_bytes() > max_rss)
+        conn.send(reply)
+        if reply["recycle"]:
+            break
+
+
+class RenderWorker:
+    """One long-lived worker process with manim already imported."""
+
+    def __init__(self, context, max_rss: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, max_rss), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.jobs = 0
+
+    def run(self, job: dict, timeout: float, progress: Optional[ProgressCallback] = None,
+            cancel: Optional[threading.Event] = None) -> dict:
+        deadline = time.monotonic() + timeout
+        if not self.ready:
+            # The first message is the worker announcing that manim is imported
+            self._receive(deadline, cancel)
+            self.ready = True
+        self.conn.send(job)
+        while True:
+            reply = self._receive(deadline, cancel)
+            if "progress" not in reply:
+                break
+            if progress:
+                stage = reply.pop("progress")
+                progress(stage, **reply)
+        self.jobs += 1
+        return reply
+
+    def _receive(self, deadline: float, cancel: Optional[threading.Event] = None) -> dict:
+        while True:
+            remaining = max(0.0, deadline - time.monotonic())
+            # Wake up now and then to notice a cancelled job
+            if self.conn.poll(min(remaining, 0.5) if cancel is not None else remaining):
+                return self.conn.recv()
+            if cancel is not None and cancel.is_set():
+                raise RenderCancelled("Render was cancelled")
+            if time.monotonic() >= deadline:
+                raise TimeoutError("render timed out")
+
+    def stop(self, grace: float = 5):
+        """Ask the worker to exit, killing it after grace seconds."""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(grace)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class RenderServer:
+    """Pool of warm render workers that receive scene files over a pipe.
+
+    A worker is replaced after max_jobs renders, when it reports memory
+    above max_rss_mb, or when it crashes or times out. ``render`` blocks
+    and takes the same arguments as ``render.render_scene``; a cancelled
+    render's worker is killed and replaced.
+    """
+
+    def __init__(self, size: int, max_jobs: int = 50, max_rss_mb: int = 1024, timeout: float = 600):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.timeout = timeout
+        self.running = False
+        self.recycled = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[RenderWorker]" = queue.Queue()
+        self._workers: list[RenderWorker] = []
+
+    def start(self):
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+        self.running = True
+        logger.info(f"Started {self.size} warm render workers")
+
+    def stop(self):
+        self.running = False
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def render(self, scene_file: Path, scene_name: str, quality: str, work_dir: Path, final_path: Path, cwd: Path,
+               progress: Optional[ProgressCallback] = None, config: Optional[dict] = None,
+               report: Optional[dict] = None, limits: Optional[dict] = None,
+               lookups: Optional[dict] = None, cancel: Optional[threading.Event] = None) -> Path:
+        job = {
+            "scene_file": str(scene_file),
+            "scene_name": scene_name,
+            "quality": quality,
+            "cwd": str(cwd),
+            "config": {**scratch_config(work_dir, final_path.stem), **(config or {})},
+            "limits": limits or {},
+            "lookups": lookups or {}
+        }
+        worker = self._checkout(cancel)
+        try:
+            reply = worker.run(job, self.timeout, progress, cancel)
+        except RenderCancelled:
+            logger.info(f"Killing render worker {worker.process.pid}, its job was cancelled")
+            self._replace(worker, grace=0)
+            raise
+        except (EOFError, OSError, TimeoutError) as e:
+            logger.error(f"Render worker {worker.process.pid} failed: {str(e)}")
+            self._replace(worker)
+            if worker.process.exitcode == -signal.SIGXCPU:
+                raise RenderError(f"Animation generation exceeded its CPU time limit of {limits['cpu_seconds']}s")
+            raise RenderError(f"Render worker failed: {str(e)}")
+
+        if report is not None:
+            report["glyphs"] = reply["glyphs"]
+            report["segments"] = reply["segments"]
+            report["timings"] = reply["timings"]
+
+        if reply["recycle"] or worker.jobs >= self.max_jobs:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+        if not reply["ok"]:
+            logger.error(f"Manim execution failed: {reply['traceback']}")
+            raise RenderError(f"Animation generation failed: {reply['error']}", stderr=reply["traceback"])
+
+        moving = time.perf_counter()
+        promote_video(Path(reply["video"]), final_path)
+        if report is not None:
+            report["timings"]["move"] = time.perf_counter() - moving
+        return final_path
+
+    def stats(self) -> dict:
+        return {"workers": self.size, "idle": self._idle.qsize(), "recycled": self.recycled}
+
+    def _checkout(self, cancel: Optional[threading.Event] = None) -> RenderWorker:
+        """Take an idle worker, giving up once the pool is stopped or none frees up within the timeout."""
+        deadline = time.monotonic() + self.timeout
+        while self.running:
+            try:
+                return self._idle.get(timeout=min(1.0, max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                if cancel is not None and cancel.is_set():
+                    raise RenderCancelled("Render was cancelled")
+                if time.monotonic() >= deadline:
+                    raise RenderError(f"No render worker became available within {self.timeout}s")
+        raise RenderError("Render server is stopped")
+
+    def _spawn(self) -> RenderWorker:
+        worker = RenderWorker(self._context, self.max_rss)
+        self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker: RenderWorker, grace: float = 5):
+        self._workers.remove(worker)
+        worker.stop(grace)
+        self.recycled += 1
+        if self.running:
+            self._idle.put(self._spawn())
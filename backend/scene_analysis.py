@@ -0,0 +1,203 @@
+import ast
+import builtins
+import json
+import logging
+import subprocess
+import textwrap
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _is_self_call(node: ast.AST, names: tuple[str, ...]) -> bool:
+    """Whether node is a call to ``self.<name>(...)`` for one of names."""
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr in names
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id == "self"
+    )
+
+
+def count_animations(source: str) -> int:
+    """Count the ``self.play``/``self.wait`` calls in scene source.
+
+    Manim numbers every play and wait as one animation, so this is the
+    expected number of partial movie files. Calls inside loops are counted
+    once, which makes it a lower bound.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return 0
+    return sum(1 for node in ast.walk(tree) if _is_self_call(node, ("play", "wait")))
+
+
+SCENE_TEMPLATE = """
+from manim import *
+
+class {scene_name}(Scene):
+    def construct(self):
+{body}
+"""
+
+# Calls and modules that reach outside the scene: files, processes, the interpreter
+FORBIDDEN_NAMES = {
+    "open", "exec", "eval", "compile", "__import__", "input", "breakpoint", "exit", "quit",
+    "globals", "locals", "vars", "getattr", "setattr", "delattr",
+    "os", "sys", "subprocess", "shutil", "pathlib", "Path", "socket", "io", "importlib", "builtins"
+}
+
+MANIM_NAMES_SCRIPT = "import json, manim; print(json.dumps([n for n in dir(manim) if not n.startswith('_')]))"
+
+
+def wrap_scene(scene_name: str, body: str) -> str:
+    """Put the body of construct() into a complete scene file."""
+    return SCENE_TEMPLATE.format(scene_name=scene_name, body=body)
+
+
+def load_manim_names() -> Optional[frozenset[str]]:
+    """Names ``from manim import *`` provides, or None if manim can't be imported.
+
+    Runs in a subprocess so the API process doesn't pay for importing manim.
+    """
+    try:
+        result = subprocess.run(
+            ["python", "-c", MANIM_NAMES_SCRIPT], capture_output=True, text=True, check=True, timeout=120
+        )
+        return frozenset(json.loads(result.stdout))
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        logger.error(f"Could not list manim's exports, skipping undefined name checks: {str(e)}")
+        return None
+
+
+def _parses(body: str) -> bool:
+    try:
+        ast.parse(wrap_scene("Scene", body))
+    except SyntaxError:
+        return False
+    return True
+
+
+def normalize_body(text: str) -> str:
+    """Turn an LLM answer into the body of construct(), indented by 8 spaces.
+
+    Markdown fences, manim imports and a repeated ``def construct(self):``
+    line are dropped and tabs expanded. The common indentation is then
+    removed; if that doesn't parse, the answer is retried with the first
+    line and the rest dedented separately (a flush first line followed by
+    indented ones), and finally with every line flush left, which is right
+    for straight-line code.
+    """
+    lines = []
+    for line in text.expandtabs(4).splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```") or stripped.startswith(("from manim import", "import manim")):
+            continue
+        lines.append(line.rstrip())
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    if lines and lines[0].strip().startswith("def construct("):
+        lines.pop(0)
+
+    dedented = textwrap.dedent("\n".join(lines))
+    candidates = [dedented]
+    first, _, rest = dedented.partition("\n")
+    if rest and not first.rstrip().endswith(":"):
+        candidates.append(first + "\n" + textwrap.dedent(rest))
+    candidates.append("\n".join(line.lstrip() for line in lines))
+
+    indented = [textwrap.indent(candidate, " " * 8) for candidate in candidates]
+    return next((body for body in indented if _parses(body)), indented[0])
+
+
+def _line(source_lines: list[str], node: ast.AST) -> str:
+    return source_lines[node.lineno - 1].strip() if 0 < node.lineno <= len(source_lines) else ""
+
+
+def validate_scene(source: str, known_names: Optional[frozenset[str]] = None) -> list[str]:
+    """Statically check a scene file and describe every problem found.
+
+    Catches syntax errors, imports other than the template's, calls and
+    modules that reach the filesystem or interpreter, dunder attributes,
+    names that are neither defined in the scene, builtins nor in
+    known_names (skipped when known_names is None), and scenes without
+    animations. An empty list means the scene is worth rendering.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        return [f"{type(e).__name__}: {e.msg}: {(e.text or '').strip()}"]
+
+    source_lines = source.splitlines()
+    problems = []
+    defined = set(dir(builtins)) - FORBIDDEN_NAMES
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            defined.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defined.add(node.name)
+        elif isinstance(node, ast.arg):
+            defined.add(node.arg)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            defined.add(node.name)
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if not (isinstance(node, ast.ImportFrom) and node.module == "manim" and node.names[0].name == "*"):
+                problems.append(f"imports are not allowed: {_line(source_lines, node)}")
+        elif isinstance(node, ast.Attribute) and node.attr.startswith("__"):
+            problems.append(f"dunder attribute {node.attr} is not allowed: {_line(source_lines, node)}")
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            if node.id in FORBIDDEN_NAMES:
+                problems.append(f"{node.id} is not allowed: {_line(source_lines, node)}")
+            elif known_names is not None and node.id not in defined and node.id not in known_names:
+                problems.append(f"undefined name {node.id}: {_line(source_lines, node)}")
+
+    if not problems and count_animations(source) == 0:
+        problems.append("the scene plays no animations")
+    return problems
+
+
+# Render cost per second of video relative to low quality: pixels per second
+# of 854x480@15 (low), 1280x720@30 (medium) and 1920x1080@60 (high)
+QUALITY_COST = {"low": 1.0, "medium": 4.5, "high": 20.0}
+# One LaTeX compile, in the same units; it costs the same at any quality
+TEX_COST = 2.0
+TEX_CLASSES = ("MathTex", "Tex", "SingleStringMathTex")
+
+
+def _number_arg(node: ast.Call, position: Optional[int], keyword: str, default: float) -> float:
+    """A call argument given as a number literal, else default."""
+    value = node.args[position] if position is not None and len(node.args) > position else None
+    for kw in node.keywords:
+        if kw.arg == keyword:
+            value = kw.value
+    if isinstance(value, ast.Constant) and isinstance(value.value, (int, float)):
+        return float(value.value)
+    return default
+
+
+def estimate_cost(source: str, quality: str) -> float:
+    """Estimate how expensive a scene is to render, in relative units.
+
+    Counts seconds of video from ``self.play`` run times and ``self.wait``
+    durations (1 second when not a literal), scales them by the quality's
+    pixel rate and adds a LaTeX compile per MathTex/Tex. Like
+    count_animations, loops make this a lower bound.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return 0.0
+    seconds = 0.0
+    tex_count = 0
+    for node in ast.walk(tree):
+        if _is_self_call(node, ("wait",)):
+            seconds += _number_arg(node, 0, "duration", 1.0)
+        elif _is_self_call(node, ("play",)):
+            seconds += _number_arg(node, None, "run_time", 1.0)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in TEX_CLASSES:
+            tex_count += 1
+    return QUALITY_COST.get(quality, QUALITY_COST["medium"]) * seconds + TEX_COST * tex_count
@@ -0,0 +1,51 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class SceneStore:
+    """Index of generated scene code by scene key and by animation id.
+
+    The code itself stays in ``videos_dir/<animation_id>/<scene_name>.py``;
+    the storage index only records where it is, so a later render at
+    another quality, or a retry, can reuse it instead of asking the LLM again.
+    """
+
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self.videos_dir = storage.videos_dir
+
+    def add(self, animation_id: str, scene_name: str, scene_key: str, params: dict, used_fallback: bool = False):
+        """Record the scene written for an animation.
+
+        Fallback scenes are tracked for re-rendering but never offered as
+        the answer to a new request.
+        """
+        self.storage.add_animation(animation_id, scene_name, scene_key, params, used_fallback)
+
+    def get_animation(self, animation_id: str) -> Optional[dict]:
+        """Look up an animation's record, or None if its scene file is gone."""
+        record = self.storage.get_animation(animation_id)
+        if record is None or not self.scene_file(animation_id, record).exists():
+            return None
+        return record
+
+    def find(self, scene_key: str) -> Optional[str]:
+        """Return the id of an animation whose scene code answers scene_key."""
+        record = self.storage.find_animation(scene_key)
+        if record is None or not self.scene_file(record["id"], record).exists():
+            return None
+        self.storage.touch(record["id"])
+        return record["id"]
+
+    def scene_file(self, animation_id: str, record: Optional[dict] = None) -> Path:
+        record = record or self.storage.get_animation(animation_id) or {}
+        return self.videos_dir / animation_id / f"{record.get('scene_name')}.py"
+
+    def load_code(self, animation_id: str) -> str:
+        with open(self.scene_file(animation_id), encoding="utf-8") as f:
+            return f.read()
@@ -0,0 +1,643 @@
+import logging
+import math
+import re
+import textwrap
+from dataclasses import dataclass
+from typing import Callable, NamedTuple, Optional
+
+from scene_analysis import validate_scene, wrap_scene
+from topics import TopicMatch, compile_keywords
+
+logger = logging.getLogger(__name__)
+
+# Colors by style: (main, accent)
+STYLE_COLORS = {
+    "fun": ("YELLOW", "PINK"),
+    "serious": ("WHITE", "BLUE"),
+    "educational": ("BLUE", "YELLOW")
+}
+# Seconds to pause between steps by level
+LEVEL_PAUSES = {"basic": 2.0, "intermediate": 1.0, "advanced": 0.5}
+
+SUPERSCRIPTS = str.maketrans("0123456789-", "⁰¹²³⁴⁵⁶⁷⁸⁹⁻")
+NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?")
+# Any digit left in a prompt once its parameters are taken out
+DIGIT = re.compile(r"[\d⁰¹²³⁴⁵⁶⁷⁸⁹]")
+WORD = re.compile(r"[a-z]+")
+# Words any template allows: asking for a video, and the glue between parameters
+STOPWORDS = frozenset("""
+    a an the of for to and or with in on at by from between into as is are be it its this that s
+    what how why which when where does do work works mean means
+    show me explain visualize visualise animate animation video demonstrate illustrate teach draw plot graph
+    find compute calculate solve evaluate work out get give make see
+    please can could you i we us let lets want would like help understand
+    simple basic quick short example using use about step steps value values given equals equal
+""".split())
+
+
+class Formula(NamedTuple):
+    """A formula as LaTeX for MathTex, and as plain text for Text when LaTeX is missing."""
+    tex: str
+    plain: str
+
+
+def _fmt(value: float) -> str:
+    """A number as short as it reads: 3 rather than 3.0, at most three decimals."""
+    value = round(value, 3)
+    return str(int(value)) if value == int(value) else str(value)
+
+
+def _numbers(prompt: str) -> list[float]:
+    return [float(found) for found in NUMBER.findall(prompt)]
+
+
+def _rest(prompt: str, *found: Optional[re.Match]) -> str:
+    """The prompt with the spans of found blanked out, to check what the extractor didn't read."""
+    for match in sorted((m for m in found if m), key=lambda m: m.start(), reverse=True):
+        prompt = f"{prompt[:match.start()]} {prompt[match.end():]}"
+    return prompt
+
+
+def _allowed(word: str, allowed: frozenset[str]) -> bool:
+    """Whether word, or the singular of it, is in allowed."""
+    return word in allowed or any(word.endswith(suffix) and word[:-len(suffix)] in allowed for suffix in ("s", "es"))
+
+
+def _power(n: int) -> Formula:
+    """x to the n-th power."""
+    if n == 1:
+        return Formula("x", "x")
+    return Formula(f"x^{n}", f"x{str(n).translate(SUPERSCRIPTS)}")
+
+
+def _step(span: float) -> float:
+    """A tick spacing giving about six ticks over span."""
+    raw = span / 6
+    magnitude = 10 ** math.floor(math.log10(raw))
+    return next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+
+
+def _axis(low: float, high: float) -> list[float]:
+    step = _step(high - low)
+    return [math.floor(low / step) * step, math.ceil(high / step) * step, step]
+
+
+@dataclass
+class SceneTemplate:
+    """A vetted construct() body for one common request, filled in from the prompt.
+
+    ``body`` holds ``{name}`` placeholders for the parameters that
+    ``extract`` reads from a prompt, plus ``color``, ``accent`` and
+    ``pause`` from the request's style and level. ``extract`` returns
+    None when the numbers or terms of the prompt ask for something the
+    template can't show, including any digit or variable it doesn't read
+    into a parameter, and the defaults when the prompt gives no numbers
+    at all. Words are checked by the library against ``words``.
+    """
+    name: str
+    topic: str
+    # Phrases that select this template, matched like topic keywords
+    keywords: tuple[str, ...]
+    # Words besides the keywords and STOPWORDS a prompt for this template may use
+    words: tuple[str, ...]
+    body: str
+    extract: Callable[[str], Optional[dict]]
+
+    def render(self, scene_name: str, params: dict, level: str = "intermediate", style: str = "educational",
+               latex: bool = True) -> str:
+        """Scene code for params; formulas use Text instead of MathTex when latex is False."""
+        values = {}
+        for key, value in params.items():
+            if isinstance(value, Formula):
+                values[key] = f"MathTex(r{value.tex!r})" if latex else f"Text({value.plain!r})"
+            else:
+                values[key] = repr(value)
+        color, accent = STYLE_COLORS.get(style, STYLE_COLORS["educational"])
+        values.update(color=color, accent=accent, pause=repr(LEVEL_PAUSES.get(level, 1.0)))
+        body = textwrap.indent(textwrap.dedent(self.body).strip().format(**values), " " * 8)
+        return wrap_scene(scene_name, body)
+
+
+@dataclass
+class TemplateMatch:
+    template: SceneTemplate
+    params: dict
+
+    def render(self, scene_name: str, level: str = "intermediate", style: str = "educational",
+               latex: bool = True) -> str:
+        return self.template.render(scene_name, self.params, level, style, latex)
+
+
+class TemplateLibrary:
+    """Picks a template for prompts it is confident about.
+
+    A prompt is routed to a template only when the keywords of exactly one
+    template appear in it, no other topic outscores that template's topic,
+    it has at most max_words words (longer prompts tend to ask for
+    something particular), every word in it is a stopword or one the
+    template allows (so "second derivative" or "law of cosines" aren't
+    answered with the plain derivative or unit circle), and the template
+    can show the parameters it asks for. Everything else goes to the LLM.
+    """
+
+    def __init__(self, templates: list[SceneTemplate], max_words: int = 16):
+        self.templates = {template.name: template for template in templates}
+        self.max_words = max_words
+        self.keyword_templates = {keyword.lower(): template.name for template in templates
+                                  for keyword in template.keywords}
+        self.pattern = compile_keywords(self.keyword_templates)
+        self.allowed = {template.name: STOPWORDS | set(template.words)
+                        | {word for keyword in template.keywords for word in WORD.findall(keyword.lower())}
+                        for template in templates}
+
+    def match(self, prompt: str, topics: TopicMatch) -> Optional[TemplateMatch]:
+        if len(prompt.split()) > self.max_words:
+            return None
+        names = {self.keyword_templates.get(" ".join(found.group(1).lower().split()))
+                 for found in self.pattern.finditer(prompt)}
+        names.discard(None)
+        if len(names) != 1:
+            return None
+        template = self.templates.get(names.pop())
+        if template is None:
+            return None
+        best = next(iter(topics.scores.values()), 0)
+        if topics.scores.get(template.topic, 0) < best:
+            return None
+        if not all(_allowed(word, self.allowed[template.name]) for word in WORD.findall(prompt.lower())):
+            return None
+        params = template.extract(prompt)
+        return TemplateMatch(template, params) if params is not None else None
+
+    def check(self, known_names: Optional[frozenset[str]] = None):
+        """Drop templates whose default scene doesn't pass validate_scene, with or without LaTeX."""
+        for name, template in list(self.templates.items()):
+            params = template.extract("")
+            problems = [problem for latex in (True, False)
+                        for problem in validate_scene(template.render("Check", params, latex=latex), known_names)]
+            if problems:
+                logger.error(f"Disabling scene template {name}: {'; '.join(problems)}")
+                del self.templates[name]
+
+    def defaults(self) -> list[TemplateMatch]:
+        """Every template with its default parameters."""
+        return [TemplateMatch(template, template.extract("")) for template in self.templates.values()]
+
+
+# Templates
+
+# A number given for the hypotenuse rather than for a leg
+HYPOTENUSE_VALUE = re.compile(
+    r"(?:hypotenuse|\bc)\s*(?:is|of|=|:|equals|length)?\s*(?:of\s+)?-?\d|\d\s*(?:is\s+the\s+|for\s+the\s+)?hypotenuse",
+    re.IGNORECASE
+)
+
+
+def extract_pythagorean(prompt: str) -> Optional[dict]:
+    # Only the two legs are parameters; solving for a leg is for the LLM
+    if HYPOTENUSE_VALUE.search(prompt):
+        return None
+    sides = _numbers(prompt)
+    if not sides:
+        sides = [3.0, 4.0]
+    if len(sides) != 2 or DIGIT.search(NUMBER.sub(" ", prompt)) or not all(0 < n <= 1000 for n in sides):
+        return None
+    a, b = sides
+    c_squared = a * a + b * b
+    c = math.sqrt(c_squared)
+    exact = c == int(c)
+    sign = "=" if exact else r"\approx"
+    return {
+        "a": _fmt(a), "b": _fmt(b), "a_sq": _fmt(a * a), "b_sq": _fmt(b * b),
+        "unit": round(2.5 / max(a, b), 4),
+        "theorem": Formula("a^2 + b^2 = c^2", "a² + b² = c²"),
+        "numbers": Formula(f"{_fmt(a)}^2 + {_fmt(b)}^2 = {_fmt(c_squared)}",
+                           f"{_fmt(a)}² + {_fmt(b)}² = {_fmt(c_squared)}"),
+        "result": Formula(rf"c = \sqrt{{{_fmt(c_squared)}}} {sign} {_fmt(c)}",
+                          f"c = √{_fmt(c_squared)} {'=' if exact else '≈'} {_fmt(c)}")
+    }
+
+
+PYTHAGOREAN = SceneTemplate(
+    name="pythagorean",
+    topic="geometry",
+    keywords=("pythagorean", "pythagoras", "pythagorean theorem", "hypotenuse"),
+    words=("theorem", "triangle", "right", "angled", "angle", "side", "leg", "length", "a", "b", "c"),
+    extract=extract_pythagorean,
+    body="""
+        title = Text("The Pythagorean Theorem", font_size=40).to_edge(UP)
+        self.play(Write(title))
+        a_len = float({a}) * {unit}
+        b_len = float({b}) * {unit}
+        corner = LEFT * 1 + DOWN * 0.5
+        triangle = Polygon(corner, corner + RIGHT * b_len, corner + UP * a_len, color={color})
+        self.play(Create(triangle))
+        square_a = Square(side_length=a_len, color={color}, fill_opacity=0.3).next_to(triangle, LEFT, buff=0, aligned_edge=DOWN)
+        square_b = Square(side_length=b_len, color={accent}, fill_opacity=0.3).next_to(triangle, DOWN, buff=0, aligned_edge=LEFT)
+        self.play(FadeIn(square_a), FadeIn(square_b))
+        label_a = Text("a² = " + {a_sq}, font_size=24).move_to(square_a)
+        label_b = Text("b² = " + {b_sq}, font_size=24).move_to(square_b)
+        self.play(Write(label_a), Write(label_b))
+        self.wait({pause})
+        theorem = {theorem}.scale(0.8).to_edge(RIGHT).shift(UP)
+        self.play(Write(theorem))
+        numbers = {numbers}.scale(0.8).next_to(theorem, DOWN, aligned_edge=LEFT)
+        self.play(Write(numbers))
+        hypotenuse = Line(corner + RIGHT * b_len, corner + UP * a_len, color={accent}, stroke_width=8)
+        result = {result}.scale(0.8).set_color({accent}).next_to(numbers, DOWN, aligned_edge=LEFT)
+        self.play(Create(hypotenuse), Write(result))
+        self.wait({pause} * 2)
+    """
+)
+
+
+RADIUS = re.compile(r"\b(?:radius|r)\s*(?:is|of|=|:|equals)?\s*(?:of\s+)?(-?\d+(?:\.\d+)?)(?![\d.])", re.IGNORECASE)
+# Other ways to give a circle's size, which the template doesn't convert
+OTHER_MEASURES = re.compile(r"\b(diameter|circumference|perimeter)\b", re.IGNORECASE)
+
+
+def extract_circle_area(prompt: str) -> Optional[dict]:
+    if OTHER_MEASURES.search(prompt):
+        return None
+    found = RADIUS.search(prompt)
+    if DIGIT.search(_rest(prompt, found)):
+        return None
+    r = float(found.group(1)) if found else 2.0
+    if not 0 < r <= 1000:
+        return None
+    return {
+        "r": _fmt(r),
+        "formula": Formula(r"A = \pi r^2", "A = πr²"),
+        "numbers": Formula(rf"A = \pi \cdot {_fmt(r)}^2 \approx {_fmt(math.pi * r * r)}",
+                           f"A = π · {_fmt(r)}² ≈ {_fmt(math.pi * r * r)}")
+    }
+
+
+CIRCLE_AREA = SceneTemplate(
+    name="circle_area",
+    topic="geometry",
+    keywords=("area of a circle", "area of circle", "circle area", "circle's area"),
+    words=("circle", "area", "radius", "r", "pi", "formula"),
+    extract=extract_circle_area,
+    body="""
+        title = Text("Area of a circle", font_size=40).to_edge(UP)
+        self.play(Write(title))
+        circle = Circle(radius=2.5, color={color}, fill_opacity=0.3).shift(LEFT * 2.5 + DOWN * 0.5)
+        self.play(Create(circle))
+        radius = Line(circle.get_center(), circle.get_right(), color={accent})
+        label = Text("r = " + {r}, font_size=28).next_to(radius, UP, buff=0.1)
+        self.play(Create(radius), Write(label))
+        self.wait({pause})
+        formula = {formula}.scale(0.8).to_edge(RIGHT).shift(UP * 1.5)
+        self.play(Write(formula))
+        numbers = {numbers}.scale(0.8).next_to(formula, DOWN, aligned_edge=LEFT)
+        self.play(Write(numbers))
+        self.play(circle.animate.set_fill({accent}, opacity=0.7), run_time=1.5)
+        self.wait({pause} * 2)
+    """
+)
+
+# Functions the calculus templates can't plot; those prompts go to the LLM
+NON_POLYNOMIAL = re.compile(r"\b(sin|cos|tan|sine|cosine|tangent|log|ln|exp|sqrt|root)\b|e\s*\^", re.IGNORECASE)
+# x^n alone; a coefficient, 1/x or a decimal power is left over and turns the prompt down
+POWER = re.compile(
+    r"\bx\s*(?:\^|\*\*)\s*(\d+)(?![\d.])|\bx([¹²³])|\bx\s+(squared|cubed)\b|\b(x)\b(?!\s*(?:\^|\*\*))", re.IGNORECASE
+)
+POWER_WORDS = {"squared": 2, "cubed": 3, "¹": 1, "²": 2, "³": 3, "x": 1}
+# Ways of naming the variable or the function that add no term
+NOTATION = re.compile(r"with respect to x|d\s*/\s*dx|\bdx\b|\b[fy]\s*\(\s*x\s*\)\s*=?|\by\s*=", re.IGNORECASE)
+VARIABLE = re.compile(r"\b[xyz]\b", re.IGNORECASE)
+
+
+def _polynomial_power(prompt: str) -> Optional[int]:
+    """The power n of x^n in the prompt, 2 when there is no function, or None for anything else.
+
+    Anything but a single x^n with 1 <= n <= 3, such as a coefficient,
+    another term, 1/x or a power that isn't a small whole number, gives
+    None. Callers blank out the parameters they read themselves first.
+    """
+    if NON_POLYNOMIAL.search(prompt):
+        return None
+    prompt = NOTATION.sub(" ", prompt)
+    found = POWER.search(prompt)
+    rest = _rest(prompt, found)
+    if DIGIT.search(rest) or VARIABLE.search(rest):
+        return None
+    if not found:
+        return 2
+    n = int(found.group(1)) if found.group(1) else POWER_WORDS[(found.group(2) or found.group(3) or found.group(4)).lower()]
+    return n if 1 <= n <= 3 else None
+
+
+def extract_derivative(prompt: str) -> Optional[dict]:
+    n = _polynomial_power(prompt)
+    if n is None:
+        return None
+    span = 2.0 if n % 2 == 0 else 1.6
+    low, high = (0.0, span ** n) if n % 2 == 0 else (-(span ** n), span ** n)
+    derivative = Formula(_fmt(n), _fmt(n)) if n == 1 else Formula(
+        f"{n}{_power(n - 1).tex}", f"{n}{_power(n - 1).plain}"
+    )
+    return {
+        "n": n,
+        "x_range": _axis(-span, span),
+        "y_range": _axis(low - 0.5, high),
+        "plot_range": [-span, span],
+        "function": Formula(f"f(x) = {_power(n).tex}", f"f(x) = {_power(n).plain}"),
+        "derivative": Formula(f"f'(x) = {derivative.tex}", f"f'(x) = {derivative.plain}")
+    }
+
+
+DERIVATIVE = SceneTemplate(
+    name="derivative",
+    topic="calculus",
+    keywords=("derivative", "differentiation", "differentiate", "rate of change"),
+    words=("x", "y", "f", "d", "dx", "function", "slope", "power", "polynomial", "squared", "cubed", "respect",
+           "first"),
+    extract=extract_derivative,
+    body="""
+        title = Text("The derivative as a slope", font_size=40).to_edge(UP)
+        self.play(Write(title))
+        axes = Axes(x_range={x_range}, y_range={y_range}, x_length=6, y_length=5, tips=False).to_edge(LEFT).shift(DOWN * 0.5)
+        graph = axes.plot(lambda x: x ** {n}, x_range={plot_range}, color={color})
+        self.play(Create(axes), Create(graph))
+        function = {function}.scale(0.8).to_edge(RIGHT).shift(UP * 1.5)
+        self.play(Write(function))
+        t = ValueTracker(0.1)
+        tangent = always_redraw(lambda: TangentLine(graph, alpha=t.get_value(), length=3, color={accent}))
+        dot = always_redraw(lambda: Dot(graph.point_from_proportion(t.get_value()), color={accent}))
+        self.play(Create(tangent), FadeIn(dot))
+        self.play(t.animate.set_value(0.9), run_time=4)
+        self.wait({pause})
+        derivative = {derivative}.scale(0.8).next_to(function, DOWN, aligned_edge=LEFT)
+        self.play(Write(derivative))
+        note = Text("the slope of the tangent line", font_size=24).next_to(derivative, DOWN, aligned_edge=LEFT)
+        self.play(FadeIn(note))
+        self.play(t.animate.set_value(0.5), run_time=2)
+        self.wait({pause} * 2)
+    """
+)
+
+BOUNDS = re.compile(r"(?:from|between)\s+(-?\d+(?:\.\d+)?)\s+(?:to|and)\s+(-?\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+def extract_integral(prompt: str) -> Optional[dict]:
+    found = BOUNDS.search(prompt)
+    n = _polynomial_power(_rest(prompt, found))
+    if n is None:
+        return None
+    a, b = (float(found.group(1)), float(found.group(2))) if found else (0.0, 2.0)
+    if not -3 <= a < b <= 3:
+        return None
+    values = [x ** n for x in (a, b, 0.0)]
+    area = (b ** (n + 1) - a ** (n + 1)) / (n + 1)
+    return {
+        "n": n,
+        "bounds": [a, b],
+        "x_range": _axis(min(a, 0.0) - 0.5, max(b, 0.0) + 0.5),
+        "y_range": _axis(min(values) - 0.5, max(values) + 0.5),
+        "plot_range": [min(a, 0.0) - 0.5, max(b, 0.0) + 0.5],
+        "integral": Formula(rf"\int_{{{_fmt(a)}}}^{{{_fmt(b)}}} {_power(n).tex}\,dx",
+                            f"∫ {_power(n).plain} dx from {_fmt(a)} to {_fmt(b)}"),
+        "value": Formula(f"= {_fmt(area)}", f"= {_fmt(area)}")
+    }
+
+
+INTEGRAL = SceneTemplate(
+    name="integral",
+    topic="calculus",
+    keywords=("integral", "integration", "integrate", "area under the curve", "area under a curve", "riemann sum"),
+    words=("x", "y", "f", "d", "dx", "function", "definite", "area", "under", "curve", "power", "polynomial",
+           "squared", "cubed", "respect"),
+    extract=extract_integral,
+    body="""
+        title = Text("Area under a curve", font_size=40).to_edge(UP)
+        self.play(Write(title))
+        axes = Axes(x_range={x_range}, y_range={y_range}, x_length=6, y_length=5, tips=False).to_edge(LEFT).shift(DOWN * 0.5)
+        graph = axes.plot(lambda x: x ** {n}, x_range={plot_range}, color={color})
+        self.play(Create(axes), Create(graph))
+        integral = {integral}.scale(0.8).to_edge(RIGHT).shift(UP * 1.5)
+        self.play(Write(integral))
+        rects = axes.get_riemann_rectangles(graph, x_range={bounds}, dx=0.5, fill_opacity=0.5, color=[{color}, {accent}])
+        self.play(Create(rects))
+        self.wait({pause})
+        for dx in (0.25, 0.1, 0.05):
+            finer = axes.get_riemann_rectangles(graph, x_range={bounds}, dx=dx, fill_opacity=0.5, color=[{color}, {accent}])
+            self.play(Transform(rects, finer))
+        area = axes.get_area(graph, x_range={bounds}, color={accent}, opacity=0.6)
+        self.play(FadeOut(rects), FadeIn(area))
+        value = {value}.scale(0.8).next_to(integral, DOWN, aligned_edge=LEFT)
+        self.play(Write(value))
+        self.wait({pause} * 2)
+    """
+)
+
+# ax^2 + bx + c with optional coefficients and terms
+QUADRATIC = re.compile(
+    r"(-?\s*\d*(?:\.\d+)?)\s*\*?\s*x\s*(?:\^|\*\*)\s*2"
+    r"(?:\s*([+-]\s*\d*(?:\.\d+)?)\s*\*?\s*x(?![\w^*]))?"
+    r"(?:\s*([+-]\s*\d+(?:\.\d+)?))?"
+)
+
+
+def _coefficient(text: Optional[str], default: float) -> float:
+    if text is None:
+        return default
+    text = text.replace(" ", "")
+    if text in ("", "+"):
+        return 1.0
+    if text == "-":
+        return -1.0
+    return float(text)
+
+
+EQUALS_ZERO = re.compile(r"=\s*0(?![\d.])")
+
+
+def extract_quadratic(prompt: str) -> Optional[dict]:
+    found = QUADRATIC.search(prompt)
+    rest = NOTATION.sub(" ", EQUALS_ZERO.sub(" ", _rest(prompt, found)))
+    if DIGIT.search(rest) or VARIABLE.search(rest):
+        return None
+    if found:
+        a = _coefficient(found.group(1), 1.0)
+        b = _coefficient(found.group(2), 0.0)
+        c = _coefficient(found.group(3), 0.0)
+    else:
+        a, b, c = 1.0, -1.0, -2.0
+    if a == 0:
+        return None
+    h = -b / (2 * a)
+    discriminant = b * b - 4 * a * c
+    if discriminant > 0:
+        roots = sorted(((-b - math.sqrt(discriminant)) / (2 * a), (-b + math.sqrt(discriminant)) / (2 * a)))
+        answer = Formula(rf"x = {_fmt(roots[0])} \text{{ or }} x = {_fmt(roots[1])}",
+                         f"x = {_fmt(roots[0])} or x = {_fmt(roots[1])}")
+        points = [(root, 0.0) for root in roots]
+    elif discriminant == 0:
+        answer = Formula(rf"x = {_fmt(h)} \text{{ (double root)}}", f"x = {_fmt(h)} (double root)")
+        points = [(h, 0.0)]
+    else:
+        answer = Formula(r"b^2 - 4ac < 0 \text{: no real roots}", "b² - 4ac < 0: no real roots")
+        points = [(h, a * h * h + b * h + c)]
+    half = max(3.0, abs(h - points[0][0]) + 1)
+    if half > 10:
+        return None
+    ys = [a * x * x + b * x + c for x in (h - half, h, h + half)] + [0.0]
+    terms = f"{_fmt(a)}x^2" if a != 1 else "x^2"
+    if b:
+        terms += f" {'+' if b > 0 else '-'} {_fmt(abs(b))}x"
+    if c:
+        terms += f" {'+' if c > 0 else '-'} {_fmt(abs(c))}"
+    return {
+        "a": a, "b": b, "c": c,
+        "x_range": _axis(h - half, h + half),
+        "y_range": _axis(min(ys) - 0.5, max(ys) + 0.5),
+        "plot_range": [h - half, h + half],
+        "points": [(round(x, 4) + 0.0, round(y, 4) + 0.0) for x, y in points],
+        "equation": Formula(f"{terms} = 0", f"{terms.replace('^2', '²')} = 0"),
+        "formula": Formula(r"x = \frac{-b \pm \sqrt{b^2 - 4ac}}{2a}", "x = (-b ± √(b² - 4ac)) / 2a"),
+        "answer": answer
+    }
+
+
+QUADRATIC_EQUATION = SceneTemplate(
+    name="quadratic",
+    topic="algebra",
+    keywords=("quadratic", "quadratic equation", "quadratic formula", "parabola"),
+    words=("x", "y", "equation", "formula", "root", "zero", "solution"),
+    extract=extract_quadratic,
+    body="""
+        title = Text("Solving a quadratic equation", font_size=40).to_edge(UP)
+        self.play(Write(title))
+        equation = {equation}.scale(0.8).next_to(title, DOWN)
+        self.play(Write(equation))
+        axes = Axes(x_range={x_range}, y_range={y_range}, x_length=6, y_length=4.5, tips=False).to_corner(DL)
+        graph = axes.plot(lambda x: {a} * x ** 2 + {b} * x + {c}, x_range={plot_range}, color={color})
+        self.play(Create(axes), Create(graph))
+        self.wait({pause})
+        formula = {formula}.scale(0.6).to_edge(RIGHT).shift(UP * 0.5)
+        self.play(Write(formula))
+        points = VGroup(*[Dot(axes.c2p(x, y), color={accent}) for x, y in {points}])
+        self.play(FadeIn(points))
+        answer = {answer}.scale(0.6).set_color({accent}).next_to(formula, DOWN)
+        self.play(Write(answer))
+        self.wait({pause} * 2)
+    """
+)
+
+MATRIX_SIZE = re.compile(r"\b(\d+)\s*[x×]\s*(\d+)\b")
+
+
+def extract_matrix_multiplication(prompt: str) -> Optional[dict]:
+    sizes = MATRIX_SIZE.findall(prompt)
+    if any(size != ("2", "2") for size in sizes):
+        return None
+    numbers = _numbers(MATRIX_SIZE.sub(" ", prompt))
+    if DIGIT.search(NUMBER.sub(" ", MATRIX_SIZE.sub(" ", prompt))):
+        return None
+    if not numbers:
+        numbers = [1, 2, 3, 4, 5, 6, 7, 8]
+    if len(numbers) != 8 or any(n != int(n) or abs(n) > 99 for n in numbers):
+        return None
+    values = [int(n) for n in numbers]
+    a = [values[0:2], values[2:4]]
+    b = [values[4:6], values[6:8]]
+    product = [[a[i][0] * b[0][j] + a[i][1] * b[1][j] for j in range(2)] for i in range(2)]
+    steps = [f"{a[i][0]}·{b[0][j]} + {a[i][1]}·{b[1][j]} = {product[i][j]}" for i in range(2) for j in range(2)]
+    return {"a": a, "b": b, "product": product, "steps": steps}
+
+
+MATRIX_MULTIPLICATION = SceneTemplate(
+    name="matrix_multiplication",
+    topic="linear algebra",
+    keywords=("matrix multiplication", "multiply matrices", "multiplying matrices", "matrix product",
+              "multiply two matrices"),
+    words=("matrix", "matrices", "two", "x", "by", "times", "multiply", "multiplication", "product"),
+    extract=extract_matrix_multiplication,
+    body="""
+        title = Text("Matrix multiplication", font_size=40).to_edge(UP)
+        self.play(Write(title))
+
+        def grid(rows, color):
+            entries = VGroup(*[Text(str(value), font_size=36, color=color) for row in rows for value in row])
+            entries.arrange_in_grid(rows=2, cols=2, buff=0.6)
+            return VGroup(entries, SurroundingRectangle(entries, color=WHITE, buff=0.25))
+
+        left = grid({a}, {color})
+        right = grid({b}, {color})
+        product = grid({product}, {accent})
+        times = Text("×", font_size=48)
+        equals = Text("=", font_size=48)
+        VGroup(left, times, right, equals, product).arrange(RIGHT, buff=0.5)
+        self.play(FadeIn(left), Write(times), FadeIn(right), Write(equals), Create(product[1]))
+        steps = {steps}
+        for i in range(2):
+            for j in range(2):
+                row = SurroundingRectangle(VGroup(left[0][2 * i], left[0][2 * i + 1]), color={accent})
+                column = SurroundingRectangle(VGroup(right[0][j], right[0][j + 2]), color={accent})
+                step = Text(steps[2 * i + j], font_size=32).to_edge(DOWN)
+                self.play(Create(row), Create(column), FadeIn(step))
+                self.play(Write(product[0][2 * i + j]))
+                self.wait({pause} / 2)
+                self.play(FadeOut(row), FadeOut(column), FadeOut(step), run_time=0.5)
+        self.wait({pause} * 2)
+    """
+)
+
+ANGLE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:°|degrees?|deg)(?!\w)", re.IGNORECASE)
+# Angles the template would have to convert
+RADIANS = re.compile(r"\b(radians?|rad|pi)\b|π", re.IGNORECASE)
+
+
+def extract_unit_circle(prompt: str) -> Optional[dict]:
+    found = ANGLE.search(prompt)
+    if RADIANS.search(prompt) or DIGIT.search(_rest(prompt, found)):
+        return None
+    angle = float(found.group(1)) if found else 60.0
+    if not 0 < angle < 360:
+        return None
+    sine, cosine = math.sin(math.radians(angle)), math.cos(math.radians(angle))
+    return {
+        "angle": angle,
+        "identity": Formula(r"\sin^2\theta + \cos^2\theta = 1", "sin²θ + cos²θ = 1"),
+        "values": Formula(
+            rf"\sin {_fmt(angle)}^\circ \approx {_fmt(sine)},\ \cos {_fmt(angle)}^\circ \approx {_fmt(cosine)}",
+            f"sin {_fmt(angle)}° ≈ {_fmt(sine)}, cos {_fmt(angle)}° ≈ {_fmt(cosine)}"
+        )
+    }
+
+
+UNIT_CIRCLE = SceneTemplate(
+    name="unit_circle",
+    topic="trigonometry",
+    keywords=("unit circle", "sine", "cosine", "sine and cosine", "sin and cos"),
+    words=("unit", "circle", "sin", "cos", "angle", "degree", "deg", "theta", "trigonometry", "trig", "function",
+           "identity"),
+    extract=extract_unit_circle,
+    body="""
+        title = Text("Sine and cosine on the unit circle", font_size=36).to_edge(UP)
+        self.play(Write(title))
+        axes = Axes(x_range=[-1.5, 1.5, 0.5], y_range=[-1.5, 1.5, 0.5], x_length=5, y_length=5, tips=False).to_edge(LEFT).shift(DOWN * 0.4)
+        circle = Circle(radius=axes.x_axis.unit_size, color={color}).move_to(axes.c2p(0, 0))
+        self.play(Create(axes), Create(circle))
+        theta = ValueTracker(0.01)
+        radius = always_redraw(lambda: Line(circle.get_center(), circle.point_at_angle(theta.get_value()), color=WHITE))
+        dot = always_redraw(lambda: Dot(circle.point_at_angle(theta.get_value()), color={accent}))
+        cosine = always_redraw(lambda: Line(circle.get_center(), axes.c2p(axes.p2c(circle.point_at_angle(theta.get_value()))[0], 0), color={color}, stroke_width=6))
+        sine = always_redraw(lambda: Line(axes.c2p(axes.p2c(circle.point_at_angle(theta.get_value()))[0], 0), circle.point_at_angle(theta.get_value()), color={accent}, stroke_width=6))
+        self.play(Create(radius), FadeIn(dot), Create(cosine), Create(sine))
+        self.play(theta.animate.set_value({angle} * DEGREES), run_time=2)
+        identity = {identity}.scale(0.8).to_edge(RIGHT).shift(UP * 1.5)
+        self.play(Write(identity))
+        values = {values}.scale(0.6).next_to(identity, DOWN, aligned_edge=LEFT)
+        self.play(Write(values))
+        self.wait({pause})
+        self.play(theta.animate.set_value(TAU), run_time=4, rate_func=linear)
+        self.wait({pause})
+    """
+)
+
+TEMPLATES = [
+    PYTHAGOREAN, CIRCLE_AREA, DERIVATIVE, INTEGRAL, QUADRATIC_EQUATION, MATRIX_MULTIPLICATION, UNIT_CIRCLE
+]
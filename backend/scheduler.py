@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Ticket:
+    client: str
+    cost: float
+    priority: int
+    order: int
+    waiting_since: float = field(default_factory=time.monotonic)
+    granted: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class RenderScheduler:
+    """Hands out a fixed number of render slots, cheapest and fairest first.
+
+    When a slot frees up it goes to the waiting render with the lowest
+    priority value, then to the client that has been granted the least
+    estimated cost so far, then to the cheapest render. A client that
+    becomes active starts level with the least served active client, so
+    clients share the renderers by cost however many renders each queues.
+    Each second of waiting takes ``aging`` off a render's cost, so
+    expensive renders are delayed but never starved.
+    """
+
+    def __init__(self, slots: int, aging: float = 1.0):
+        self.slots = slots
+        self.aging = aging
+        self.running = 0
+        self.granted = 0
+        self._waiting: list[_Ticket] = []
+        self._running_by_client: Counter = Counter()
+        # Estimated cost granted to each active client
+        self._served: dict[str, float] = {}
+        self._order = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, client: str, cost: float, priority: int = 0) -> AsyncIterator[None]:
+        """Wait for a render slot and hold it for the body of the ``async with``."""
+        ticket = _Ticket(client, cost, priority, next(self._order))
+        if client not in self._served:
+            self._served[client] = min(self._served.values(), default=0.0)
+        self._waiting.append(ticket)
+        self._dispatch()
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            if ticket.granted.cancelled():
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                self._forget_if_idle(client)
+            else:
+                # Granted just as we were cancelled: hand the slot on
+                self._release(client)
+            raise
+        try:
+            yield
+        finally:
+            self._release(client)
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "running": self.running,
+            "waiting": len(self._waiting),
+            "granted": self.granted,
+            "clients": len(self._running_by_client)
+        }
+
+    def _release(self, client: str):
+        self.running -= 1
+        self._running_by_client[client] -= 1
+        if self._running_by_client[client] <= 0:
+            del self._running_by_client[client]
+        self._forget_if_idle(client)
+        self._dispatch()
+
+    def _forget_if_idle(self, client: str):
+        if client not in self._running_by_client and all(t.client != client for t in self._waiting):
+            self._served.pop(client, None)
+
+    def _dispatch(self):
+        # Waiters cancelled but not yet woken up to remove themselves
+        self._waiting = [t for t in self._waiting if not t.granted.cancelled()]
+        while self.running < self.slots and self._waiting:
+            now = time.monotonic()
+            ticket = min(self._waiting, key=lambda t: (
+                t.priority,
+                self._served[t.client],
+                t.cost - self.aging * (now - t.waiting_since),
+                t.order
+            ))
+            self._waiting.remove(ticket)
+            self.running += 1
+            self.granted += 1
+            self._running_by_client[ticket.client] += 1
+            self._served[ticket.client] += ticket.cost
+            ticket.granted.set_result(None)
@@ -0,0 +1,62 @@
+import logging
+from pathlib import Path
+
+from shared_store import SharedStore, fetch
+
+logger = logging.getLogger(__name__)
+
+# Manim's config key for partial movie files and the matching subdirectory
+SEGMENT_DIRS = {"partial_movie_dir": "segments"}
+
+# Keep Manim from pruning a job's segment directory; the store does its own eviction
+MAX_FILES_CACHED = 1_000_000
+
+
+class SegmentCache(SharedStore):
+    """Shared, size-bounded store of Manim's partial movie files.
+
+    Manim names each ``self.play`` segment after a hash of the animation,
+    the mobjects on screen and the camera settings, not after the scene,
+    and skips rendering a segment whose file already exists. Pointing
+    every render's ``partial_movie_dir`` at a directory that stored
+    segments are linked into on lookup, see SharedStore, means a scene that differs from an earlier one in a
+    few animations only renders those and concatenates the rest.
+    """
+
+    dirs = SEGMENT_DIRS
+    suffixes = (".mp4", ".mov", ".webm")
+
+    def __init__(self, root: Path, max_bytes: int = 1024 ** 3):
+        super().__init__(root, max_bytes)
+
+    def job_config(self, job_dir: Path) -> dict:
+        return {**super().job_config(job_dir), "max_files_cached": MAX_FILES_CACHED}
+
+
+# In-process lookup counting for warm render workers, see install_segment_hooks
+_segment_stats = {"hits": 0, "misses": 0, "used": set()}
+
+
+def install_segment_hooks():
+    """Link stored segments into a render as Manim looks them up, and count hits and misses."""
+    from manim import config
+    from manim.scene.scene_file_writer import SceneFileWriter
+
+    is_already_cached = SceneFileWriter.is_already_cached
+
+    def counting_is_already_cached(self, hash_invocation: str) -> bool:
+        if hasattr(self, "partial_movie_directory"):
+            fetch(self.partial_movie_directory / f"{hash_invocation}{config.movie_file_extension}")
+        cached = is_already_cached(self, hash_invocation)
+        _segment_stats["hits" if cached else "misses"] += 1
+        _segment_stats["used"].add(f"{hash_invocation}{config.movie_file_extension}")
+        return cached
+
+    SceneFileWriter.is_already_cached = counting_is_already_cached
+
+
+def take_segment_stats() -> dict:
+    """Return and reset the lookups counted since the last call."""
+    stats = {"hits": _segment_stats["hits"], "misses": _segment_stats["misses"], "used": sorted(_segment_stats["used"])}
+    _segment_stats.update(hits=0, misses=0, used=set())
+    return stats
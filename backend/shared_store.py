@@ -0,0 +1,154 @@
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class SharedStore:
+    """Shared, size-bounded store of files that renders reuse between jobs.
+
+    Renders never write into the store. Each job gets its own, initially
+    empty, directory per Manim config key in ``dirs``, and hooks in the
+    render process hard link a stored file into it when Manim first looks
+    for that file, see ``fetch``, so setting up a job costs the same however
+    large the store grows. When the job finishes its new files are linked
+    into the store under a temporary name and renamed into place.
+    Concurrent jobs therefore never see a half-written file or clean up
+    each other's scratch files. Only files ending in one of ``suffixes`` are
+    shared. Files are evicted least recently used first, using mtime as the
+    use time.
+    """
+
+    # Manim config key -> subdirectory of the store and of a job directory
+    dirs: dict[str, str] = {}
+    suffixes: tuple[str, ...] = ()
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        for subdir in self.dirs.values():
+            (root / subdir).mkdir(parents=True, exist_ok=True)
+
+    def job_config(self, job_dir: Path) -> dict:
+        """Manim config overrides that point a render at job_dir."""
+        return {key: str(job_dir / subdir) for key, subdir in self.dirs.items()}
+
+    def prepare(self, job_dir: Path) -> dict[str, str]:
+        """Create a job's directories and return where fetch finds their stored files."""
+        lookups = {}
+        for subdir in self.dirs.values():
+            target = job_dir / subdir
+            target.mkdir(parents=True, exist_ok=True)
+            lookups[str(target)] = str(self.root / subdir)
+        return lookups
+
+    def collect(self, job_dir: Path, used: Iterable[str] = ()) -> int:
+        """Move a finished job's new files into the store and mark used ones as fresh.
+
+        Returns the number of new files, i.e. the ones the job had to produce.
+        """
+        added = 0
+        now = time.time()
+        used = set(used)
+        for subdir in self.dirs.values():
+            source = job_dir / subdir
+            if not source.exists():
+                continue
+            for entry in os.scandir(source):
+                if not entry.name.endswith(self.suffixes):
+                    continue
+                cached = self.root / subdir / entry.name
+                if cached.exists():
+                    if entry.name in used:
+                        os.utime(cached, (now, now))
+                    continue
+                tmp_file = cached.with_name(f".{uuid.uuid4().hex}.tmp")
+                _link_or_copy(Path(entry.path), tmp_file)
+                os.replace(tmp_file, cached)
+                added += 1
+        self.evict()
+        return added
+
+    def record(self, hits: int, misses: int):
+        self.hits += hits
+        self.misses += misses
+
+    def evict(self):
+        files = []
+        for subdir in self.dirs.values():
+            for entry in os.scandir(self.root / subdir):
+                if entry.is_file():
+                    stat_result = entry.stat()
+                    files.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        files = 0
+        size = 0
+        for subdir in self.dirs.values():
+            for entry in os.scandir(self.root / subdir):
+                if entry.is_file():
+                    files += 1
+                    size += entry.stat().st_size
+        lookups = self.hits + self.misses
+        return {
+            "files": files,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+# Job directory -> store directory, for the render running in this process
+_lookups: dict[Path, Path] = {}
+
+
+def set_lookups(lookups: dict[str, str]):
+    """Point fetch at the store directories of the job about to render, as returned by prepare."""
+    _lookups.clear()
+    _lookups.update({Path(job_dir).resolve(): Path(store_dir) for job_dir, store_dir in lookups.items()})
+
+
+def fetch(path: Path):
+    """Link the stored copy of a file Manim is about to look for into the job's directory.
+
+    Called from render hooks; does nothing for files the job already has,
+    files outside the job's directories and files the store doesn't have.
+    """
+    if path.exists():
+        return
+    store_dir = _lookups.get(path.parent.resolve())
+    if store_dir is not None:
+        _link_or_copy(store_dir / path.name, path)
+
+
+def _link_or_copy(source: Path, target: Path):
+    """Hard link source to target, copying where links aren't possible."""
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        pass
+    except FileNotFoundError:
+        # Evicted while we were looking at it
+        pass
+    except OSError:
+        shutil.copy2(source, target)
@@ -0,0 +1,385 @@
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS animations (
+    id TEXT PRIMARY KEY,
+    scene_name TEXT NOT NULL,
+    scene_key TEXT,
+    prompt TEXT,
+    level TEXT,
+    style TEXT,
+    fallback INTEGER NOT NULL DEFAULT 0,
+    scene_bytes INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS animations_scene_key ON animations (scene_key, fallback, created_at);
+CREATE INDEX IF NOT EXISTS animations_last_access ON animations (last_access);
+CREATE TABLE IF NOT EXISTS videos (
+    animation_id TEXT NOT NULL REFERENCES animations (id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    quality TEXT,
+    cache_key TEXT UNIQUE,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (animation_id, filename)
+);
+CREATE INDEX IF NOT EXISTS videos_last_access ON videos (last_access);
+"""
+
+# Scene files and videos as written by the render jobs
+SCENE_FILE = re.compile(r"^Scene_\w+\.py$")
+VIDEO_QUALITY = re.compile(r"_(low|medium|high)\.mp4$")
+
+# Reading a video again within this many seconds doesn't update its last access
+TOUCH_RESOLUTION = 60
+
+
+class Storage:
+    """SQLite index of everything under videos_dir, with its lifecycle.
+
+    Each animation directory holds one scene file and the videos rendered
+    from it. The index records their sizes, qualities and last access, so
+    lookups and listings never walk the file system. ``enforce`` deletes
+    animations not accessed for ``ttl`` seconds and then, while the total
+    is over ``max_bytes``, the least recently used videos, then scenes left
+    without a video. ``sweep`` removes what crashed jobs left behind.
+    Animations and jobs named in ``active`` are never touched.
+
+    The connection is shared between the event loop and maintenance
+    threads, so every statement runs under a lock.
+    """
+
+    def __init__(self, videos_dir: Path, max_bytes: int = 0, ttl: float = 0, grace: float = 3600):
+        self.videos_dir = videos_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Untracked files younger than this may belong to a job still writing them
+        self.grace = grace
+        self.evicted_videos = 0
+        self.evicted_animations = 0
+        self.orphans_removed = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(videos_dir / "storage.sqlite3", check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    # Animations
+
+    def add_animation(self, animation_id: str, scene_name: str, scene_key: Optional[str], params: dict,
+                      fallback: bool = False, created_at: Optional[float] = None):
+        scene_file = self.videos_dir / animation_id / f"{scene_name}.py"
+        now = created_at or time.time()
+        with self._transaction() as db:
+            # An upsert, as replacing the row would cascade to its videos
+            db.execute(
+                "INSERT INTO animations "
+                "(id, scene_name, scene_key, prompt, level, style, fallback, scene_bytes, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET scene_name = excluded.scene_name, scene_key = excluded.scene_key, "
+                "prompt = excluded.prompt, level = excluded.level, style = excluded.style, "
+                "fallback = excluded.fallback, scene_bytes = excluded.scene_bytes, last_access = excluded.last_access",
+                (animation_id, scene_name, scene_key, params.get("prompt"), params.get("level"), params.get("style"),
+                 int(fallback), _size(scene_file), now, now)
+            )
+
+    def get_animation(self, animation_id: str) -> Optional[dict]:
+        rows = self._query("SELECT * FROM animations WHERE id = ?", (animation_id,))
+        return _animation(rows[0]) if rows else None
+
+    def find_animation(self, scene_key: str) -> Optional[dict]:
+        """The newest non-fallback animation whose scene answers scene_key."""
+        rows = self._query(
+            "SELECT * FROM animations WHERE scene_key = ? AND fallback = 0 ORDER BY created_at DESC LIMIT 1",
+            (scene_key,)
+        )
+        return _animation(rows[0]) if rows else None
+
+    def list_animations(self, limit: int = 50, offset: int = 0) -> list[dict]:
+        """Animations, most recently used first, each with its videos."""
+        rows = self._query(
+            "SELECT * FROM animations ORDER BY last_access DESC LIMIT ? OFFSET ?", (limit, offset)
+        )
+        animations = [_animation(row) for row in rows]
+        if animations:
+            ids = [animation["id"] for animation in animations]
+            videos = self._query(
+                f"SELECT * FROM videos WHERE animation_id IN ({','.join('?' * len(ids))}) ORDER BY created_at",
+                tuple(ids)
+            )
+            by_id = {animation["id"]: animation for animation in animations}
+            for video in videos:
+                by_id[video["animation_id"]]["videos"].append(_video(video))
+        return animations
+
+    def animation_videos(self, animation_id: str) -> list[dict]:
+        rows = self._query("SELECT * FROM videos WHERE animation_id = ? ORDER BY created_at", (animation_id,))
+        return [_video(row) for row in rows]
+
+    def forget_animation(self, animation_id: str):
+        """Drop an animation whose directory has gone from the index."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM animations WHERE id = ?", (animation_id,))
+
+    # Videos
+
+    def add_video(self, animation_id: str, video_file: Path, quality: Optional[str],
+                  cache_key: Optional[str] = None, last_access: Optional[float] = None):
+        """Record a finished video, optionally as the cached answer for cache_key."""
+        now = last_access or time.time()
+        with self._transaction() as db:
+            if cache_key is not None:
+                # A newer render takes over the key; the old video ages out on its own
+                db.execute("UPDATE videos SET cache_key = NULL WHERE cache_key = ?", (cache_key,))
+            db.execute(
+                "INSERT OR REPLACE INTO videos "
+                "(animation_id, filename, quality, cache_key, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (animation_id, video_file.name, quality, cache_key, _size(video_file), now, now)
+            )
+            db.execute("UPDATE animations SET last_access = ? WHERE id = ?", (now, animation_id))
+
+    def find_video(self, cache_key: str) -> Optional[dict]:
+        """The video cached for cache_key, dropping the entry if its file is gone."""
+        rows = self._query("SELECT * FROM videos WHERE cache_key = ?", (cache_key,))
+        if not rows:
+            return None
+        video = _video(rows[0])
+        if not (self.videos_dir / video["animation_id"] / video["filename"]).exists():
+            with self._transaction() as db:
+                db.execute("DELETE FROM videos WHERE animation_id = ? AND filename = ?",
+                           (video["animation_id"], video["filename"]))
+            return None
+        return video
+
+    def touch(self, animation_id: str, filename: Optional[str] = None):
+        """Mark an animation, and one of its videos, as just used."""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("UPDATE animations SET last_access = ? WHERE id = ? AND last_access < ?",
+                       (now, animation_id, now - TOUCH_RESOLUTION))
+            if filename is not None:
+                db.execute("UPDATE videos SET last_access = ? WHERE animation_id = ? AND filename = ? "
+                           "AND last_access < ?", (now, animation_id, filename, now - TOUCH_RESOLUTION))
+
+    # Lifecycle
+
+    def total_bytes(self) -> int:
+        rows = self._query(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM videos) + (SELECT COALESCE(SUM(scene_bytes), 0) FROM animations)"
+        )
+        return rows[0][0]
+
+    def enforce(self, active: Iterable[str] = ()) -> int:
+        """Apply the TTL and then the quota. Blocks on file deletion; returns bytes freed."""
+        active = set(active)
+        freed = 0
+        if self.ttl:
+            expired = self._query("SELECT id FROM animations WHERE last_access < ?", (time.time() - self.ttl,))
+            for row in expired:
+                if row["id"] not in active:
+                    freed += self._remove_animation(row["id"])
+        if not self.max_bytes:
+            return freed
+
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return freed
+        for video in self._query("SELECT animation_id, filename, size FROM videos ORDER BY last_access"):
+            if excess <= 0:
+                break
+            if video["animation_id"] in active:
+                continue
+            self._remove_video(video["animation_id"], video["filename"])
+            excess -= video["size"]
+            freed += video["size"]
+        # Scene code is small, so it only goes once no videos are left to evict
+        if excess > 0:
+            for row in self._query(
+                "SELECT id, scene_bytes FROM animations WHERE id NOT IN (SELECT animation_id FROM videos) "
+                "ORDER BY last_access"
+            ):
+                if excess <= 0:
+                    break
+                if row["id"] not in active:
+                    excess -= row["scene_bytes"]
+                    freed += self._remove_animation(row["id"])
+        if excess > 0:
+            logger.warning(f"Storage is {excess} bytes over its quota with nothing left to evict")
+        return freed
+
+    def sweep(self, temp_dir: Optional[Path] = None, active: Iterable[str] = ()) -> int:
+        """Reconcile the index with the disk. Returns the number of orphans removed.
+
+        Untracked animation directories with a scene file are adopted into
+        the index; other untracked directories and files are deleted once
+        older than the grace period, as are index rows whose files are gone
+        and scratch directories in temp_dir no active job owns.
+        """
+        active = set(active)
+        cutoff = time.time() - self.grace
+        removed = 0
+        tracked = {row["id"]: row["scene_name"] for row in self._query("SELECT id, scene_name FROM animations")}
+        videos: dict[str, set[str]] = {}
+        for row in self._query("SELECT animation_id, filename FROM videos"):
+            videos.setdefault(row["animation_id"], set()).add(row["filename"])
+
+        for entry in os.scandir(self.videos_dir):
+            if not entry.is_dir() or entry.name in active:
+                continue
+            path = Path(entry.path)
+            scene_name = tracked.get(entry.name)
+            if scene_name is None:
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+                if self._adopt(path):
+                    continue
+                logger.info(f"Removing orphaned animation directory {entry.name}")
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+                continue
+            keep = {f"{scene_name}.py"} | videos.get(entry.name, set())
+            for child in os.scandir(path):
+                if child.name not in keep and _mtime(child) < cutoff:
+                    logger.info(f"Removing orphaned file {entry.name}/{child.name}")
+                    _remove(Path(child.path))
+                    removed += 1
+
+        # Index rows whose files went missing
+        for animation_id, scene_name in tracked.items():
+            if not (self.videos_dir / animation_id / f"{scene_name}.py").exists() and animation_id not in active:
+                self.forget_animation(animation_id)
+                removed += 1
+                continue
+            for filename in videos.get(animation_id, ()):
+                if not (self.videos_dir / animation_id / filename).exists():
+                    with self._transaction() as db:
+                        db.execute("DELETE FROM videos WHERE animation_id = ? AND filename = ?",
+                                   (animation_id, filename))
+                    removed += 1
+
+        if temp_dir is not None and temp_dir.exists():
+            for entry in os.scandir(temp_dir):
+                if entry.name not in active and _mtime(entry) < cutoff:
+                    logger.info(f"Removing abandoned scratch directory {entry.name}")
+                    _remove(Path(entry.path))
+                    removed += 1
+
+        self.orphans_removed += removed
+        return removed
+
+    def stats(self) -> dict:
+        counts = self._query(
+            "SELECT (SELECT COUNT(*) FROM animations), (SELECT COUNT(*) FROM videos), "
+            "(SELECT COUNT(*) FROM videos WHERE cache_key IS NOT NULL)"
+        )[0]
+        return {
+            "animations": counts[0],
+            "videos": counts[1],
+            "cached_videos": counts[2],
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "evicted_videos": self.evicted_videos,
+            "evicted_animations": self.evicted_animations,
+            "orphans_removed": self.orphans_removed
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _remove_video(self, animation_id: str, filename: str):
+        logger.info(f"Evicting video {animation_id}/{filename}")
+        with self._transaction() as db:
+            db.execute("DELETE FROM videos WHERE animation_id = ? AND filename = ?", (animation_id, filename))
+        (self.videos_dir / animation_id / filename).unlink(missing_ok=True)
+        self.evicted_videos += 1
+
+    def _remove_animation(self, animation_id: str) -> int:
+        rows = self._query(
+            "SELECT scene_bytes + (SELECT COALESCE(SUM(size), 0) FROM videos WHERE animation_id = ?) "
+            "FROM animations WHERE id = ?", (animation_id, animation_id)
+        )
+        logger.info(f"Evicting animation {animation_id}")
+        self.forget_animation(animation_id)
+        shutil.rmtree(self.videos_dir / animation_id, ignore_errors=True)
+        self.evicted_animations += 1
+        return rows[0][0] if rows else 0
+
+    def _adopt(self, path: Path) -> bool:
+        """Index an animation directory written before the index existed."""
+        scene_files = [entry for entry in os.scandir(path) if SCENE_FILE.match(entry.name)]
+        if len(scene_files) != 1:
+            return False
+        scene_name = scene_files[0].name[:-3]
+        created_at = scene_files[0].stat().st_mtime
+        logger.info(f"Adopting untracked animation {path.name}")
+        self.add_animation(path.name, scene_name, None, {}, created_at=created_at)
+        self._adopt_videos(path, scene_name)
+        return True
+
+    def _adopt_videos(self, path: Path, scene_name: str):
+        for entry in os.scandir(path):
+            if entry.name.startswith(scene_name) and entry.name.endswith(".mp4"):
+                quality = VIDEO_QUALITY.search(entry.name)
+                self.add_video(path.name, Path(entry.path), quality.group(1) if quality else None,
+                               last_access=entry.stat().st_mtime)
+
+
+def _animation(row: sqlite3.Row) -> dict:
+    return {**dict(row), "fallback": bool(row["fallback"]), "videos": []}
+
+
+def _video(row: sqlite3.Row) -> dict:
+    return dict(row)
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _mtime(entry: os.DirEntry) -> float:
+    try:
+        return entry.stat(follow_symlinks=False).st_mtime
+    except FileNotFoundError:
+        return float("inf")
+
+
+def _remove(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
@@ -0,0 +1,65 @@
+import subprocess
+from pathlib import Path
+
+from hls import HlsStream
+
+
+class FakeStream(HlsStream):
+    """An HlsStream whose ffmpeg writes empty segments, with durations taken from the partial file names."""
+
+    def __init__(self, directory: Path, **kwargs):
+        super().__init__(directory, **kwargs)
+        self.encoded = []
+
+    def _ffmpeg(self, partial_file: Path, output: list[str]) -> subprocess.CompletedProcess:
+        duration = float(partial_file.stem)
+        if "segment" not in output:
+            Path(output[-1]).write_bytes(b"")
+            return subprocess.CompletedProcess([], 0, "", f"  Duration: 00:00:{duration:05.2f}, start: 0.0")
+        self.encoded.append(partial_file.name)
+        listing = Path(output[output.index("-segment_list") + 1])
+        lines = []
+        start = 0.0
+        while start < duration:
+            end = min(start + self.target_duration, duration)
+            filename = self.directory / f".split{len(lines):03d}.ts.tmp"
+            filename.write_bytes(b"")
+            lines.append(f"{filename.name},{start:.6f},{end:.6f}")
+            start = end
+        listing.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return subprocess.CompletedProcess([], 0, "", "")
+
+
+def playlist(stream: HlsStream) -> list[str]:
+    return stream.playlist.read_text(encoding="utf-8").splitlines()
+
+
+def test_target_duration_stays_fixed(tmp_path):
+    stream = FakeStream(tmp_path / "stream")
+    stream._add(Path("2.5.mp4"))
+    first = [line for line in playlist(stream) if line.startswith("#EXT-X-TARGETDURATION")]
+    stream._add(Path("9.8.mp4"))
+    stream.finish()
+
+    assert first == ["#EXT-X-TARGETDURATION:10"]
+    assert "#EXT-X-TARGETDURATION:10" in playlist(stream)
+    assert stream.segments == [("00000.ts", 2.5), ("00001.ts", 9.8)]
+    assert stream.encoded == []
+    assert playlist(stream)[-1] == "#EXT-X-ENDLIST"
+
+
+def test_long_animation_is_split(tmp_path):
+    started = []
+    stream = FakeStream(tmp_path / "stream", on_start=lambda: started.append(True))
+    stream._add(Path("1.mp4"))
+    stream._add(Path("25.mp4"))
+
+    assert stream.encoded == ["25.mp4"]
+    assert stream.segments == [("00000.ts", 1.0), ("00001.ts", 10.0), ("00002.ts", 10.0), ("00003.ts", 5.0)]
+    assert stream.duration == 26.0
+    assert sorted(path.name for path in stream.directory.iterdir()) == [
+        "00000.ts", "00001.ts", "00002.ts", "00003.ts", "index.m3u8"
+    ]
+    assert "#EXT-X-TARGETDURATION:10" in playlist(stream)
+    assert all(float(line[8:-1]) <= 10 for line in playlist(stream) if line.startswith("#EXTINF"))
+    assert started == [True]
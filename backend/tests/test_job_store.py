@@ -0,0 +1,233 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from job_store import MemoryJobStore, SQLiteJobStore
+from jobs import FAILED, QUEUED, RUNNING, Job, JobManager
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteJobStore(tmp_path / "jobs.sqlite3", poll_interval=0.05, max_attempts=2)
+    yield store
+    store.close()
+
+
+def expire_lease(store: SQLiteJobStore, job_id: str):
+    store._execute("UPDATE jobs SET lease_expires = 0 WHERE id = ?", (job_id,))
+
+
+def claim(store: SQLiteJobStore, node: str = "node-a", lease: float = 60) -> Job:
+    return asyncio.run(asyncio.wait_for(store.claim(node, lease), 2))
+
+
+def test_claim_takes_priority_then_submission_order(store):
+    late = Job("late", {}, priority=1)
+    first = Job("first", {})
+    second = Job("second", {})
+    for job in (late, first, second):
+        store.add(job)
+
+    assert [claim(store).id for _ in range(3)] == [first.id, second.id, late.id]
+
+
+def test_claim_marks_the_job_running(store):
+    store.add(Job("a", {}))
+
+    job = claim(store)
+
+    assert job.status == RUNNING
+    assert job.started_at is not None
+    assert store.get(job.id).status == RUNNING
+    assert store._try_claim("node-b", 60) is None
+
+
+def test_claim_waits_for_a_job(store):
+    async def scenario():
+        waiter = asyncio.create_task(store.claim("node-a", 60))
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        job = Job("a", {})
+        store.add(job)
+        return job, await asyncio.wait_for(waiter, 2)
+
+    job, claimed = asyncio.run(scenario())
+    assert claimed.id == job.id
+
+
+def test_claim_is_exclusive_across_connections(store, tmp_path):
+    other = SQLiteJobStore(tmp_path / "jobs.sqlite3", max_attempts=2)
+    try:
+        store.add(Job("a", {}))
+        assert other._try_claim("node-b", 60) is not None
+        assert store._try_claim("node-a", 60) is None
+    finally:
+        other.close()
+
+
+def test_expired_lease_is_claimed_again(store):
+    job = Job("a", {})
+    store.add(job)
+    claim(store, "node-a")
+    assert store._try_claim("node-b", 60) is None
+
+    expire_lease(store, job.id)
+    reclaimed = store._try_claim("node-b", 60)
+
+    assert reclaimed.id == job.id
+    assert not store.renew(job.id, "node-a", 60)
+    assert store.renew(job.id, "node-b", 60)
+
+
+def test_renewed_lease_is_not_claimed_again(store):
+    job = Job("a", {})
+    store.add(job)
+    claim(store, "node-a", lease=0.05)
+
+    assert store.renew(job.id, "node-a", 60)
+
+    assert store._try_claim("node-b", 60) is None
+
+
+def test_job_fails_after_max_attempts(store):
+    job = Job("a", {})
+    store.add(job)
+    for _ in range(store.max_attempts):
+        assert store._try_claim("node-a", 60).id == job.id
+        expire_lease(store, job.id)
+
+    assert store._try_claim("node-b", 60) is None
+    failed = store.get(job.id)
+    assert failed.status == FAILED
+    assert failed.error == "Job was abandoned by its render node 2 times"
+    assert failed.events[-1]["stage"] == "failed"
+
+
+def test_failed_job_does_not_block_the_queue(store):
+    stuck = Job("stuck", {})
+    waiting = Job("waiting", {})
+    store.add(stuck)
+    for _ in range(store.max_attempts):
+        store._try_claim("node-a", 60)
+        expire_lease(store, stuck.id)
+    store.add(waiting)
+
+    assert store._try_claim("node-b", 60).id == waiting.id
+    assert store.get(stuck.id).status == FAILED
+
+
+def test_release_returns_the_attempt(store):
+    job = Job("a", {})
+    store.add(job)
+    claimed = store._try_claim("node-a", 60)
+
+    assert store.release(claimed, "node-a")
+
+    assert store.get(job.id).status == QUEUED
+    # Handing a job back on shutdown doesn't count against it
+    for _ in range(store.max_attempts):
+        assert store._try_claim("node-a", 60).id == job.id
+        expire_lease(store, job.id)
+
+
+def test_store_uses_a_rollback_journal(store):
+    db = sqlite3.connect(store.path)
+    try:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    finally:
+        db.close()
+
+
+def test_old_owner_cannot_write_after_losing_the_lease(store):
+    job = Job("a", {})
+    store.add(job)
+    old = store._try_claim("node-a", 60)
+    expire_lease(store, job.id)
+    new = store._try_claim("node-b", 60)
+    new.events.append({"stage": "rendering"})
+    assert store.save(new, "node-b")
+
+    old.events.append({"stage": "rendering", "stale": True})
+    assert not store.save(old, "node-a")
+    assert not store.release(old, "node-a")
+
+    stored = store.get(job.id)
+    assert stored.status == RUNNING
+    assert stored.events[-1] == {"stage": "rendering"}
+    assert store._try_claim("node-c", 60) is None
+
+
+def test_manager_stops_a_job_whose_lease_is_lost(store):
+    async def scenario():
+        started = asyncio.Event()
+
+        async def handler(job):
+            started.set()
+            await asyncio.sleep(60)
+
+        manager = JobManager(handler, store, workers=1, node="node-a", lease=60)
+        job = Job("a", {})
+        manager.submit(job)
+        await manager.start()
+        await asyncio.wait_for(started.wait(), 2)
+        expire_lease(store, job.id)
+        assert store._try_claim("node-b", 60) is not None
+
+        manager.publish(job, "rendering")
+        await asyncio.sleep(0.05)
+        running = dict(manager._running)
+        await manager.stop()
+        return job, running
+
+    job, running = asyncio.run(scenario())
+    assert running == {}
+    stored = store.get(job.id)
+    assert stored.status == RUNNING
+    assert [event["stage"] for event in stored.events] == ["queued", "started"]
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda path: MemoryJobStore(),
+    lambda path: SQLiteJobStore(path / "jobs.sqlite3")
+], ids=["memory", "sqlite"])
+def test_drafts_share_an_unfinished_upgrade(tmp_path, make_store):
+    store = make_store(tmp_path)
+    try:
+        upgrade = Job("a", {"cache_key": "high"})
+        store.add(upgrade)
+        assert store.join_upgrade("high", "draft-1") is None
+        store.add_upgrade("high", upgrade.id)
+
+        assert store.join_upgrade("high", "draft-2") == upgrade.id
+        assert store.join_upgrade("high", "draft-3") == upgrade.id
+        assert store.join_upgrade("other", "draft-4") is None
+
+        assert store.pop_upgrade("high", "someone-else") == []
+        assert store.pop_upgrade("high", upgrade.id) == ["draft-2", "draft-3"]
+        assert store.join_upgrade("high", "draft-5") is None
+    finally:
+        store.close()
+
+
+def test_failed_upgrade_is_not_joined(store):
+    upgrade = Job("a", {"cache_key": "high"})
+    store.add(upgrade)
+    store.add_upgrade("high", upgrade.id)
+    upgrade.status = FAILED
+    store.save(upgrade)
+
+    assert store.join_upgrade("high", "draft") is None
+
+
+def test_upgrades_are_shared_between_nodes(store, tmp_path):
+    other = SQLiteJobStore(tmp_path / "jobs.sqlite3")
+    try:
+        upgrade = Job("a", {"cache_key": "high"})
+        store.add(upgrade)
+        store.add_upgrade("high", upgrade.id)
+
+        assert other.join_upgrade("high", "draft") == upgrade.id
+        assert store.pop_upgrade("high", upgrade.id) == ["draft"]
+    finally:
+        other.close()
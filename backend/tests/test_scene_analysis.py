@@ -0,0 +1,109 @@
+import pytest
+
+from scene_analysis import count_animations, estimate_cost, normalize_body, validate_scene, wrap_scene
+
+KNOWN_NAMES = frozenset({"Scene", "Circle", "Create", "MathTex", "Text", "Write", "FadeOut", "UP", "BLUE"})
+
+
+def scene(body: str) -> str:
+    return wrap_scene("Check", normalize_body(body))
+
+
+def test_fenced_answer_is_unwrapped():
+    body = normalize_body(
+        "```python\n"
+        "from manim import *\n"
+        "def construct(self):\n"
+        "    circle = Circle()\n"
+        "    self.play(Create(circle))\n"
+        "```\n"
+    )
+    assert body == "        circle = Circle()\n        self.play(Create(circle))"
+
+
+def test_flush_left_body_is_indented():
+    body = normalize_body("circle = Circle()\nself.play(Create(circle))\nself.wait()")
+    assert body.splitlines() == ["        circle = Circle()", "        self.play(Create(circle))", "        self.wait()"]
+    assert validate_scene(wrap_scene("Check", body), KNOWN_NAMES) == []
+
+
+def test_flush_first_line_with_indented_rest():
+    body = normalize_body("circle = Circle()\n        self.play(Create(circle))\n        self.wait()")
+    assert body.splitlines()[1] == "        self.play(Create(circle))"
+    assert validate_scene(wrap_scene("Check", body), KNOWN_NAMES) == []
+
+
+def test_nested_blocks_keep_their_indentation():
+    body = normalize_body("\tfor i in range(3):\n\t\tself.play(Create(Circle()))\n\tself.wait()")
+    assert body.splitlines() == [
+        "        for i in range(3):", "            self.play(Create(Circle()))", "        self.wait()"
+    ]
+
+
+def test_valid_scene_passes():
+    source = scene('title = Text("Hi").to_edge(UP)\nself.play(Write(title))\nself.wait(1)')
+    assert validate_scene(source, KNOWN_NAMES) == []
+
+
+@pytest.mark.parametrize("body, problem", [
+    ('data = open("/etc/passwd").read()\nself.wait()', "open is not allowed"),
+    ('exec("print(1)")\nself.wait()', "exec is not allowed"),
+    ('eval("1")\nself.wait()', "eval is not allowed"),
+    ('__import__("os")\nself.wait()', "__import__ is not allowed"),
+    ('getattr(self, "play")(Create(Circle()))', "getattr is not allowed"),
+    ("os.remove('x')\nself.wait()", "os is not allowed"),
+    ("import os\nself.wait()", "imports are not allowed"),
+    ("from pathlib import Path\nself.wait()", "imports are not allowed"),
+    ("cls = self.__class__\nself.wait()", "dunder attribute __class__ is not allowed"),
+    ("subclasses = ().__class__.__base__.__subclasses__()\nself.wait()", "dunder attribute __subclasses__"),
+    ("self.play(Create(Square()))", "undefined name Square"),
+    ("circle = Circle()", "the scene plays no animations"),
+])
+def test_rejected_constructs(body, problem):
+    problems = validate_scene(scene(body), KNOWN_NAMES)
+    assert any(problem in found for found in problems), problems
+
+
+def test_syntax_error_is_reported():
+    problems = validate_scene(wrap_scene("Check", "        self.play(Create(Circle())"), KNOWN_NAMES)
+    assert len(problems) == 1
+    assert problems[0].startswith("SyntaxError")
+
+
+def test_undefined_names_are_skipped_without_known_names():
+    assert validate_scene(scene("self.play(Create(Square()))")) == []
+
+
+def test_names_defined_in_the_scene_are_known():
+    source = scene("def make(radius):\n    return Circle(radius=radius)\nshape = make(2)\nself.play(Create(shape))")
+    assert validate_scene(source, KNOWN_NAMES) == []
+
+
+SCENE = scene(
+    'title = MathTex(r"a^2 + b^2 = c^2")\n'
+    "self.play(Write(title), run_time=2)\n"
+    "self.wait(3)\n"
+    "self.play(Create(Circle()))\n"
+    "self.wait()\n"
+    'self.play(FadeOut(title), run_time=0.5)'
+)
+
+
+def test_count_animations():
+    assert count_animations(SCENE) == 5
+    assert count_animations("def broken(:") == 0
+
+
+@pytest.mark.parametrize("quality, cost", [
+    ("low", 7.5 * 1.0 + 2.0),
+    ("medium", 7.5 * 4.5 + 2.0),
+    ("high", 7.5 * 20.0 + 2.0),
+    ("unknown", 7.5 * 4.5 + 2.0),
+])
+def test_estimate_cost(quality, cost):
+    # 2 + 3 + 1 + 1 + 0.5 seconds of video and one LaTeX compile
+    assert estimate_cost(SCENE, quality) == pytest.approx(cost)
+
+
+def test_estimate_cost_of_unparsable_scene():
+    assert estimate_cost("def broken(:", "high") == 0.0
@@ -0,0 +1,213 @@
+import pytest
+
+from scene_templates import (
+    CIRCLE_AREA, DERIVATIVE, INTEGRAL, MATRIX_MULTIPLICATION, PYTHAGOREAN, QUADRATIC_EQUATION, TEMPLATES,
+    UNIT_CIRCLE, TemplateLibrary, extract_circle_area, extract_derivative, extract_integral,
+    extract_matrix_multiplication, extract_pythagorean, extract_quadratic, extract_unit_circle
+)
+from topics import TopicMatch
+
+
+@pytest.mark.parametrize("prompt, n", [
+    ("derivative", 2),
+    ("derivative of x", 1),
+    ("derivative of x^3", 3),
+    ("derivative of x**2 with respect to x", 2),
+    ("derivative of x squared", 2),
+    ("derivative of x cubed", 3),
+    ("derivative of x²", 2),
+    ("d/dx of f(x) = x^3", 3),
+])
+def test_derivative_reads_the_power(prompt, n):
+    assert extract_derivative(prompt)["n"] == n
+
+
+@pytest.mark.parametrize("prompt", [
+    "derivative of 3x^2 + 2x",
+    "derivative of 3x^2",
+    "derivative of x^2 + 1",
+    "derivative of 1/x",
+    "derivative of x^2.5",
+    "derivative of x^4",
+    "derivative of x^-1",
+    "derivative of x^10",
+    "derivative of sin(x)",
+    "derivative of e^x",
+    "derivative of ln x",
+    "derivative of x^2 y",
+])
+def test_derivative_leaves_other_functions_to_the_llm(prompt):
+    assert extract_derivative(prompt) is None
+
+
+@pytest.mark.parametrize("prompt, n, bounds", [
+    ("integral", 2, [0.0, 2.0]),
+    ("integral of x^2 from 0 to 3", 2, [0.0, 3.0]),
+    ("integral of x cubed between -1 and 2", 3, [-1.0, 2.0]),
+    ("integral of x dx from 1 to 2", 1, [1.0, 2.0]),
+])
+def test_integral_reads_power_and_bounds(prompt, n, bounds):
+    params = extract_integral(prompt)
+    assert (params["n"], params["bounds"]) == (n, bounds)
+
+
+@pytest.mark.parametrize("prompt", [
+    "integral of x^-1",
+    "integral of 1/x from 1 to 2",
+    "integral of 2x from 0 to 1",
+    "integral of x^2 from 0 to 10",
+    "integral of x^2 from 2 to 1",
+    "integral of x^2 from 0 to 1 and from 1 to 2",
+])
+def test_integral_leaves_other_integrals_to_the_llm(prompt):
+    assert extract_integral(prompt) is None
+
+
+@pytest.mark.parametrize("prompt, r", [
+    ("area of a circle", "2"),
+    ("area of a circle with radius 3", "3"),
+    ("circle area, r = 2.5", "2.5"),
+])
+def test_circle_area_reads_the_radius(prompt, r):
+    assert extract_circle_area(prompt)["r"] == r
+
+
+@pytest.mark.parametrize("prompt", [
+    "area of a circle with diameter 10",
+    "area of a circle with circumference 12",
+    "area of a circle with radius 1000000",
+    "area of a circle with radius 0",
+    "area of a circle with radius 3 and 4",
+])
+def test_circle_area_leaves_other_measures_to_the_llm(prompt):
+    assert extract_circle_area(prompt) is None
+
+
+def test_pythagorean_reads_two_legs():
+    params = extract_pythagorean("pythagorean theorem with 5 and 12")
+    assert (params["a"], params["b"]) == ("5", "12")
+    assert params["result"].plain == "c = √169 = 13"
+    assert extract_pythagorean("pythagorean theorem")["a"] == "3"
+
+
+@pytest.mark.parametrize("prompt", [
+    "hypotenuse is 13 and one side is 5",
+    "pythagorean theorem with c = 10 and a = 6",
+    "pythagorean theorem with sides 3, 4 and 5",
+    "pythagorean theorem with 3",
+    "pythagorean theorem with 0 and 4",
+])
+def test_pythagorean_leaves_other_triangles_to_the_llm(prompt):
+    assert extract_pythagorean(prompt) is None
+
+
+@pytest.mark.parametrize("prompt, coefficients", [
+    ("quadratic", (1.0, -1.0, -2.0)),
+    ("quadratic x^2 - 5x + 6 = 0", (1.0, -5.0, 6.0)),
+    ("solve 2x^2+3x-2=0 quadratic", (2.0, 3.0, -2.0)),
+    ("parabola y = -x^2 + 4", (-1.0, 0.0, 4.0)),
+])
+def test_quadratic_reads_coefficients(prompt, coefficients):
+    params = extract_quadratic(prompt)
+    assert (params["a"], params["b"], params["c"]) == coefficients
+
+
+def test_quadratic_finds_the_roots():
+    params = extract_quadratic("quadratic x^2 - 5x + 6 = 0")
+    assert params["points"] == [(2.0, 0.0), (3.0, 0.0)]
+    assert params["answer"].plain == "x = 2 or x = 3"
+
+
+@pytest.mark.parametrize("prompt", [
+    "quadratic x^2 - 5x + 6 = 1",
+    "quadratic x^2 + 3x + y",
+    "quadratic 3 x^2 - 5x + 6 = 0 and x^2 = 4",
+    "quadratic x^2 + 100x",
+])
+def test_quadratic_leaves_other_equations_to_the_llm(prompt):
+    assert extract_quadratic(prompt) is None
+
+
+def test_matrix_multiplication_reads_both_matrices():
+    params = extract_matrix_multiplication("multiply 2x2 matrices 1 2 3 4 and 5 6 7 8")
+    assert params["a"] == [[1, 2], [3, 4]]
+    assert params["b"] == [[5, 6], [7, 8]]
+    assert params["product"] == [[19, 22], [43, 50]]
+
+
+@pytest.mark.parametrize("prompt", [
+    "multiply 3x3 matrices",
+    "multiply matrices 1 2 3 4 and 5 6 7",
+    "multiply matrices 1 2 3 4 and 5 6 7 8.5",
+    "multiply matrices 1 2 3 4 and 5 6 7 100",
+])
+def test_matrix_multiplication_leaves_other_matrices_to_the_llm(prompt):
+    assert extract_matrix_multiplication(prompt) is None
+
+
+@pytest.mark.parametrize("prompt, angle", [
+    ("unit circle", 60.0),
+    ("unit circle at 45 degrees", 45.0),
+    ("sine and cosine of 30°", 30.0),
+])
+def test_unit_circle_reads_the_angle(prompt, angle):
+    assert extract_unit_circle(prompt)["angle"] == angle
+
+
+@pytest.mark.parametrize("prompt", [
+    "unit circle at pi/4",
+    "unit circle at 2 radians",
+    "unit circle at 45 degrees and 30 degrees",
+    "unit circle at 400 degrees",
+    "sine of 45 degreesish",
+])
+def test_unit_circle_leaves_other_angles_to_the_llm(prompt):
+    assert extract_unit_circle(prompt) is None
+
+
+@pytest.mark.parametrize("template", TEMPLATES, ids=lambda template: template.name)
+def test_defaults_render_valid_scenes(template):
+    library = TemplateLibrary([template])
+    library.check()
+    assert template.name in library.templates
+
+
+@pytest.mark.parametrize("prompt, topic, template", [
+    ("derivative of x^3", "calculus", DERIVATIVE),
+    ("integral of x^2 from 0 to 3", "calculus", INTEGRAL),
+    ("area of a circle with radius 3", "geometry", CIRCLE_AREA),
+    ("pythagorean theorem with 5 and 12", "geometry", PYTHAGOREAN),
+    ("quadratic x^2 - 5x + 6 = 0", "algebra", QUADRATIC_EQUATION),
+    ("multiply matrices 1 2 3 4 and 5 6 7 8", "linear algebra", MATRIX_MULTIPLICATION),
+    ("unit circle at 45 degrees", "trigonometry", UNIT_CIRCLE),
+    ("explain the derivatives of x^3", "calculus", DERIVATIVE),
+    ("what is the area of a circle with radius 3", "geometry", CIRCLE_AREA),
+    ("find the roots of the quadratic equation x^2 - 5x + 6 = 0", "algebra", QUADRATIC_EQUATION),
+    ("show me sine and cosine on the unit circle", "trigonometry", UNIT_CIRCLE),
+])
+def test_library_routes_prompts_to_their_template(prompt, topic, template):
+    match = TemplateLibrary(TEMPLATES).match(prompt, TopicMatch({topic: 1}))
+    assert match.template is template
+
+
+@pytest.mark.parametrize("prompt, scores", [
+    ("derivative of 3x^2 + 2x", {"calculus": 1}),
+    ("derivative and integral of x^2", {"calculus": 2}),
+    ("derivative of x^2", {"statistics": 2, "calculus": 1}),
+    ("derivative of x^2 " + "and explain it slowly " * 4, {"calculus": 1}),
+    ("second derivative of x^3", {"calculus": 1}),
+    ("partial derivatives", {"calculus": 1}),
+    ("chain rule for derivatives", {"calculus": 1}),
+    ("limit definition of the derivative", {"calculus": 1}),
+    ("integration by parts", {"calculus": 1}),
+    ("double integral", {"calculus": 1}),
+    ("line integral", {"calculus": 1}),
+    ("improper integral", {"calculus": 1}),
+    ("law of cosines", {"trigonometry": 1}),
+    ("sine rule for triangles", {"trigonometry": 1}),
+    ("cosine similarity", {"trigonometry": 1}),
+    ("inverse of a matrix and matrix multiplication", {"linear algebra": 1}),
+    ("converse of the pythagorean theorem", {"geometry": 1}),
+])
+def test_library_sends_other_prompts_to_the_llm(prompt, scores):
+    assert TemplateLibrary(TEMPLATES).match(prompt, TopicMatch(scores)) is None
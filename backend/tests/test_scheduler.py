@@ -0,0 +1,140 @@
+import asyncio
+
+from scheduler import RenderScheduler
+
+
+def grant_order(scheduler: RenderScheduler, renders: list[tuple]) -> list[str]:
+    """Queue renders, given as (name, client, cost, priority), behind a busy slot; the order they run in."""
+    order = []
+
+    async def render(name, client, cost, priority):
+        async with scheduler.slot(client, cost, priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def blocker():
+            async with scheduler.slot("blocker", 0):
+                await release.wait()
+
+        blocking = asyncio.create_task(blocker())
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(render(*args)) for args in renders]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["waiting"] == len(renders)
+        release.set()
+        await asyncio.wait_for(asyncio.gather(blocking, *tasks), 2)
+
+    asyncio.run(scenario())
+    return order
+
+
+def test_cheapest_render_goes_first():
+    scheduler = RenderScheduler(1, aging=0)
+    order = grant_order(scheduler, [("high", "a", 9, 0), ("low", "a", 1, 0), ("medium", "a", 4, 0)])
+    assert order == ["low", "medium", "high"]
+
+
+def test_priority_goes_before_cost():
+    scheduler = RenderScheduler(1, aging=0)
+    order = grant_order(scheduler, [("batch", "a", 1, 1), ("interactive", "a", 9, 0)])
+    assert order == ["interactive", "batch"]
+
+
+def test_equal_renders_go_in_submission_order():
+    scheduler = RenderScheduler(1, aging=0)
+    order = grant_order(scheduler, [(name, "a", 1, 0) for name in "abcd"])
+    assert order == list("abcd")
+
+
+def test_clients_share_slots_by_cost():
+    scheduler = RenderScheduler(1, aging=0)
+    renders = [(f"a{i}", "a", 1, 0) for i in range(4)] + [("b0", "b", 1, 0), ("b1", "b", 1, 0)]
+    order = grant_order(scheduler, renders)
+    # One client queueing more renders doesn't push the other one back
+    assert order == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def test_expensive_client_waits_for_cheap_one():
+    scheduler = RenderScheduler(1, aging=0)
+    order = grant_order(scheduler, [("a0", "a", 6, 0), ("a1", "a", 6, 0),
+                                    ("b0", "b", 2, 0), ("b1", "b", 2, 0), ("b2", "b", 2, 0)])
+    assert order == ["b0", "a0", "b1", "b2", "a1"]
+
+
+def test_waiting_lowers_the_cost():
+    async def scenario():
+        scheduler = RenderScheduler(1, aging=100)
+        release = asyncio.Event()
+        order = []
+
+        async def render(name, cost):
+            async with scheduler.slot("a", cost):
+                order.append(name)
+
+        async def blocker():
+            async with scheduler.slot("blocker", 0):
+                await release.wait()
+
+        blocking = asyncio.create_task(blocker())
+        await asyncio.sleep(0)
+        old = asyncio.create_task(render("old", 5))
+        await asyncio.sleep(0.05)
+        new = asyncio.create_task(render("new", 1))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.wait_for(asyncio.gather(blocking, old, new), 2)
+        return order
+
+    assert asyncio.run(scenario()) == ["old", "new"]
+
+
+def test_slots_run_concurrently_and_are_released():
+    async def scenario():
+        scheduler = RenderScheduler(2)
+        peak = 0
+
+        async def render():
+            nonlocal peak
+            async with scheduler.slot("a", 1):
+                peak = max(peak, scheduler.running)
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(asyncio.gather(*(render() for _ in range(5))), 2)
+        return scheduler, peak
+
+    scheduler, peak = asyncio.run(scenario())
+    assert peak == 2
+    assert scheduler.stats() == {"slots": 2, "running": 0, "waiting": 0, "granted": 5, "clients": 0}
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def scenario():
+        scheduler = RenderScheduler(1, aging=0)
+        release = asyncio.Event()
+        order = []
+
+        async def render(name, cost):
+            async with scheduler.slot("a", cost):
+                order.append(name)
+
+        async def blocker():
+            async with scheduler.slot("blocker", 0):
+                await release.wait()
+
+        blocking = asyncio.create_task(blocker())
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(render("cancelled", 1))
+        kept = asyncio.create_task(render("kept", 5))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.wait_for(asyncio.gather(blocking, kept), 2)
+        return scheduler, order
+
+    scheduler, order = asyncio.run(scenario())
+    assert order == ["kept"]
+    assert scheduler.stats()["running"] == 0
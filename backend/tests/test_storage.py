@@ -0,0 +1,172 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from storage import Storage
+
+OLD = time.time() - 7200
+
+
+@pytest.fixture
+def videos_dir(tmp_path):
+    path = tmp_path / "videos"
+    path.mkdir()
+    return path
+
+
+def write(path: Path, size: int, mtime: float = None) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def add(storage: Storage, animation_id: str, videos: dict[str, int], last_access: float, scene_bytes: int = 10):
+    """An animation with a scene file and a video of the given size per quality, last used at last_access."""
+    scene_name = f"Scene_{animation_id}"
+    write(storage.videos_dir / animation_id / f"{scene_name}.py", scene_bytes)
+    storage.add_animation(animation_id, scene_name, None, {"prompt": animation_id}, created_at=last_access)
+    for quality, size in videos.items():
+        video = write(storage.videos_dir / animation_id / f"{scene_name}_{quality}.mp4", size)
+        storage.add_video(animation_id, video, quality, last_access=last_access)
+
+
+def age(path: Path, mtime: float = OLD):
+    os.utime(path, (mtime, mtime))
+
+
+def test_enforce_evicts_least_recently_used_videos_first(videos_dir):
+    storage = Storage(videos_dir, max_bytes=350)
+    add(storage, "old", {"low": 100}, last_access=OLD)
+    add(storage, "middle", {"low": 100}, last_access=OLD + 10)
+    add(storage, "new", {"low": 100}, last_access=OLD + 20)
+    storage.add_video("new", write(videos_dir / "new" / "Scene_new_high.mp4", 100), "high", last_access=OLD + 30)
+    assert storage.total_bytes() == 430
+
+    freed = storage.enforce()
+
+    assert freed == 100
+    assert storage.animation_videos("old") == []
+    assert not (videos_dir / "old" / "Scene_old_low.mp4").exists()
+    # The scene stays as long as there are videos to evict
+    assert storage.get_animation("old") is not None
+    assert (videos_dir / "old" / "Scene_old.py").exists()
+    assert len(storage.animation_videos("middle")) == 1
+    assert storage.total_bytes() == 330
+
+
+def test_enforce_evicts_scenes_without_videos_last(videos_dir):
+    storage = Storage(videos_dir, max_bytes=15)
+    add(storage, "a", {"low": 100}, last_access=OLD)
+    add(storage, "b", {}, last_access=OLD + 10)
+
+    storage.enforce()
+
+    assert storage.animation_videos("a") == []
+    assert storage.get_animation("a") is None
+    assert not (videos_dir / "a").exists()
+    assert storage.get_animation("b") is not None
+    assert storage.total_bytes() == 10
+
+
+def test_enforce_skips_active_animations(videos_dir):
+    storage = Storage(videos_dir, max_bytes=100)
+    add(storage, "busy", {"low": 100}, last_access=OLD)
+    add(storage, "idle", {"low": 100}, last_access=OLD + 10)
+
+    storage.enforce(active={"busy"})
+
+    assert len(storage.animation_videos("busy")) == 1
+    assert storage.animation_videos("idle") == []
+
+
+def test_enforce_applies_the_ttl(videos_dir):
+    storage = Storage(videos_dir, ttl=3600)
+    add(storage, "expired", {"low": 100}, last_access=OLD)
+    add(storage, "active", {"low": 100}, last_access=OLD)
+    add(storage, "fresh", {"low": 100}, last_access=time.time())
+
+    freed = storage.enforce(active={"active"})
+
+    assert freed == 110
+    assert storage.get_animation("expired") is None
+    assert not (videos_dir / "expired").exists()
+    assert storage.get_animation("active") is not None
+    assert storage.get_animation("fresh") is not None
+
+
+def test_enforce_without_limits_keeps_everything(videos_dir):
+    storage = Storage(videos_dir)
+    add(storage, "a", {"low": 100}, last_access=OLD)
+
+    assert storage.enforce() == 0
+    assert storage.total_bytes() == 110
+
+
+def test_sweep_adopts_untracked_animations(videos_dir):
+    storage = Storage(videos_dir, grace=60)
+    write(videos_dir / "adopted" / "Scene_adopted.py", 10, OLD)
+    write(videos_dir / "adopted" / "Scene_adopted_medium.mp4", 100, OLD)
+    age(videos_dir / "adopted")
+
+    assert storage.sweep() == 0
+
+    animation = storage.get_animation("adopted")
+    assert animation["scene_name"] == "Scene_adopted"
+    assert [(video["filename"], video["quality"]) for video in storage.animation_videos("adopted")] == [
+        ("Scene_adopted_medium.mp4", "medium")
+    ]
+
+
+def test_sweep_removes_old_orphans_only(videos_dir):
+    storage = Storage(videos_dir, grace=60)
+    add(storage, "tracked", {"low": 100}, last_access=OLD)
+    write(videos_dir / "tracked" / "partial_movie_files" / "part.mp4", 10)
+    age(videos_dir / "tracked" / "partial_movie_files")
+    write(videos_dir / "tracked" / "Scene_tracked_high.mp4", 10)
+    write(videos_dir / "orphan" / "stray.txt", 10)
+    age(videos_dir / "orphan")
+    write(videos_dir / "writing" / "stray.txt", 10)
+    write(videos_dir / "running" / "stray.txt", 10)
+    age(videos_dir / "running")
+
+    removed = storage.sweep(active={"running"})
+
+    assert removed == 2
+    assert not (videos_dir / "orphan").exists()
+    assert not (videos_dir / "tracked" / "partial_movie_files").exists()
+    # Too new to tell from a job still writing it
+    assert (videos_dir / "tracked" / "Scene_tracked_high.mp4").exists()
+    assert (videos_dir / "writing").exists()
+    assert (videos_dir / "running").exists()
+    assert (videos_dir / "tracked" / "Scene_tracked_low.mp4").exists()
+
+
+def test_sweep_drops_index_rows_without_files(videos_dir):
+    storage = Storage(videos_dir)
+    add(storage, "no_video", {"low": 100, "high": 100}, last_access=OLD)
+    add(storage, "no_scene", {"low": 100}, last_access=OLD)
+    (videos_dir / "no_video" / "Scene_no_video_low.mp4").unlink()
+    (videos_dir / "no_scene" / "Scene_no_scene.py").unlink()
+
+    assert storage.sweep() == 2
+
+    assert [video["quality"] for video in storage.animation_videos("no_video")] == ["high"]
+    assert storage.get_animation("no_scene") is None
+
+
+def test_sweep_removes_abandoned_scratch_directories(videos_dir, tmp_path):
+    temp_dir = tmp_path / "temp"
+    storage = Storage(videos_dir, grace=60)
+    write(temp_dir / "abandoned" / "scene.py", 10)
+    age(temp_dir / "abandoned")
+    write(temp_dir / "running" / "scene.py", 10)
+    age(temp_dir / "running")
+
+    assert storage.sweep(temp_dir, active={"running"}) == 1
+
+    assert not (temp_dir / "abandoned").exists()
+    assert (temp_dir / "running").exists()
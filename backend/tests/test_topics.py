@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from topics import TopicMatcher, compile_keywords
+
+
+@pytest.fixture
+def matcher():
+    return TopicMatcher(
+        {
+            "statistics": ["mean", "median", "standard deviation"],
+            "calculus": ["derivative", "integral", "limit"],
+            "geometry": ["circle", "triangle", "area"],
+            "trigonometry": ["unit circle", "sine"]
+        },
+        {"standard deviation": "Spread around the mean.", "derivative": "Slope of a function."}
+    )
+
+
+def test_keywords_match_whole_words_only(matcher):
+    assert matcher.match("what is the meaning of life").scores == {}
+    assert matcher.match("a limitless supply of circles").scores == {"geometry": 1}
+    assert matcher.match("the mean, please").scores == {"statistics": 1}
+
+
+def test_plurals_match_their_keyword(matcher):
+    assert matcher.match("derivatives and integrals").scores == {"calculus": 2}
+    assert matcher.match("medians of triangles").scores == {"statistics": 1, "geometry": 1}
+
+
+def test_phrases_match_across_whitespace_and_case(matcher):
+    match = matcher.match("Standard\n  Deviation of a sample")
+    assert match.scores == {"statistics": 1}
+    assert match.enrichments == ["Spread around the mean."]
+
+
+def test_longest_phrase_wins(matcher):
+    # "unit circle" is one trigonometry hit, not a geometry circle as well
+    assert matcher.match("the unit circle").scores == {"trigonometry": 1}
+
+
+def test_scores_are_ordered_by_hits_then_table_order(matcher):
+    match = matcher.match("area of a circle under the derivative, and the integral of sine")
+    assert list(match.scores.items()) == [("calculus", 2), ("geometry", 2), ("trigonometry", 1)]
+    assert match.topic == "calculus"
+
+    match = matcher.match("sine of the derivative")
+    assert list(match.scores) == ["calculus", "trigonometry"]
+
+
+def test_no_match_is_general(matcher):
+    match = matcher.match("tell me a story")
+    assert match.scores == {}
+    assert match.enrichments == []
+    assert match.topic == "general"
+
+
+def test_enrichments_are_listed_once_in_prompt_order(matcher):
+    match = matcher.match("derivative of the standard deviation, then the derivative again")
+    assert match.enrichments == ["Slope of a function.", "Spread around the mean."]
+
+
+def test_keyword_in_several_topics_counts_for_each():
+    matcher = TopicMatcher({"geometry": ["area"], "calculus": ["area", "integral"]}, {})
+    assert matcher.match("area").scores == {"geometry": 1, "calculus": 1}
+
+
+def test_empty_vocabulary_never_matches():
+    assert compile_keywords([]).search("anything") is None
+
+
+def test_load_reads_the_tables(tmp_path):
+    path = tmp_path / "topics.json"
+    path.write_text(json.dumps({"topics": {"calculus": ["derivative"]}, "enrichments": {}}), encoding="utf-8")
+    assert TopicMatcher.load(path).match("derivative").topic == "calculus"
+    assert TopicMatcher.load(tmp_path / "missing.json").match("derivative").topic == "general"
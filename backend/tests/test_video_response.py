@@ -0,0 +1,106 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from video_response import etag_matches, parse_range, video_response
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-499", (0, 499)),
+    ("bytes=500-999", (500, 999)),
+    ("bytes=500-5000", (500, 999)),
+    ("bytes=500-", (500, 999)),
+    ("bytes=0-", (0, 999)),
+    ("bytes=-500", (500, 999)),
+    ("bytes=-5000", (0, 999)),
+    (" bytes=999-999 ", (999, 999)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=1000-2000", 1000),
+    ("bytes=500-400", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=-500", 0),
+    ("bytes=0-", 0),
+])
+def test_unsatisfiable_ranges(header, size):
+    assert parse_range(header, size) is None
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=0-99,200-299",
+    "bytes=-",
+    "items=0-99",
+    "bytes=a-b",
+    "bytes 0-99",
+])
+def test_multiple_or_malformed_ranges_are_refused(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+ETAG = '"3e8-1f"'
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    ('"other"', False),
+    (f'"other", {ETAG}', True),
+    (f'"other",W/{ETAG}', True),
+    ('"other", W/"else"', False),
+    ("*", True),
+])
+def test_if_none_match(header, expected):
+    assert etag_matches(header, ETAG) is expected
+
+
+@pytest.fixture
+def client(tmp_path):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(bytes(range(256)) * 4)
+    app = FastAPI()
+
+    @app.get("/video")
+    async def get_video(request: Request):
+        return video_response(request, video)
+
+    return TestClient(app)
+
+
+def test_range_request_gets_partial_content(client):
+    response = client.get("/video", headers={"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 1000-1023/1024"
+    assert response.content == bytes(range(232, 256))
+
+
+def test_unsatisfiable_range_gets_416(client):
+    response = client.get("/video", headers={"Range": "bytes=2000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+def test_multiple_ranges_get_the_whole_file(client):
+    response = client.get("/video", headers={"Range": "bytes=0-9,20-29"})
+    assert response.status_code == 200
+    assert len(response.content) == 1024
+
+
+def test_matching_etag_gets_304(client):
+    etag = client.get("/video").headers["etag"]
+    assert client.get("/video", headers={"If-None-Match": f'"stale", W/{etag}'}).status_code == 304
+    assert client.get("/video", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_stale_if_range_gets_the_whole_file(client):
+    response = client.get("/video", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert client.get("/video", headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import shutil
+import subprocess
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def _run_version(cmd: list[str]) -> str:
+    """Run a version command and return the first line of its output."""
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=120)
+    lines = (result.stdout or result.stderr).strip().splitlines()
+    if not lines:
+        raise ValueError(f"{cmd[0]} printed no version")
+    return lines[0]
+
+
+def probe_manim() -> dict:
+    try:
+        return {"available": True, "version": _run_version(["python", "-m", "manim", "--version"])}
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Manim version check failed: {e.stderr}")
+        return {"available": False, "error": e.stderr.strip()}
+    except ValueError as e:
+        logger.error(f"Manim version check failed: {str(e)}")
+        return {"available": False, "error": str(e)}
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        logger.error(f"Manim command not found. Please ensure Manim is installed and in PATH: {str(e)}")
+        return {"available": False, "error": str(e)}
+
+
+def probe_ffmpeg() -> dict:
+    path = shutil.which("ffmpeg")
+    if path is None:
+        return {"available": False, "path": None}
+    try:
+        return {"available": True, "path": path, "version": _run_version([path, "-version"])}
+    except (subprocess.SubprocessError, OSError, ValueError) as e:
+        return {"available": False, "path": path, "error": str(e)}
+
+
+def probe_latex() -> dict:
+    """MathTex and Tex need both latex and dvisvgm; Text works without them."""
+    latex = shutil.which("latex")
+    dvisvgm = shutil.which("dvisvgm")
+    return {"available": bool(latex and dvisvgm), "latex_path": latex, "dvisvgm_path": dvisvgm}
+
+
+def probe_toolchain() -> dict:
+    """Check the Manim, FFmpeg and LaTeX toolchain once and report what was found.
+
+    The service is ready to render when Manim runs; LaTeX is only needed by
+    scenes that typeset formulas.
+    """
+    started = time.time()
+    report = {
+        "manim": probe_manim(),
+        "ffmpeg": probe_ffmpeg(),
+        "latex": probe_latex(),
+    }
+    report["ready"] = report["manim"]["available"]
+    report["checked_at"] = time.time()
+    report["probe_seconds"] = round(report["checked_at"] - started, 3)
+    logger.info(f"Toolchain probe: manim={report['manim'].get('version')} "
+                f"ffmpeg={report['ffmpeg']['path']} latex={report['latex']['available']}")
+    return report
+
+
+async def recheck_periodically(interval: float, on_report: Callable[[dict], None]):
+    """Re-run the toolchain probe every interval seconds off the event loop."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            on_report(await asyncio.to_thread(probe_toolchain))
+        except Exception as e:
+            logger.error(f"Toolchain re-check failed: {str(e)}")
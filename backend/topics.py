@@ -0,0 +1,75 @@
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from jsonfile import load_json
+
+TOPICS_FILE = Path(__file__).parent / "topics.json"
+
+
+def compile_keywords(keywords) -> re.Pattern:
+    """One case-insensitive pattern matching any of keywords as whole words, longest first.
+
+    Group 1 is the keyword as written in the prompt. Spaces in a keyword
+    match any whitespace, and a trailing "s" or "es" is allowed so plurals
+    match their keyword.
+    """
+    vocabulary = sorted(keywords, key=len, reverse=True)
+    # An empty vocabulary compiles to a pattern that never matches
+    alternation = "|".join(re.escape(keyword).replace(r"\ ", r"\s+") for keyword in vocabulary) or "(?!)"
+    return re.compile(rf"\b({alternation})(?:e?s)?\b", re.IGNORECASE)
+
+
+@dataclass
+class TopicMatch:
+    """Everything the vocabulary found in one prompt."""
+    # Keyword hits per topic, highest first; ties keep the table's order
+    scores: dict[str, int] = field(default_factory=dict)
+    # Context sentences for matched keywords, in the order they appear in the prompt
+    enrichments: list[str] = field(default_factory=list)
+
+    @property
+    def topic(self) -> str:
+        return next(iter(self.scores), "general")
+
+
+class TopicMatcher:
+    """Classify prompts against a topic and enrichment vocabulary in one regex pass.
+
+    Every keyword of every topic and enrichment is compiled into a single
+    case-insensitive alternation with word boundaries, longest phrases
+    first, so a prompt is scanned once however large the vocabulary is and
+    "mean" no longer matches inside "meaning". A trailing "s" or "es" is
+    allowed so plurals match their keyword.
+    """
+
+    def __init__(self, topics: dict[str, list[str]], enrichments: dict[str, str]):
+        self.topics = list(topics)
+        self.enrichments = {keyword.lower(): text for keyword, text in enrichments.items()}
+        self.keyword_topics: dict[str, list[str]] = {}
+        for topic, keywords in topics.items():
+            for keyword in keywords:
+                self.keyword_topics.setdefault(keyword.lower(), []).append(topic)
+
+        self.pattern = compile_keywords(set(self.keyword_topics) | set(self.enrichments))
+
+    @classmethod
+    def load(cls, path: Path = TOPICS_FILE) -> "TopicMatcher":
+        tables = load_json(path, {})
+        return cls(tables.get("topics", {}), tables.get("enrichments", {}))
+
+    def match(self, prompt: str) -> TopicMatch:
+        scores: dict[str, int] = {}
+        enrichments: list[str] = []
+        for found in self.pattern.finditer(prompt):
+            keyword = " ".join(found.group(1).lower().split())
+            for topic in self.keyword_topics.get(keyword, ()):
+                scores[topic] = scores.get(topic, 0) + 1
+            text = self.enrichments.get(keyword)
+            if text and text not in enrichments:
+                enrichments.append(text)
+        ranked = sorted(scores, key=lambda topic: (-scores[topic], self.topics.index(topic)))
+        return TopicMatch(scores={topic: scores[topic] for topic in ranked}, enrichments=enrichments)
+
+
+topic_matcher = TopicMatcher.load()
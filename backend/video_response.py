@@ -0,0 +1,136 @@
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from fastapi import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Rendered videos are never rewritten in place, so clients may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """Strong ETag from the file's size and modification time."""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def parse_range(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end) offsets.
+
+    Returns None when the range cannot be satisfied and raises ValueError
+    when the header is malformed or asks for several ranges, in which case
+    the whole file should be sent.
+    """
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        raise ValueError(f"Unsupported range: {range_header}")
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+class VideoFileResponse(Response):
+    """Send bytes start..end (inclusive) of a file.
+
+    With zero_copy set, servers offering the ASGI ``http.response.zerocopysend``
+    extension are handed the file descriptor so the kernel copies the
+    bytes with sendfile; other servers get the file in chunks.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: Path, status_code: int, headers: dict, start: int, end: int, zero_copy: bool = False):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.start = start
+        self.length = end - start + 1
+        self.zero_copy = zero_copy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD" or self.length <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif self.zero_copy and "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = self.length
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # The file shrank under us; end the body rather than hang
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def video_response(request: Request, path: Path, zero_copy: bool = False) -> Response:
+    """Serve a rendered file with ETag/304, byte ranges and immutable caching."""
+    stat_result = path.stat()
+    size = stat_result.st_size
+    etag = make_etag(stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes"
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Type"] = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send everything
+    if range_header and (if_range is None or if_range in (etag, last_modified)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            pass
+        else:
+            if byte_range is None:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return VideoFileResponse(path, 206, headers, start, end, zero_copy)
+
+    headers["Content-Length"] = str(size)
+    return VideoFileResponse(path, 200, headers, 0, size - 1, zero_copy)
@@ -10,7 +10,12 @@ const loadingMessages = [
   "🔢 Processing equations...",
 ];
 
-const LoadingAnimation = () => {
+interface LoadingAnimationProps {
+  // Live status from the render job, shown instead of the rotating messages
+  status?: string;
+}
+
+const LoadingAnimation = ({ status }: LoadingAnimationProps) => {
   const [messageIndex, setMessageIndex] = useState(0);
 
   useEffect(() => {
@@ -30,7 +35,7 @@ const LoadingAnimation = () => {
         <div className="absolute inset-6 rounded-full border-4 border-t-transparent border-purple-400/60 animate-spin duration-1000"></div>
       </div>
       <p className="text-lg font-medium animate-pulse-subtle">
-        {loadingMessages[messageIndex]}
+        {status || loadingMessages[messageIndex]}
       </p>
       <p className="mt-2 text-sm text-muted-foreground">
         This may take up to 30 seconds
@@ -9,19 +9,108 @@ const getApiBaseUrl = () => {
 export interface AnimationResponse {
   id: string;
   video_url: string;
+  draft?: boolean;
 }
 
+export interface JobProgress {
+  stage: "queued" | "started" | "llm" | "waiting" | "rendering" | "encoding" | "done" | "failed" | "upgraded";
+  animation?: number;
+  total?: number;
+  error?: string;
+}
+
+export interface AnimationJob {
+  job_id: string;
+  id: string;
+  status: "queued" | "running" | "completed" | "failed";
+  video_url?: string;
+  draft?: boolean;
+  upgrade_job_id?: string;
+  error?: string;
+  progress?: JobProgress;
+}
+
+const POLL_INTERVAL_MS = 1500;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+export const getJob = async (jobId: string): Promise<AnimationJob> => {
+  const response = await axios.get(`${getApiBaseUrl()}/jobs/${jobId}`);
+  return response.data;
+};
+
+const pollJob = async (
+  job: AnimationJob,
+  onProgress?: (progress: JobProgress) => void
+): Promise<AnimationJob> => {
+  while (job.status !== "completed" && job.status !== "failed") {
+    await sleep(POLL_INTERVAL_MS);
+    job = await getJob(job.job_id);
+    if (job.progress) onProgress?.(job.progress);
+  }
+  return job;
+};
+
+// Follow the job's Server-Sent Events, falling back to polling if the stream breaks
+const waitForJob = (
+  job: AnimationJob,
+  onProgress?: (progress: JobProgress) => void
+): Promise<AnimationJob> => {
+  if (typeof EventSource === "undefined") {
+    return pollJob(job, onProgress);
+  }
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${getApiBaseUrl()}/jobs/${job.job_id}/events`);
+    const finish = () => {
+      source.close();
+      getJob(job.job_id).then(resolve, reject);
+    };
+    const stages: JobProgress["stage"][] = ["queued", "started", "llm", "waiting", "rendering", "encoding", "done", "failed"];
+    stages.forEach((stage) => {
+      source.addEventListener(stage, (event) => {
+        const progress: JobProgress = JSON.parse((event as MessageEvent).data);
+        onProgress?.(progress);
+        if (stage === "done" || stage === "failed") finish();
+      });
+    });
+    source.onerror = () => {
+      source.close();
+      pollJob(job, onProgress).then(resolve, reject);
+    };
+  });
+};
+
+// The backend answers with a low quality draft first; onUpgrade receives the
+// full quality video once its background render finishes
 export const generateAnimation = async (
   prompt: string,
   level: string = "intermediate",
-  style: string = "educational"
+  style: string = "educational",
+  onProgress?: (progress: JobProgress) => void,
+  onUpgrade?: (response: AnimationResponse) => void
 ): Promise<AnimationResponse> => {
   const response = await axios.post(`${getApiBaseUrl()}/generate`, {
     prompt,
     level,
     style
   });
-  return response.data;
+
+  // The backend queues the render and returns a job id; wait until it finishes
+  const job = await waitForJob(response.data, onProgress);
+  if (job.status === "failed") {
+    throw new Error(job.error || "Animation generation failed");
+  }
+  if (job.upgrade_job_id) {
+    getJob(job.upgrade_job_id)
+      .then((upgrade) => waitForJob(upgrade))
+      .then((upgrade) => {
+        if (upgrade.status === "completed") {
+          onUpgrade?.({ id: upgrade.id, video_url: upgrade.video_url as string });
+        }
+      })
+      .catch((error) => console.error("Error upgrading animation:", error));
+  }
+  return { id: job.id, video_url: job.video_url as string, draft: job.draft };
 };
 
 export const getVideoUrl = (animationId: string, filename: string): string => {
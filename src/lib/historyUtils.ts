@@ -10,6 +10,9 @@ interface AnimationData {
 
 const HISTORY_STORAGE_KEY = 'visual-math-animator-history';
 
+// Fired on window with { id, videoUrl } when an animation's video is replaced
+export const HISTORY_VIDEO_UPDATED_EVENT = 'visual-math-animator-video-updated';
+
 // Save prompt to local storage history
 export const savePromptToHistory = (data: AnimationData): void => {
   try {
@@ -52,6 +55,19 @@ export const getPromptFromHistory = (id: string): AnimationData | null => {
   }
 };
 
+// Replace the video of an animation in history, e.g. a draft by its full quality render
+export const updateVideoUrlInHistory = (id: string, videoUrl: string): void => {
+  try {
+    const updatedHistory = getAllPromptHistory().map(item =>
+      item.id === id ? { ...item, videoUrl } : item
+    );
+    localStorage.setItem(HISTORY_STORAGE_KEY, JSON.stringify(updatedHistory));
+    window.dispatchEvent(new CustomEvent(HISTORY_VIDEO_UPDATED_EVENT, { detail: { id, videoUrl } }));
+  } catch (error) {
+    console.error('Error updating prompt history:', error);
+  }
+};
+
 // Clear all history
 export const clearPromptHistory = (): void => {
   try {
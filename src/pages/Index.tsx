@@ -5,8 +5,8 @@ import { motion, AnimatePresence } from 'framer-motion';
 import Header from '@/components/Header';
 import PromptInput from '@/components/PromptInput';
 import ExampleCard from '@/components/ExampleCard';
-import { generateAnimation, getVideoUrl } from '@/lib/api';
-import { savePromptToHistory } from '@/lib/historyUtils';
+import { generateAnimation, getVideoUrl, JobProgress } from '@/lib/api';
+import { savePromptToHistory, updateVideoUrlInHistory } from '@/lib/historyUtils';
 import { toast } from '@/hooks/use-toast';
 
 // Lazy load LoadingAnimation
@@ -21,8 +21,27 @@ const examplePrompts = [
   { title: "Visualize the chain rule", category: "Calculus" },
 ];
 
+const describeProgress = (progress: JobProgress): string => {
+  switch (progress.stage) {
+    case "queued":
+    case "waiting":
+      return "⏳ Waiting for a free renderer...";
+    case "llm":
+      return "🌀 Writing the animation script...";
+    case "rendering":
+      return progress.total
+        ? `🎬 Rendering animation ${Math.min(progress.animation ?? 0, progress.total)} of ${progress.total}...`
+        : "🎬 Rendering...";
+    case "encoding":
+      return "📽️ Encoding the video...";
+    default:
+      return "";
+  }
+};
+
 const Index = () => {
   const [loading, setLoading] = useState(false);
+  const [status, setStatus] = useState("");
   const [currentPrompt, setCurrentPrompt] = useState("");
   const navigate = useNavigate();
 
@@ -37,10 +56,17 @@ const Index = () => {
     }
 
     setLoading(true);
+    setStatus("");
     
     try {
       // Generate animation using Manim backend with default level and style
-      const response = await generateAnimation(prompt, "intermediate", "educational");
+      const response = await generateAnimation(
+        prompt,
+        "intermediate",
+        "educational",
+        (progress) => setStatus(describeProgress(progress)),
+        (upgrade) => updateVideoUrlInHistory(upgrade.id, getVideoUrl(upgrade.id, upgrade.video_url.split('/').pop() || ''))
+      );
       
       // Save to history
       savePromptToHistory({
@@ -53,13 +79,17 @@ const Index = () => {
 
       toast({
         title: "Animation created!",
-        description: "Your math animation is ready to view.",
+        description: response.draft
+          ? "A quick preview is ready; the full quality version will replace it shortly."
+          : "Your math animation is ready to view.",
       });
 
       navigate(`/result/${response.id}`);
     } catch (error: any) {
       console.error('Error creating animation:', error);
-      const message = error?.response?.data?.message || error.message || "Failed to create animation.";
+      const message = error?.response?.status === 429
+        ? "The server is busy. Please try again in a few seconds."
+        : error?.response?.data?.message || error.message || "Failed to create animation.";
       toast({
         title: "Error",
         description: message,
@@ -96,7 +126,7 @@ const Index = () => {
                 transition={{ duration: 0.3 }}
               >
                 <Suspense fallback={<div className="h-96 flex items-center justify-center">Loading...</div>}>
-                  <LoadingAnimation />
+                  <LoadingAnimation status={status} />
                 </Suspense>
               </motion.div>
             ) : (
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import Header from '@/components/Header';
-import { getAllPromptHistory } from '@/lib/historyUtils';
+import { getAllPromptHistory, HISTORY_VIDEO_UPDATED_EVENT } from '@/lib/historyUtils';
 import { getVideoUrl } from '@/lib/api';
 import { toast } from '@/hooks/use-toast';
 
@@ -35,6 +35,16 @@ const Result = () => {
     setVideoUrl(animation.videoUrl);
   }, [id, navigate]);
 
+  // Swap the draft for the full quality video as soon as it is rendered
+  useEffect(() => {
+    const handleVideoUpdated = (event: Event) => {
+      const { id: updatedId, videoUrl: updatedUrl } = (event as CustomEvent).detail;
+      if (updatedId === id) setVideoUrl(updatedUrl);
+    };
+    window.addEventListener(HISTORY_VIDEO_UPDATED_EVENT, handleVideoUpdated);
+    return () => window.removeEventListener(HISTORY_VIDEO_UPDATED_EVENT, handleVideoUpdated);
+  }, [id]);
+
   return (
     <div className="min-h-screen flex flex-col math-pattern-background">
       <Header />